@@ -0,0 +1,18 @@
+-- Migration script for the change log (delta sync via /api/changes)
+-- Run this in your PostgreSQL database (Render or local)
+
+CREATE TABLE IF NOT EXISTS change_log (
+    id BIGSERIAL PRIMARY KEY,
+    tree_version BIGINT NOT NULL,
+    entity VARCHAR(20) NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    entity_id UUID NOT NULL,
+    layer VARCHAR(50),
+    parent_id UUID,
+    child_id UUID,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT valid_change_entity CHECK (entity IN ('person', 'relationship')),
+    CONSTRAINT valid_change_op CHECK (op IN ('insert', 'update', 'delete'))
+);
+
+CREATE INDEX IF NOT EXISTS ix_change_log_tree_version ON change_log(tree_version);
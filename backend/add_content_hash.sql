@@ -0,0 +1,6 @@
+-- Migration script for idempotent re-imports (unchanged import rows are skipped)
+-- Run this in your PostgreSQL database (Render or local)
+
+ALTER TABLE people ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+
+CREATE INDEX IF NOT EXISTS ix_people_content_hash ON people(content_hash);
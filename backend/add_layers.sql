@@ -0,0 +1,16 @@
+-- Migration script for layered overlay reads
+-- Run this in your PostgreSQL database (Render or local)
+
+-- Relationships belong to a layer too, so a family branch can attach to base people
+ALTER TABLE relationships ADD COLUMN IF NOT EXISTS layer VARCHAR(50) NOT NULL DEFAULT 'base';
+
+-- Composite indexes for layer IN (...) reads
+CREATE INDEX IF NOT EXISTS idx_people_layer_name_normalized ON people(layer, name_normalized);
+CREATE INDEX IF NOT EXISTS idx_people_layer_created_at ON people(layer, created_at);
+CREATE INDEX IF NOT EXISTS idx_relationships_layer_parent_id ON relationships(layer, parent_id);
+CREATE INDEX IF NOT EXISTS idx_relationships_layer_child_id ON relationships(layer, child_id);
+
+-- Verify the column was added
+-- SELECT column_name, data_type
+-- FROM information_schema.columns
+-- WHERE table_name = 'relationships' AND column_name = 'layer';
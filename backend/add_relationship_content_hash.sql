@@ -0,0 +1,10 @@
+-- Migration script for per-row import hashes: rows with a parent store their hash on the relationship
+-- Run this in your PostgreSQL database (Render or local) after add_content_hash.sql
+
+ALTER TABLE relationships ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32);
+
+CREATE INDEX IF NOT EXISTS ix_relationships_content_hash ON relationships(content_hash);
+
+-- Hashes stored on people by earlier combined imports may name a parent whose link
+-- no longer exists; clear them once (the next import of each file writes every row again)
+UPDATE people SET content_hash = NULL WHERE content_hash IS NOT NULL;
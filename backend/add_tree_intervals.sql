@@ -0,0 +1,7 @@
+-- Migration script for nested-interval branch labels (search within=, descendant checks)
+-- Run this in your PostgreSQL database (Render or local), then run relabel_tree.py once
+
+ALTER TABLE people ADD COLUMN IF NOT EXISTS tree_pre INTEGER;
+ALTER TABLE people ADD COLUMN IF NOT EXISTS tree_post INTEGER;
+
+CREATE INDEX IF NOT EXISTS ix_people_tree_pre ON people(tree_pre);
@@ -0,0 +1,177 @@
+"""
+Dynasty-wide statistics computed with NumPy over the graph snapshot.
+
+The snapshot (graph.py) is converted once into flat arrays - years, gender codes
+and a CSR child adjacency - and every metric is a vectorized operation over
+them. Generations come from a frontier-based level-order traversal starting at
+the roots (people with no recorded parent); a person reachable at several depths
+is counted at the shallowest one. Results are cached per snapshot, so they are
+recomputed only after the tree changes (one entry per layer stack).
+"""
+import threading
+import numpy as np
+from graph import get_graph, MAX_CACHED_STACKS
+from layers import DEFAULT_STACK
+
+LIFESPAN_PERCENTILES = [10, 25, 50, 75, 90]
+LIFESPAN_BUCKET = 10  # years per histogram bucket
+
+GENDER_UNKNOWN, GENDER_MALE, GENDER_FEMALE = 0, 1, 2
+
+_lock = threading.Lock()
+_cached = {}  # stack key -> (snapshot, stats)
+
+
+class TreeArrays:
+    """Column arrays for people plus CSR (indptr/indices) child adjacency"""
+    
+    def __init__(self, snapshot):
+        ids = list(snapshot.people)
+        index = {person_id: i for i, person_id in enumerate(ids)}
+        people = snapshot.people
+        n = len(ids)
+        
+        self.size = n
+        self.birth_year = np.array(
+            [people[i]['birth_year'] if people[i]['birth_year'] is not None else np.nan for i in ids],
+            dtype=np.float64
+        )
+        self.death_year = np.array(
+            [people[i]['death_year'] if people[i]['death_year'] is not None else np.nan for i in ids],
+            dtype=np.float64
+        )
+        gender_codes = {'male': GENDER_MALE, 'female': GENDER_FEMALE}
+        self.gender = np.array(
+            [gender_codes.get((people[i]['gender'] or '').lower(), GENDER_UNKNOWN) for i in ids],
+            dtype=np.int8
+        )
+        
+        parent_idx = []
+        child_idx = []
+        for child_id, rels in snapshot.parents.items():
+            for parent_id, _ in rels:
+                parent_idx.append(index[parent_id])
+                child_idx.append(index[child_id])
+        parent_idx = np.array(parent_idx, dtype=np.int64)
+        child_idx = np.array(child_idx, dtype=np.int64)
+        
+        # CSR: children of person i are indices[indptr[i]:indptr[i + 1]]
+        order = np.argsort(parent_idx, kind='stable')
+        self.indices = child_idx[order]
+        self.child_counts = np.bincount(parent_idx, minlength=n)
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(self.child_counts, out=self.indptr[1:])
+        self.parent_counts = np.bincount(child_idx, minlength=n)
+    
+    def generations(self):
+        """Level-order traversal from the roots: generation number per person (-1 if unreachable)"""
+        level = np.full(self.size, -1, dtype=np.int64)
+        frontier = np.flatnonzero(self.parent_counts == 0)
+        depth = 0
+        while frontier.size:
+            level[frontier] = depth
+            # Gather all children of the frontier in one shot
+            starts = self.indptr[frontier]
+            lengths = self.indptr[frontier + 1] - starts
+            total = int(lengths.sum())
+            if total == 0:
+                break
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            children = self.indices[offsets + np.arange(total)]
+            children = np.unique(children)
+            frontier = children[level[children] == -1]
+            depth += 1
+        return level
+
+
+def summarize(values):
+    """Count/mean/min/max/percentiles for a 1-D array (None when empty)"""
+    if values.size == 0:
+        return {'count': 0, 'mean': None, 'min': None, 'max': None, 'percentiles': {}}
+    percentiles = np.percentile(values, LIFESPAN_PERCENTILES)
+    return {
+        'count': int(values.size),
+        'mean': round(float(values.mean()), 2),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {str(p): round(float(v), 2) for p, v in zip(LIFESPAN_PERCENTILES, percentiles)}
+    }
+
+
+def compute_stats(arrays):
+    level = arrays.generations()
+    reached = level >= 0
+    levels = level[reached]
+    generation_count = int(levels.max()) + 1 if levels.size else 0
+    
+    generation_sizes = np.bincount(levels, minlength=generation_count)
+    gender = arrays.gender[reached]
+    males = np.bincount(levels, weights=(gender == GENDER_MALE), minlength=generation_count)
+    females = np.bincount(levels, weights=(gender == GENDER_FEMALE), minlength=generation_count)
+    
+    generations = []
+    for g in range(generation_count):
+        male, female = int(males[g]), int(females[g])
+        generations.append({
+            'generation': g,
+            'size': int(generation_sizes[g]),
+            'male': male,
+            'female': female,
+            'unknown': int(generation_sizes[g]) - male - female,
+            'male_to_female_ratio': round(male / female, 3) if female else None
+        })
+    
+    # Lifespans where both years are known and consistent
+    known = ~np.isnan(arrays.birth_year) & ~np.isnan(arrays.death_year)
+    lifespans = arrays.death_year[known] - arrays.birth_year[known]
+    lifespans = lifespans[lifespans >= 0]
+    histogram = {}
+    if lifespans.size:
+        buckets = (lifespans // LIFESPAN_BUCKET).astype(np.int64)
+        counts = np.bincount(buckets)
+        histogram = {
+            f'{b * LIFESPAN_BUCKET}-{(b + 1) * LIFESPAN_BUCKET - 1}': int(c)
+            for b, c in enumerate(counts) if c
+        }
+    
+    parents = arrays.child_counts[arrays.child_counts > 0]
+    
+    return {
+        'people': arrays.size,
+        'relationships': int(arrays.indices.size),
+        'generation_count': generation_count,
+        'generations': generations,
+        'unreachable': int((~reached).sum()),  # only on cycles
+        'children_per_person': {
+            'mean': round(float(arrays.child_counts.mean()), 3) if arrays.size else None,
+            'mean_for_parents': round(float(parents.mean()), 3) if parents.size else None,
+            'max': int(arrays.child_counts.max()) if arrays.size else None,
+            'leaves': int((arrays.child_counts == 0).sum())
+        },
+        'lifespan': dict(summarize(lifespans), histogram=histogram),
+        'gender': {
+            'male': int((arrays.gender == GENDER_MALE).sum()),
+            'female': int((arrays.gender == GENDER_FEMALE).sum()),
+            'unknown': int((arrays.gender == GENDER_UNKNOWN).sum())
+        }
+    }
+
+
+def get_tree_stats(layers=DEFAULT_STACK):
+    """Stats for the stack's current snapshot, computed once per snapshot"""
+    snapshot = get_graph(layers)
+    key = snapshot.layers
+    cached = _cached.get(key)
+    if cached and cached[0] is snapshot:
+        return cached[1]
+    
+    with _lock:
+        cached = _cached.get(key)
+        if not cached or cached[0] is not snapshot:
+            stats = compute_stats(TreeArrays(snapshot))
+            stats['tree_version'] = snapshot.version
+            stats['layers'] = list(key)
+            if len(_cached) >= MAX_CACHED_STACKS:
+                _cached.clear()
+            cached = _cached[key] = (snapshot, stats)
+    return cached[1]
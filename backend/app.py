@@ -1,46 +1,89 @@
 from flask import Flask, request
-from flask_cors import CORS
-from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 import logging
+import time
 from config import Config
+from request_log import configure_logging
 
 # Initialize db before importing models
 db = SQLAlchemy()
 
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, Config.LOG_LEVEL),
-    format='%(asctime)s %(levelname)s %(name)s %(message)s'
-)
+# Configure logging: records are queued and written to stdout by a background thread
+configure_logging(getattr(logging, Config.LOG_LEVEL), Config.LOG_FORMAT, Config.LOG_QUEUE_SIZE)
 logger = logging.getLogger(__name__)
 
-def create_app():
+def create_app(enable_migrations=True):
+    """
+    Application factory.
+    enable_migrations=False skips Flask-Migrate (only needed for `flask db` commands),
+    which is what the lean serving entry point in wsgi.py uses.
+    """
+    timings = {}
+    phase_start = time.perf_counter()
+    
+    def mark(phase):
+        nonlocal phase_start
+        now = time.perf_counter()
+        timings[phase] = round((now - phase_start) * 1000, 1)
+        phase_start = now
+    
+    Config.validate()
     app = Flask(__name__)
     app.config.from_object(Config)
     
     # Configure JSON to preserve UTF-8 characters (for Amharic names)
     app.config['JSON_AS_ASCII'] = False
+    mark('config')
     
     # Initialize extensions
     db.init_app(app)
-    migrate = Migrate(app, db)
+    mark('database')
+    
+    if enable_migrations:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+        mark('migrations')
     
     # CORS configuration
+    from flask_cors import CORS
     CORS(app, origins=Config.ALLOWED_ORIGINS, supports_credentials=False)
+    mark('cors')
+    
+    # Hook order: before_request hooks run in registration order, after_request hooks
+    # in reverse. Request ids and the access log go first, so their before hook runs
+    # first and their after hook last, and the logged latency covers profiling and
+    # compression
+    from request_log import init_app as init_request_log
+    init_request_log(app)
+    mark('request_log')
+    
+    # Opt-in per-request profiling: registered before responses, so profiling starts
+    # before and finishes after the compression hook and the profile includes it
+    from profiling import init_app as init_profiling
+    init_profiling(app)
+    mark('profiling')
+    
+    # Faster JSON encoding and Accept-Encoding compression
+    from responses import init_app as init_responses
+    init_responses(app)
+    mark('responses')
     
     # Import models after db is initialized
     from models import Person, Relationship
+    mark('models')
+    
+    # Record admin changes in the change log (delta sync)
+    from changelog import init_app as init_changelog
+    init_changelog(app)
+    mark('changelog')
     
     # Register blueprints
     from routes import api_bp, admin_bp
     app.register_blueprint(api_bp)
     app.register_blueprint(admin_bp)
+    mark('blueprints')
     
-    # Request logging middleware
-    @app.before_request
-    def log_request():
-        logger.info(f'{request.method} {request.path}')
+    app.config['STARTUP_TIMINGS'] = timings
     
     # Error handlers
     @app.errorhandler(404)
@@ -57,14 +100,24 @@ def create_app():
     def add_cache_headers(response):
         # Ensure UTF-8 encoding for all responses
         response.charset = 'utf-8'
-        if request.path.startswith('/api/'):
+        if request.path.startswith('/api/') and not response.cache_control.no_cache:
             response.cache_control.max_age = 300  # 5 minutes
         return response
     
     return app
 
-app = create_app()
 
-if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+_app = None
 
+def __getattr__(name):
+    # `app` is created on first access (gunicorn app:app, flask CLI) rather than at
+    # import time, so importing this module for `db` or create_app stays cheap.
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+if __name__ == '__main__':
+    __getattr__('app').run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,128 @@
+"""
+Whole-branch edits: delete a person with all their descendants, or move a
+branch under a different parent.
+
+The branch (the root plus everyone reachable through relationships of any
+layer) is computed with one recursive query. Both operations then work on
+that set with a few set-based statements in the caller's transaction:
+
+  - delete: one DELETE of every relationship touching the branch and one
+    DELETE of its people, both RETURNING the rows for the change log
+  - reattach: one DELETE of the root's parent links in the layer, one INSERT
+    of the new link
+
+A child with one parent inside the branch and another outside it is part of
+the branch, so it is deleted (or moved) with it. The preview functions return
+what an operation would do without writing anything.
+"""
+import uuid
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from models import db, Person, Relationship
+from changelog import record_changes, person_change, relationship_change
+
+# Members listed in a preview; the counts are always complete
+MAX_PREVIEW_MEMBERS = 100
+
+DESCENDANTS_SQL = text("""
+WITH RECURSIVE branch(id) AS (
+    SELECT id FROM people WHERE id = :root_id
+    UNION
+    SELECT r.child_id FROM relationships r JOIN branch b ON r.parent_id = b.id
+)
+SELECT id FROM branch
+""").bindparams(bindparam('root_id', type_=UUID(as_uuid=True)))
+
+BRANCH_RELATIONSHIP_COUNT_SQL = text("""
+SELECT COUNT(*) FROM relationships WHERE parent_id = ANY(:ids) OR child_id = ANY(:ids)
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+DELETE_BRANCH_RELATIONSHIPS_SQL = text("""
+DELETE FROM relationships WHERE parent_id = ANY(:ids) OR child_id = ANY(:ids)
+RETURNING id, layer, parent_id, child_id
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+DELETE_BRANCH_PEOPLE_SQL = text("""
+DELETE FROM people WHERE id = ANY(:ids)
+RETURNING id, layer
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+
+def branch_ids(root_id):
+    """IDs of root_id and all their descendants (empty if root_id does not exist)"""
+    rows = db.session.execute(DESCENDANTS_SQL, {'root_id': uuid.UUID(str(root_id))})
+    return [row.id for row in rows]
+
+
+def describe_members(ids):
+    """{id, name} of up to MAX_PREVIEW_MEMBERS branch members, by name"""
+    rows = db.session.query(Person.id, Person.name_original).filter(
+        Person.id.in_(ids)
+    ).order_by(Person.name_original, Person.id).limit(MAX_PREVIEW_MEMBERS)
+    return [{'id': str(row.id), 'name': row.name_original} for row in rows]
+
+
+def parent_links(person_id, layer):
+    """The person's links to their parents in layer"""
+    return Relationship.query.filter_by(child_id=person_id, layer=layer).all()
+
+
+def link_dict(rel):
+    return {
+        'id': str(rel.id),
+        'parent_id': str(rel.parent_id),
+        'relation_type': rel.relation_type,
+        'layer': rel.layer
+    }
+
+
+def preview_delete(ids):
+    """What delete_branch(ids) would remove"""
+    relationships = db.session.execute(BRANCH_RELATIONSHIP_COUNT_SQL, {'ids': ids}).scalar()
+    return {
+        'people': len(ids),
+        'relationships': relationships,
+        'members': describe_members(ids)
+    }
+
+
+def delete_branch(ids):
+    """Delete the people in ids and every relationship touching them; returns the counts"""
+    rels = db.session.execute(DELETE_BRANCH_RELATIONSHIPS_SQL, {'ids': ids}).all()
+    people = db.session.execute(DELETE_BRANCH_PEOPLE_SQL, {'ids': ids}).all()
+    record_changes(db.session, [
+        relationship_change('delete', rel.id, rel.layer, rel.parent_id, rel.child_id) for rel in rels
+    ] + [person_change('delete', row.id, row.layer) for row in people])
+    return {'people': len(people), 'relationships': len(rels)}
+
+
+def preview_reattach(ids, root, new_parent, relation_type, layer):
+    """What reattach_branch would change"""
+    return {
+        'people': len(ids),
+        'members': describe_members(ids),
+        'removed_links': [link_dict(rel) for rel in parent_links(root.id, layer)],
+        'new_link': {
+            'parent_id': str(new_parent.id),
+            'child_id': str(root.id),
+            'relation_type': relation_type,
+            'layer': layer
+        }
+    }
+
+
+def reattach_branch(root, new_parent, relation_type, layer):
+    """
+    Make new_parent the only parent of root in layer (the root keeps its
+    descendants). The caller has checked that new_parent is outside the branch.
+    """
+    removed = [link_dict(rel) for rel in parent_links(root.id, layer)]
+    Relationship.query.filter_by(child_id=root.id, layer=layer).delete()
+    record_changes(db.session, [
+        relationship_change('delete', uuid.UUID(link['id']), layer, uuid.UUID(link['parent_id']), root.id)
+        for link in removed
+    ])
+    rel = Relationship(parent_id=new_parent.id, child_id=root.id, relation_type=relation_type, layer=layer)
+    db.session.add(rel)
+    db.session.flush()
+    return {'removed_links': removed, 'new_link': dict(link_dict(rel), child_id=str(root.id))}
@@ -0,0 +1,162 @@
+"""
+Set-based people writes for /admin/import/people and /admin/import/combined.
+
+Instead of a lookup per row followed by an ORM insert or update, each import
+writes its rows with a handful of multi-row statements:
+
+  - rows with an ID: INSERT ... ON CONFLICT (id) DO UPDATE; RETURNING tells
+    inserts from updates (xmax = 0), which gives the created/updated counts
+  - rows without an ID: a multi-row INSERT
+  - name-matched rows (combined import): one DISTINCT ON query finds the
+    existing person per normalized name, then one INSERT for new names and
+    one unnest UPDATE for the rest, skipping rows whose values are unchanged
+
+These statements bypass the ORM, so their change-log rows are recorded here.
+"""
+import uuid
+from sqlalchemy import text, bindparam, literal_column
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from models import db, Person
+from changelog import record_changes, person_change
+from content_hash import clear_link_hashes
+
+UPSERT_BATCH_SIZE = 1000
+
+# Columns an /admin/import/people row only overwrites when it has them
+OPTIONAL_COLUMNS = ('birth_year', 'death_year', 'gender')
+ALWAYS_UPDATED = ('name_original', 'name_amharic', 'name_normalized', 'layer', 'content_hash')
+
+MERGE_NAMES_SQL = text("""
+UPDATE people SET name_original = v.name_original,
+    name_amharic = COALESCE(v.name_amharic, people.name_amharic),
+    content_hash = NULL
+FROM unnest(:ids, :names, :amharic) AS v(id, name_original, name_amharic)
+WHERE people.id = v.id
+  AND (people.name_original, people.name_amharic)
+      IS DISTINCT FROM (v.name_original, COALESCE(v.name_amharic, people.name_amharic))
+RETURNING people.id, people.layer
+""").bindparams(
+    bindparam('ids', type_=ARRAY(UUID(as_uuid=True))),
+    bindparam('names', type_=ARRAY(db.Text)),
+    bindparam('amharic', type_=ARRAY(db.Text))
+)
+
+
+def chunks(rows):
+    for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+        yield rows[start:start + UPSERT_BATCH_SIZE]
+
+
+def upsert_people(rows):
+    """
+    Write rows that carry an id: dicts with id and ALWAYS_UPDATED plus whichever
+    OPTIONAL_COLUMNS the import row had (an update keeps the others, an insert
+    leaves them NULL). An ID repeated in the file is written once per
+    occurrence, in file order. Returns (created, updated).
+    """
+    # k-th occurrences of every ID go in round k, so no statement touches a row twice
+    rounds = []
+    occurrences = {}
+    for row in rows:
+        k = occurrences.get(row['id'], 0)
+        occurrences[row['id']] = k + 1
+        if k == len(rounds):
+            rounds.append([])
+        rounds[k].append(row)
+    
+    created = updated = 0
+    for round_rows in rounds:
+        groups = {}
+        for row in round_rows:
+            groups.setdefault(tuple(c for c in OPTIONAL_COLUMNS if c in row), []).append(row)
+        for optional, group in groups.items():
+            for batch in chunks(group):
+                statement = insert(Person).values([
+                    dict({column: None for column in OPTIONAL_COLUMNS}, **row) for row in batch
+                ])
+                statement = statement.on_conflict_do_update(
+                    index_elements=[Person.id],
+                    set_={column: statement.excluded[column] for column in ALWAYS_UPDATED + optional}
+                ).returning(Person.id, Person.layer, literal_column('(xmax = 0)').label('inserted'))
+                changes = []
+                for person_id, layer, inserted in db.session.execute(statement):
+                    if inserted:
+                        created += 1
+                    else:
+                        updated += 1
+                    changes.append(person_change('insert' if inserted else 'update', person_id, layer))
+                record_changes(db.session, changes)
+                # The row hash is now the person's; combined rows naming them are stale
+                clear_link_hashes(change['entity_id'] for change in changes if change['op'] == 'update')
+    return created, updated
+
+
+def insert_people(rows):
+    """Insert rows without an id (one is generated); returns the number created"""
+    created = 0
+    for batch in chunks(rows):
+        statement = insert(Person).values([
+            dict({column: None for column in OPTIONAL_COLUMNS}, id=uuid.uuid4(), **row) for row in batch
+        ]).returning(Person.id, Person.layer)
+        inserted = db.session.execute(statement).all()
+        created += len(inserted)
+        record_changes(db.session, [person_change('insert', person_id, layer) for person_id, layer in inserted])
+    return created
+
+
+def most_recent(candidates):
+    """
+    The person a duplicated name resolves to: the most recently created, ties
+    broken by the larger ID. Shared by the name merge, the combined import's
+    relationship matching and its dry run, so all three pick the same person.
+    """
+    return max(candidates, key=lambda p: (p.created_at, str(p.id or '')))
+
+
+def newest_by_name(names):
+    """{normalized name: ID of the base person most_recent() picks for it}"""
+    found = {}
+    names = list(names)
+    for batch in chunks(names):
+        rows = db.session.query(Person.name_normalized, Person.id).filter(
+            Person.layer == 'base', Person.name_normalized.in_(batch)
+        ).order_by(
+            Person.name_normalized, Person.created_at.desc(), Person.id.desc()
+        ).distinct(Person.name_normalized)
+        found.update((row.name_normalized, row.id) for row in rows)
+    return found
+
+
+def merge_people_by_name(entries, normalize_name):
+    """
+    Apply (english_name, amharic_name) rows by normalized base-layer name, as
+    the combined import does: an existing person (the most recent with the name,
+    see most_recent) gets the row's English name
+    and, if given, its Amharic name; a new name creates a base person. Later
+    rows with the same name update the earlier ones. Returns (created, updated).
+    """
+    final = {}  # normalized name -> [name_original, name_amharic]
+    for english_name, amharic_name in entries:
+        state = final.setdefault(normalize_name(english_name), [english_name, None])
+        state[0] = english_name
+        if amharic_name:
+            state[1] = amharic_name
+    
+    existing = newest_by_name(final)
+    created = insert_people([
+        {'name_original': name, 'name_amharic': amharic, 'name_normalized': key, 'layer': 'base'}
+        for key, (name, amharic) in final.items() if key not in existing
+    ])
+    
+    matched = [(existing[key], name, amharic) for key, (name, amharic) in final.items() if key in existing]
+    for batch in chunks(matched):
+        changed = db.session.execute(MERGE_NAMES_SQL, {
+            'ids': [person_id for person_id, _, _ in batch],
+            'names': [name for _, name, _ in batch],
+            'amharic': [amharic for _, _, amharic in batch]
+        }).all()
+        record_changes(db.session, [person_change('update', person_id, layer) for person_id, layer in changed])
+        clear_link_hashes(person_id for person_id, _ in changed)
+    
+    # Every row that did not create its person counts as an update, as before
+    return created, len(entries) - created
@@ -0,0 +1,120 @@
+"""
+Append-only change log of admin mutations.
+
+Every transaction that changes people or relationships takes the next tree
+version and writes one change_log row per changed entity in that same
+transaction. ORM changes (session.add/delete, attribute updates) are captured
+by an after_flush hook; bulk statements call record_changes themselves.
+
+Versions are allocated under a transaction-scoped advisory lock, so writers
+are serialized and versions become visible in commit order: a reader that has
+seen version N never misses a change later committed with a version <= N.
+"""
+from sqlalchemy import event, func, insert, text
+from models import db, Person, Relationship, ChangeLog
+
+# pg_advisory_xact_lock key shared by all writers of the change log
+CHANGE_LOCK_KEY = 727365
+VERSION_KEY = 'change_log_version'
+
+MAX_CHANGES_PAGE = 1000
+
+
+def current_version():
+    """Latest committed tree version (0 before the first logged change)"""
+    return db.session.query(func.coalesce(func.max(ChangeLog.tree_version), 0)).scalar()
+
+
+def allocate_version(session):
+    """Tree version for the session's current transaction, allocated on first use"""
+    version = session.info.get(VERSION_KEY)
+    if version is None:
+        connection = session.connection()
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOCK_KEY})
+        version = connection.execute(
+            text('SELECT COALESCE(MAX(tree_version), 0) + 1 FROM change_log')
+        ).scalar()
+        session.info[VERSION_KEY] = version
+    return version
+
+
+def person_change(op, person_id, layer):
+    return {'entity': 'person', 'op': op, 'entity_id': person_id, 'layer': layer}
+
+
+def relationship_change(op, relationship_id, layer, parent_id, child_id):
+    return {
+        'entity': 'relationship', 'op': op, 'entity_id': relationship_id,
+        'layer': layer, 'parent_id': parent_id, 'child_id': child_id
+    }
+
+
+def record_changes(session, changes):
+    """Write change rows (person_change/relationship_change dicts) in the session's transaction"""
+    if not changes:
+        return
+    version = allocate_version(session)
+    rows = [
+        dict({'parent_id': None, 'child_id': None}, tree_version=version, **change)
+        for change in changes
+    ]
+    session.connection().execute(insert(ChangeLog.__table__), rows)
+
+
+def entity_change(op, obj):
+    if isinstance(obj, Person):
+        return person_change(op, obj.id, obj.layer)
+    if isinstance(obj, Relationship):
+        return relationship_change(op, obj.id, obj.layer, obj.parent_id, obj.child_id)
+    return None
+
+
+def capture_flush(session, flush_context):
+    """after_flush: log inserted, updated and deleted people and relationships"""
+    changes = []
+    for obj in session.new:
+        changes.append(entity_change('insert', obj))
+    for obj in session.dirty:
+        # Collection changes (e.g. a backref append) are not column updates
+        if session.is_modified(obj, include_collections=False):
+            changes.append(entity_change('update', obj))
+    for obj in session.deleted:
+        changes.append(entity_change('delete', obj))
+    record_changes(session, [c for c in changes if c is not None])
+
+
+def reset_version(session, *args):
+    session.info.pop(VERSION_KEY, None)
+
+
+def changes_since(since, limit=MAX_CHANGES_PAGE, until=None):
+    """
+    Changes with tree_version > since in order, whole versions only.
+    Returns (changes, has_more); a single version larger than limit is returned whole.
+    """
+    query = ChangeLog.query.filter(ChangeLog.tree_version > since)
+    if until is not None:
+        query = query.filter(ChangeLog.tree_version <= until)
+    rows = query.order_by(ChangeLog.tree_version.asc(), ChangeLog.id.asc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, False
+    
+    # Do not split the last version across pages
+    cut = rows[limit].tree_version
+    complete = [row for row in rows if row.tree_version < cut]
+    if complete:
+        return complete, True
+    whole = ChangeLog.query.filter(ChangeLog.tree_version == cut).order_by(ChangeLog.id.asc()).all()
+    more = ChangeLog.query.filter(ChangeLog.tree_version > cut)
+    if until is not None:
+        more = more.filter(ChangeLog.tree_version <= until)
+    return whole, db.session.query(more.exists()).scalar()
+
+
+def init_app(app):
+    """Capture ORM changes into the change log for every session"""
+    if event.contains(db.session, 'after_flush', capture_flush):
+        return
+    event.listen(db.session, 'after_flush', capture_flush)
+    event.listen(db.session, 'after_commit', reset_version)
+    event.listen(db.session, 'after_rollback', reset_version)
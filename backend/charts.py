@@ -0,0 +1,288 @@
+"""
+Printable branch charts (a person's descendants) as SVG or PNG.
+
+Charts reuse the tidy-tree layout (layout.py), so rendering is one pass over
+already positioned nodes. Output is cached on disk under a name derived from
+(person, depth, layer stack, tree version, format): a repeat download of an
+unchanged branch is read from disk, and the name doubles as the ETag.
+
+SVG text is written as UTF-8 with Ethiopic-capable fonts first in the
+font-family list, so Amharic names render wherever such a font is installed.
+PNG rasterization uses Pillow (optional) and needs a TrueType font with
+Ethiopic glyphs: CHART_FONT_PATH, or one of the usual system locations.
+"""
+import hashlib
+import os
+import tempfile
+import logging
+from xml.sax.saxutils import escape
+from config import Config
+from layout import get_layout
+from throttle import SingleFlight
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the drawing changes so previously cached files are not served
+RENDER_VERSION = 1
+
+NODE_WIDTH = 168
+NODE_HEIGHT = 46
+H_GAP = 16
+V_GAP = 44
+MARGIN = 24
+TITLE_HEIGHT = 40
+FONT_SIZE = 12
+TITLE_FONT_SIZE = 16
+MAX_NAME_CHARS = 24
+MAX_PNG_PIXELS = 40_000_000
+
+SVG_FONT_FAMILY = "'Noto Sans Ethiopic', 'Abyssinica SIL', 'Nyala', 'Noto Sans', sans-serif"
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/noto/NotoSansEthiopic-Regular.ttf',
+    '/usr/share/fonts/noto/NotoSansEthiopic-Regular.ttf',
+    '/usr/share/fonts/truetype/abyssinica/AbyssinicaSIL-Regular.ttf',
+    '/usr/share/fonts/sil-abyssinica/AbyssinicaSIL-Regular.ttf',
+]
+
+MIMETYPES = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+BOX_FILL = '#fdf8ec'
+BOX_STROKE = '#8a6d3b'
+EDGE_COLOR = '#8a6d3b'
+TEXT_COLOR = '#2b2118'
+
+render_flight = SingleFlight()
+
+
+class ChartUnavailable(Exception):
+    """The chart cannot be rendered in the requested format on this server"""
+
+
+def truncate(text, limit=MAX_NAME_CHARS):
+    if text and len(text) > limit:
+        return text[:limit - 1] + '…'
+    return text
+
+
+def chart_size(layout):
+    width = int(layout['width'] * (NODE_WIDTH + H_GAP)) + NODE_WIDTH + 2 * MARGIN
+    height = layout['height'] * (NODE_HEIGHT + V_GAP) + NODE_HEIGHT + 2 * MARGIN + TITLE_HEIGHT
+    return width, height
+
+
+def box_origin(node):
+    """Top-left corner of a node's box in pixels"""
+    left = MARGIN + node['x'] * (NODE_WIDTH + H_GAP)
+    top = MARGIN + TITLE_HEIGHT + node['y'] * (NODE_HEIGHT + V_GAP)
+    return left, top
+
+
+def chart_title(layout, nodes_by_id):
+    root = nodes_by_id[layout['root_id']]
+    name = root['name']
+    if root['name_amharic']:
+        name = f"{name} ({root['name_amharic']})"
+    generations = layout['generations']
+    return f"Descendants of {name} - {generations} generation{'s' if generations != 1 else ''}"
+
+
+def edge_points(parent, child):
+    """Elbow connector from the bottom of the parent's box to the top of the child's"""
+    px, py = box_origin(parent)
+    cx, cy = box_origin(child)
+    start = (px + NODE_WIDTH / 2, py + NODE_HEIGHT)
+    end = (cx + NODE_WIDTH / 2, cy)
+    mid_y = start[1] + V_GAP / 2
+    return [start, (start[0], mid_y), (end[0], mid_y), end]
+
+
+def chart_edges(layout, nodes_by_id):
+    """(points, dashed) for tree links and for second-parent links"""
+    for node in layout['nodes']:
+        if node['parent_id']:
+            yield edge_points(nodes_by_id[node['parent_id']], node), False
+    for edge in layout['extra_edges']:
+        yield edge_points(nodes_by_id[edge['parent_id']], nodes_by_id[edge['child_id']]), True
+
+
+def render_svg(layout):
+    nodes_by_id = {node['id']: node for node in layout['nodes']}
+    width, height = chart_size(layout)
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="{escape(SVG_FONT_FAMILY)}">',
+        f'<rect width="{width}" height="{height}" fill="#ffffff"/>',
+        f'<text x="{MARGIN}" y="{MARGIN + TITLE_FONT_SIZE}" font-size="{TITLE_FONT_SIZE}" '
+        f'font-weight="bold" fill="{TEXT_COLOR}">{escape(chart_title(layout, nodes_by_id))}</text>',
+        f'<g fill="none" stroke="{EDGE_COLOR}" stroke-width="1.2">'
+    ]
+    for points, dashed in chart_edges(layout, nodes_by_id):
+        path = ' '.join(f'{x:.1f},{y:.1f}' for x, y in points)
+        dash = ' stroke-dasharray="4 3"' if dashed else ''
+        parts.append(f'<polyline points="{path}"{dash}/>')
+    parts.append('</g>')
+    
+    for node in layout['nodes']:
+        left, top = box_origin(node)
+        center = left + NODE_WIDTH / 2
+        parts.append(
+            f'<rect x="{left:.1f}" y="{top:.1f}" width="{NODE_WIDTH}" height="{NODE_HEIGHT}" rx="6" '
+            f'fill="{BOX_FILL}" stroke="{BOX_STROKE}"/>'
+        )
+        name_y = top + (NODE_HEIGHT / 2 - 3 if node['name_amharic'] else NODE_HEIGHT / 2 + 4)
+        parts.append(
+            f'<text x="{center:.1f}" y="{name_y:.1f}" font-size="{FONT_SIZE}" text-anchor="middle" '
+            f'fill="{TEXT_COLOR}"><title>{escape(node["name"])}</title>{escape(truncate(node["name"]))}</text>'
+        )
+        if node['name_amharic']:
+            parts.append(
+                f'<text x="{center:.1f}" y="{top + NODE_HEIGHT / 2 + 13:.1f}" font-size="{FONT_SIZE}" '
+                f'text-anchor="middle" fill="{TEXT_COLOR}" xml:lang="am">'
+                f'{escape(truncate(node["name_amharic"]))}</text>'
+            )
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def find_font():
+    if Config.CHART_FONT_PATH:
+        return Config.CHART_FONT_PATH
+    return next((path for path in FONT_CANDIDATES if os.path.exists(path)), None)
+
+
+def render_png(layout):
+    if Image is None:
+        raise ChartUnavailable('PNG export requires Pillow; use format=svg')
+    font_path = find_font()
+    if not font_path:
+        raise ChartUnavailable('PNG export requires a font with Ethiopic glyphs (set CHART_FONT_PATH); use format=svg')
+    
+    width, height = chart_size(layout)
+    if width * height > MAX_PNG_PIXELS:
+        raise ChartUnavailable('Chart too large for PNG; use format=svg or a smaller depth')
+    
+    font = ImageFont.truetype(font_path, FONT_SIZE)
+    title_font = ImageFont.truetype(font_path, TITLE_FONT_SIZE)
+    nodes_by_id = {node['id']: node for node in layout['nodes']}
+    image = Image.new('RGB', (width, height), '#ffffff')
+    draw = ImageDraw.Draw(image)
+    
+    draw.text((MARGIN, MARGIN), chart_title(layout, nodes_by_id), font=title_font, fill=TEXT_COLOR)
+    for points, dashed in chart_edges(layout, nodes_by_id):
+        if dashed:
+            for start, end in zip(points, points[1:]):
+                draw_dashed_line(draw, start, end)
+        else:
+            draw.line(points, fill=EDGE_COLOR, width=1)
+    
+    for node in layout['nodes']:
+        left, top = box_origin(node)
+        draw.rounded_rectangle(
+            (left, top, left + NODE_WIDTH, top + NODE_HEIGHT), radius=6, fill=BOX_FILL, outline=BOX_STROKE
+        )
+        center = left + NODE_WIDTH / 2
+        if node['name_amharic']:
+            draw.text((center, top + NODE_HEIGHT / 2 - 3), truncate(node['name']), font=font, fill=TEXT_COLOR, anchor='ms')
+            draw.text((center, top + NODE_HEIGHT / 2 + 13), truncate(node['name_amharic']), font=font, fill=TEXT_COLOR, anchor='ms')
+        else:
+            draw.text((center, top + NODE_HEIGHT / 2), truncate(node['name']), font=font, fill=TEXT_COLOR, anchor='mm')
+    
+    with tempfile.SpooledTemporaryFile() as buffer:
+        image.save(buffer, format='PNG', optimize=True)
+        buffer.seek(0)
+        return buffer.read()
+
+
+def draw_dashed_line(draw, start, end, dash=4, gap=3):
+    (x1, y1), (x2, y2) = start, end
+    length = ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+    if not length:
+        return
+    position = 0.0
+    while position < length:
+        stop = min(position + dash, length)
+        draw.line(
+            (x1 + (x2 - x1) * position / length, y1 + (y2 - y1) * position / length,
+             x1 + (x2 - x1) * stop / length, y1 + (y2 - y1) * stop / length),
+            fill=EDGE_COLOR, width=1
+        )
+        position = stop + gap
+
+
+RENDERERS = {'svg': render_svg, 'png': render_png}
+
+
+def chart_key(person_id, depth, layers, version, fmt):
+    """Content address of a chart: the same inputs always render the same bytes"""
+    source = f'{RENDER_VERSION}:{person_id}:{depth}:{",".join(layers)}:{version}:{fmt}'
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+
+def prune_cache(directory):
+    """Keep at most CHART_CACHE_MAX_FILES charts, dropping the least recently written"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+        if len(entries) <= Config.CHART_CACHE_MAX_FILES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - Config.CHART_CACHE_MAX_FILES]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # pruned by another request
+    except OSError as e:
+        logger.warning(f'Chart cache pruning failed: {e}')
+
+
+def read_cached(path):
+    """The cached chart's bytes, or None if it is not cached (or was pruned meanwhile)"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def render_to_cache(path, layout, fmt):
+    """Render and store the chart; returns its bytes, so a concurrent prune cannot lose them"""
+    data = read_cached(path)
+    if data is not None:
+        return data
+    data = RENDERERS[fmt](layout)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write then rename so readers never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    prune_cache(directory)
+    return data
+
+
+def get_chart(person_id, depth, layers, fmt):
+    """
+    (bytes, key) of the person's descendant chart in fmt ('svg' or 'png'),
+    rendered once per tree version; None if the person is not in the layer stack.
+    """
+    layout = get_layout(person_id, depth, layers)
+    if layout is None:
+        return None
+    
+    key = chart_key(layout['root_id'], depth, layout['layers'], layout['tree_version'], fmt)
+    path = os.path.join(Config.CHART_CACHE_DIR, f'{key}.{fmt}')
+    data = read_cached(path)
+    if data is None:
+        # Concurrent requests for the same chart share one render
+        data = render_flight.do(key, lambda: render_to_cache(path, layout, fmt))
+    return data, key
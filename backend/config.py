@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,16 +16,61 @@ class Config:
     # Root person ID (optional, will use oldest base person if not set)
     ROOT_PERSON_ID = os.environ.get('ROOT_PERSON_ID')
     
-    # Validate DATABASE_URL is set
-    if not DATABASE_URL:
-        raise ValueError(
-            "DATABASE_URL environment variable is required. "
-            "Please set it in your Render dashboard under Environment Variables."
-        )
-    
     SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    # json (one object per line) or text
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+    # Access-log sampling per path prefix, e.g. "/api/search=0.1,/api/suggest=0.05";
+    # errors and requests slower than LOG_SLOW_REQUEST_MS are always logged
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '')
+    LOG_SLOW_REQUEST_MS = float(os.environ.get('LOG_SLOW_REQUEST_MS', '1000'))
+    
+    # In-memory graph snapshot: updated after admin changes, and the change log is checked
+    # for other workers' changes after this many seconds
+    GRAPH_CACHE_TTL = int(os.environ.get('GRAPH_CACHE_TTL', '30'))
+    
+    # Warm the DB pool and graph snapshot in a background thread on startup (wsgi.py)
+    WARM_ON_STARTUP = os.environ.get('WARM_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Responses smaller than this many bytes are sent uncompressed
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '500'))
+    
+    # Per-client token-bucket rate limit for expensive graph endpoints
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_PER_MINUTE = int(os.environ.get('RATE_LIMIT_PER_MINUTE', '30'))
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', '10'))
+    # Proxies in front of the app that append to X-Forwarded-For (Render: 1); 0 uses the socket address
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1'))
+    # Per-process rate-limit buckets kept; the least recently used are dropped beyond this
+    RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000'))
+    
+    # Optional: share rate-limit buckets across workers (requires the redis package)
+    REDIS_URL = os.environ.get('REDIS_URL')
+    
+    # Rendered chart exports (SVG/PNG) are cached on disk here
+    CHART_CACHE_DIR = os.environ.get('CHART_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'royal-family-tree-charts')
+    CHART_CACHE_MAX_FILES = int(os.environ.get('CHART_CACHE_MAX_FILES', '500'))
+    # TrueType font with Ethiopic glyphs for PNG charts (e.g. Noto Sans Ethiopic)
+    CHART_FONT_PATH = os.environ.get('CHART_FONT_PATH')
+    
+    # Opt-in request profiling: fraction of requests profiled at random (0 = only on an
+    # admin X-Profile: 1 header), and profiles kept in memory per worker
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_MAX_STORED = int(os.environ.get('PROFILE_MAX_STORED', '50'))
+    
+    # Seconds between the background database checks behind /health and /readyz
+    HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', '15'))
+    
+    @classmethod
+    def validate(cls):
+        """Validate required settings (called from create_app, not at import time)"""
+        if not cls.DATABASE_URL:
+            raise ValueError(
+                "DATABASE_URL environment variable is required. "
+                "Please set it in your Render dashboard under Environment Variables."
+            )
 
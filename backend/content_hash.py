@@ -0,0 +1,143 @@
+"""
+Content hashes for idempotent re-imports.
+
+Every row applied by /admin/import/people or /admin/import/combined stores
+its hash (names, years, gender and, for combined rows, the parent). A row
+with a parent stores it on the relationship it created or confirmed, keyed by
+(parent, child, relation_type), so a child listed once per parent keeps one
+hash per row; a row without a parent stores it on the person. A re-import
+hashes its rows and looks them up with indexed content_hash IN (...) queries
+per batch: rows whose hash is already stored were imported before exactly as
+they are and are skipped, so re-importing a corrected file only writes the
+rows that changed.
+
+A row's hash is deleted with its relationship (person and branch deletes,
+reattach), so a row whose edge is gone is imported again. Every other write
+to a person's hashed fields clears the hashes that describe them - the
+person's own and those on the links to their parents - so the next
+re-import of the original row is applied again: the combined import's name
+merge, GEDCOM imports, /admin/import/people rows that update a person and
+ORM edits (a before_update hook). Names are whitespace-normalized but keep
+their case, so a capitalization fix is still imported.
+"""
+import hashlib
+import json
+import uuid
+from sqlalchemy import text, bindparam, event, inspect
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from models import db, Person, Relationship
+
+HASH_BATCH_SIZE = 5000
+
+# Person columns that go into a row hash
+HASHED_COLUMNS = ('name_original', 'name_amharic', 'birth_year', 'death_year', 'gender', 'layer')
+
+STORE_HASHES_SQL = text("""
+UPDATE people SET content_hash = v.content_hash
+FROM unnest(:ids, :hashes) AS v(id, content_hash)
+WHERE people.id = v.id
+""").bindparams(
+    bindparam('ids', type_=ARRAY(UUID(as_uuid=True))),
+    bindparam('hashes', type_=ARRAY(db.String))
+)
+
+STORE_RELATIONSHIP_HASHES_SQL = text("""
+UPDATE relationships SET content_hash = v.content_hash
+FROM unnest(:parent_ids, :child_ids, :relation_types, :hashes)
+    AS v(parent_id, child_id, relation_type, content_hash)
+WHERE relationships.parent_id = v.parent_id
+  AND relationships.child_id = v.child_id
+  AND relationships.relation_type = v.relation_type
+""").bindparams(
+    bindparam('parent_ids', type_=ARRAY(UUID(as_uuid=True))),
+    bindparam('child_ids', type_=ARRAY(UUID(as_uuid=True))),
+    bindparam('relation_types', type_=ARRAY(db.String)),
+    bindparam('hashes', type_=ARRAY(db.String))
+)
+
+CLEAR_PARENT_LINK_HASHES_SQL = text("""
+UPDATE relationships SET content_hash = NULL
+WHERE child_id = ANY(:ids) AND content_hash IS NOT NULL
+""").bindparams(bindparam('ids', type_=ARRAY(UUID(as_uuid=True))))
+
+
+def clean(value):
+    if isinstance(value, str):
+        return ' '.join(value.split()) or None
+    return value
+
+
+def row_hash(name_original, name_amharic=None, birth_year=None, death_year=None,
+             gender=None, layer=None, parent=None, relation_type=None):
+    """32-hex-digit hash of the person fields of an import row"""
+    fields = [
+        clean(name_original), clean(name_amharic), birth_year, death_year,
+        clean(gender),
+        layer,
+        (clean(parent) or '').lower() or None,
+        relation_type if parent else None
+    ]
+    source = json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32]
+
+
+def stored_hashes(hashes):
+    """{hash: person ID string} for the stored hashes (the child's ID for relationship hashes)"""
+    found = {}
+    hashes = list(set(hashes))
+    for start in range(0, len(hashes), HASH_BATCH_SIZE):
+        batch = hashes[start:start + HASH_BATCH_SIZE]
+        rows = db.session.query(Person.id, Person.content_hash).filter(Person.content_hash.in_(batch))
+        found.update((row.content_hash, str(row.id)) for row in rows)
+        rows = db.session.query(Relationship.child_id, Relationship.content_hash).filter(
+            Relationship.content_hash.in_(batch)
+        )
+        found.update((row.content_hash, str(row.child_id)) for row in rows)
+    return found
+
+
+def store_hashes(pairs):
+    """Write (person ID, hash) pairs of rows without a parent in the current transaction (the caller commits)"""
+    pairs = list({person_id: content_hash for person_id, content_hash in pairs}.items())
+    for start in range(0, len(pairs), HASH_BATCH_SIZE):
+        batch = pairs[start:start + HASH_BATCH_SIZE]
+        db.session.execute(STORE_HASHES_SQL, {
+            'ids': [uuid.UUID(str(person_id)) for person_id, _ in batch],
+            'hashes': [content_hash for _, content_hash in batch]
+        })
+
+
+def store_relationship_hashes(rows):
+    """Write (parent ID, child ID, relation type, hash) rows onto their relationships (the caller commits)"""
+    rows = [
+        key + (content_hash,) for key, content_hash in
+        {(parent_id, child_id, relation_type): content_hash
+         for parent_id, child_id, relation_type, content_hash in rows}.items()
+    ]
+    for start in range(0, len(rows), HASH_BATCH_SIZE):
+        batch = rows[start:start + HASH_BATCH_SIZE]
+        db.session.execute(STORE_RELATIONSHIP_HASHES_SQL, {
+            'parent_ids': [uuid.UUID(str(row[0])) for row in batch],
+            'child_ids': [uuid.UUID(str(row[1])) for row in batch],
+            'relation_types': [row[2] for row in batch],
+            'hashes': [row[3] for row in batch]
+        })
+
+
+def clear_link_hashes(person_ids, connection=None):
+    """Clear the row hashes on the parent links of people whose fields were rewritten"""
+    person_ids = [uuid.UUID(str(person_id)) for person_id in person_ids]
+    execute = (connection or db.session).execute
+    for start in range(0, len(person_ids), HASH_BATCH_SIZE):
+        execute(CLEAR_PARENT_LINK_HASHES_SQL, {'ids': person_ids[start:start + HASH_BATCH_SIZE]})
+
+
+@event.listens_for(Person, 'before_update')
+def clear_hashes_on_edit(mapper, connection, person):
+    """ORM edits of hashed fields invalidate the import rows that wrote them"""
+    state = inspect(person)
+    if state.attrs.content_hash.history.has_changes():
+        return
+    if any(state.attrs[column].history.has_changes() for column in HASHED_COLUMNS):
+        person.content_hash = None
+        clear_link_hashes([person.id], connection)
@@ -13,37 +13,21 @@ load_dotenv()
 
 from app import create_app, db
 from models import Person, Relationship
+from fuzzy import fuzzy_search
 
 app = create_app()
 
 with app.app_context():
-    # Search for "Ras Asrate" variations
-    search_terms = [
-        "ras asrate",
-        "ras asrat",
-        "asrate",
-        "asrat"
-    ]
-    
+    # Search for "Asrate" in any spelling (Asrat, Asratte, ...)
     print("Searching for duplicate entries...")
     print("=" * 60)
     
-    all_matches = []
-    for term in search_terms:
-        normalized = ' '.join(term.lower().split())
-        matches = Person.query.filter(
-            Person.name_normalized.like(f'%{normalized}%')
-        ).all()
-        all_matches.extend(matches)
-    
-    # Remove duplicates
-    unique_matches = {p.id: p for p in all_matches}.values()
+    matched_ids = [person_id for person_id, _ in fuzzy_search("asrate")]
+    matches = Person.query.filter(Person.id.in_(matched_ids)).all() if matched_ids else []
     
-    # Filter for "Ras Asrate" specifically
-    ras_asrate_matches = [
-        p for p in unique_matches 
-        if 'asrate' in p.name_normalized or 'asrat' in p.name_normalized
-    ]
+    # Keep the fuzzy ranking (closest spelling first)
+    order = {person_id: i for i, person_id in enumerate(matched_ids)}
+    ras_asrate_matches = sorted(matches, key=lambda p: order[str(p.id)])
     
     print(f"\nFound {len(ras_asrate_matches)} potential matches:\n")
     
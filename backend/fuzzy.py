@@ -0,0 +1,151 @@
+"""
+Typo-tolerant name search with a symmetric-delete (SymSpell) index.
+
+Romanized names come in many spellings (Asrate/Asrat, Haile/Hayle,
+Tekle/Takla). Every word of every name (English and Amharic) is indexed
+together with all strings obtained by deleting up to max_distance characters.
+Two words within edit distance d always share such a delete, so a query word
+is matched by generating its own deletes and looking them up - no scan of the
+names, and only the few candidates found are verified with an exact
+(Damerau-Levenshtein) distance.
+
+A person matches when every query word is close to some word of their name;
+results are ranked by total distance, then by how few extra words the name
+has. The index is built from the graph snapshot (graph.py) and rebuilt once
+per tree version, one per layer stack.
+"""
+import re
+import threading
+from graph import get_graph, MAX_CACHED_STACKS
+from layers import DEFAULT_STACK
+
+MAX_EDIT_DISTANCE = 2
+MAX_QUERY_WORDS = 6
+
+WORD_PATTERN = re.compile(r'\w+')
+
+_lock = threading.Lock()
+_cached = {}  # stack key -> NameIndex
+
+
+def name_words(text):
+    """Lowercase words of a name (English or Amharic), punctuation dropped"""
+    return WORD_PATTERN.findall(text.lower()) if text else []
+
+
+def max_distance(word):
+    """Edits allowed for a word: none up to two letters, one for three, two from four (Tekle/Takla)"""
+    if len(word) <= 2:
+        return 0
+    if len(word) == 3:
+        return 1
+    return MAX_EDIT_DISTANCE
+
+
+def deletes(word, distance):
+    """The word plus every string reachable by deleting up to distance characters"""
+    result = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance, or limit + 1 once it must exceed limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class NameIndex:
+    """Symmetric-delete index over the name words of one snapshot"""
+    
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.postings = {}      # word -> [person IDs]
+        self.word_counts = {}   # person ID -> words in their names
+        self.deletes = {}       # delete string -> [words]
+        for person_id, person in snapshot.people.items():
+            words = set(name_words(person['name'])) | set(name_words(person['name_amharic']))
+            self.word_counts[person_id] = len(words)
+            for word in words:
+                self.postings.setdefault(word, []).append(person_id)
+        for word in self.postings:
+            for variant in deletes(word, max_distance(word)):
+                self.deletes.setdefault(variant, []).append(word)
+    
+    def similar_words(self, word):
+        """{indexed word: distance} for words within the allowed distance of word"""
+        allowed = max_distance(word)
+        found = {}
+        for variant in deletes(word, allowed):
+            for candidate in self.deletes.get(variant, ()):
+                if candidate in found:
+                    continue
+                limit = min(allowed, max_distance(candidate))
+                distance = edit_distance(word, candidate, limit)
+                if distance <= limit:
+                    found[candidate] = distance
+        return found
+    
+    def search(self, query):
+        """[(person ID, total distance)] matching every query word, best first"""
+        words = name_words(query)[:MAX_QUERY_WORDS]
+        if not words:
+            return []
+        
+        scores = None
+        for word in words:
+            best = {}
+            for candidate, distance in self.similar_words(word).items():
+                for person_id in self.postings[candidate]:
+                    if distance < best.get(person_id, MAX_EDIT_DISTANCE + 1):
+                        best[person_id] = distance
+            if scores is None:
+                scores = best
+            else:
+                scores = {p: scores[p] + d for p, d in best.items() if p in scores}
+            if not scores:
+                return []
+        
+        return sorted(
+            scores.items(),
+            key=lambda item: (item[1], self.word_counts[item[0]] - len(words), item[0])
+        )
+
+
+def get_name_index(layers=DEFAULT_STACK):
+    """The stack's name index, rebuilt when the snapshot's tree version changes"""
+    snapshot = get_graph(layers)
+    key = snapshot.layers
+    index = _cached.get(key)
+    if index and index.version == snapshot.version:
+        return index
+    
+    with _lock:
+        index = _cached.get(key)
+        if not index or index.version != snapshot.version:
+            index = NameIndex(snapshot)
+            if len(_cached) >= MAX_CACHED_STACKS:
+                _cached.clear()
+            _cached[key] = index
+    return index
+
+
+def fuzzy_search(query, layers=DEFAULT_STACK):
+    """Ranked [(person ID, distance)] for a possibly misspelled name"""
+    return get_name_index(layers).search(query)
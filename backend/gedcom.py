@@ -0,0 +1,480 @@
+"""
+GEDCOM 5.5.1 export and import.
+
+The export is a generator over server-side cursors, so memory stays flat no
+matter how many people are written:
+  - INDI records stream from people ordered by ID, merge-joined with a second
+    cursor over (person, family) pairs in the same order to emit FAMS links,
+  - FAM records stream from children ordered by their (husband, wife) couple,
+    so each family's CHIL lines are contiguous and written as they arrive.
+Xrefs are derived from the UUIDs (and couple UUIDs for families) instead of
+being numbered, so no ID map has to be kept. Each INDI carries its full UUID
+in a REFN so it can be imported back unambiguously.
+
+The import parses records incrementally from a text stream and bulk-loads
+people and father/mother relationships in batches. Xrefs map to UUIDs without
+looking at names: a REFN of TYPE UUID is used as-is, anything else gets a
+UUID derived from (source, xref), so re-importing the same source updates the
+same people instead of creating duplicates.
+"""
+import hashlib
+import re
+import uuid
+from sqlalchemy import text, bindparam, select, values, column, func, literal, literal_column, exists
+from sqlalchemy.dialects.postgresql import UUID, insert
+from sqlalchemy.orm import aliased
+from models import db, Person, Relationship
+from layers import BASE_LAYER
+from changelog import record_changes, person_change, relationship_change
+from content_hash import clear_link_hashes
+
+GEDCOM_VERSION = '5.5.1'
+STREAM_BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024  # bytes of GEDCOM text per yielded chunk
+
+# People in the export: all base people, or a base branch (descendants of :root_id
+# plus their co-parents so each family is complete). Overlay layers are not exported.
+ALL_SCOPE = """
+scope AS (
+    SELECT id FROM people WHERE layer = 'base'
+)"""
+
+BRANCH_SCOPE = """
+descendants(id) AS (
+    SELECT id FROM people WHERE id = :root_id
+    UNION
+    SELECT r.child_id FROM relationships r
+    JOIN descendants d ON r.parent_id = d.id
+    WHERE r.visibility = 'public' AND r.layer = 'base'
+),
+scope AS (
+    SELECT id FROM descendants
+    UNION
+    SELECT r.parent_id FROM relationships r
+    WHERE r.visibility = 'public' AND r.layer = 'base'
+      AND r.child_id IN (SELECT id FROM descendants WHERE id != :root_id)
+)"""
+
+# One row per child with the couple it belongs to. 'parent' links fill the
+# father/mother slot by the parent's gender, else whichever slot is empty.
+COUPLES = """
+parent_slots AS (
+    SELECT r.child_id, r.parent_id,
+           CASE WHEN r.relation_type = 'father' THEN 1
+                WHEN r.relation_type = 'mother' THEN 2
+                WHEN p.gender = 'male' THEN 1
+                WHEN p.gender = 'female' THEN 2
+                ELSE 3 END AS slot
+    FROM relationships r
+    JOIN people p ON p.id = r.parent_id
+    WHERE r.visibility = 'public' AND r.layer = 'base'
+      AND r.child_id IN (SELECT id FROM scope)
+      AND r.parent_id IN (SELECT id FROM scope)
+),
+slots AS (
+    SELECT child_id,
+           MIN(CASE WHEN slot = 1 THEN CAST(parent_id AS TEXT) END) AS father,
+           MIN(CASE WHEN slot = 2 THEN CAST(parent_id AS TEXT) END) AS mother,
+           MIN(CASE WHEN slot = 3 THEN CAST(parent_id AS TEXT) END) AS other
+    FROM parent_slots
+    GROUP BY child_id
+),
+couples AS (
+    SELECT child_id,
+           COALESCE(father, other) AS husb,
+           CASE WHEN father IS NULL THEN mother ELSE COALESCE(mother, other) END AS wife
+    FROM slots
+)"""
+
+INDIVIDUALS_SQL = """
+SELECT CAST(p.id AS TEXT) AS person_key, p.name_original, p.name_amharic,
+       p.birth_year, p.death_year, p.gender, c.husb, c.wife
+FROM people p
+LEFT JOIN couples c ON c.child_id = p.id
+WHERE p.id IN (SELECT id FROM scope)
+ORDER BY CAST(p.id AS TEXT)
+"""
+
+SPOUSE_FAMILIES_SQL = """
+SELECT DISTINCT person_key, husb, wife FROM (
+    SELECT husb AS person_key, husb, wife FROM couples WHERE husb IS NOT NULL
+    UNION ALL
+    SELECT wife AS person_key, husb, wife FROM couples WHERE wife IS NOT NULL
+) spouses
+ORDER BY person_key, husb, wife
+"""
+
+FAMILIES_SQL = """
+SELECT c.husb, c.wife, CAST(c.child_id AS TEXT) AS child_key
+FROM couples c
+JOIN people p ON p.id = c.child_id
+ORDER BY c.husb, c.wife, p.created_at, CAST(c.child_id AS TEXT)
+"""
+
+
+def individual_xref(person_key):
+    """@I...@ xref from a person UUID (64 bits of it keeps xrefs under 20 characters)"""
+    return f'@I{uuid.UUID(person_key).hex[:16].upper()}@'
+
+
+def family_xref(husb, wife):
+    """@F...@ xref derived from the couple, so INDI and FAM records agree without a lookup"""
+    key = f'{uuid.UUID(husb).hex if husb else ""}:{uuid.UUID(wife).hex if wife else ""}'
+    return f'@F{hashlib.blake2b(key.encode(), digest_size=8).hexdigest().upper()}@'
+
+
+def gedcom_text(value):
+    """Single-line GEDCOM value: no line breaks, '@' doubled"""
+    return ' '.join(str(value).split()).replace('@', '@@')
+
+
+def header_lines():
+    return [
+        '0 HEAD',
+        '1 SOUR ROYAL_FAMILY_TREE',
+        '2 NAME Royal Family Tree',
+        '1 GEDC',
+        f'2 VERS {GEDCOM_VERSION}',
+        '2 FORM LINEAGE-LINKED',
+        '1 CHAR UTF-8',
+    ]
+
+
+def individual_lines(row, spouse_families):
+    lines = [
+        f'0 {individual_xref(row.person_key)} INDI',
+        f'1 NAME {gedcom_text(row.name_original)}',
+    ]
+    if row.name_amharic:
+        lines.append(f'1 NAME {gedcom_text(row.name_amharic)}')
+        lines.append('2 TYPE aka')
+    gender = (row.gender or '').lower()
+    lines.append(f"1 SEX {'M' if gender == 'male' else 'F' if gender == 'female' else 'U'}")
+    if row.birth_year:
+        lines += ['1 BIRT', f'2 DATE {row.birth_year}']
+    if row.death_year:
+        lines += ['1 DEAT', f'2 DATE {row.death_year}']
+    if row.husb or row.wife:
+        lines.append(f'1 FAMC {family_xref(row.husb, row.wife)}')
+    for husb, wife in spouse_families:
+        lines.append(f'1 FAMS {family_xref(husb, wife)}')
+    lines += [f'1 REFN {uuid.UUID(row.person_key)}', '2 TYPE UUID']
+    return lines
+
+
+def family_lines(husb, wife, children):
+    lines = [f'0 {family_xref(husb, wife)} FAM']
+    if husb:
+        lines.append(f'1 HUSB {individual_xref(husb)}')
+    if wife:
+        lines.append(f'1 WIFE {individual_xref(wife)}')
+    lines += [f'1 CHIL {individual_xref(child)}' for child in children]
+    return lines
+
+
+def _query(sql, root_id):
+    scope = BRANCH_SCOPE if root_id else ALL_SCOPE
+    statement = text(f'WITH RECURSIVE {scope},{COUPLES}{sql}')
+    if root_id:
+        statement = statement.bindparams(bindparam('root_id', type_=UUID(as_uuid=True)))
+    return statement
+
+
+def _stream(connection, sql, root_id):
+    params = {'root_id': uuid.UUID(str(root_id))} if root_id else {}
+    return connection.execution_options(yield_per=STREAM_BATCH_SIZE).execute(_query(sql, root_id), params)
+
+
+def iter_gedcom_lines(connection, root_id=None):
+    """Yield GEDCOM lines for all base people, or the branch rooted at root_id"""
+    yield from header_lines()
+    
+    individuals = _stream(connection, INDIVIDUALS_SQL, root_id)
+    spouse_rows = iter(_stream(connection, SPOUSE_FAMILIES_SQL, root_id))
+    pending = next(spouse_rows, None)
+    for row in individuals:
+        # Both cursors are ordered by the same key, so FAMS rows for this
+        # person (if any) are at the head of spouse_rows
+        spouse_families = []
+        while pending is not None and pending.person_key == row.person_key:
+            spouse_families.append((pending.husb, pending.wife))
+            pending = next(spouse_rows, None)
+        yield from individual_lines(row, spouse_families)
+    
+    current = None
+    children = []
+    for row in _stream(connection, FAMILIES_SQL, root_id):
+        couple = (row.husb, row.wife)
+        if couple != current:
+            if current is not None:
+                yield from family_lines(current[0], current[1], children)
+            current = couple
+            children = []
+        children.append(row.child_key)
+    if current is not None:
+        yield from family_lines(current[0], current[1], children)
+    
+    yield '0 TRLR'
+
+
+def export_gedcom(engine, root_id=None):
+    """Generator of UTF-8 encoded GEDCOM chunks; holds one connection while streaming"""
+    with engine.connect() as connection:
+        buffer = []
+        size = 0
+        for line in iter_gedcom_lines(connection, root_id):
+            encoded = (line + '\n').encode('utf-8')
+            buffer.append(encoded)
+            size += len(encoded)
+            if size >= CHUNK_SIZE:
+                yield b''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield b''.join(buffer)
+
+
+# ==================== IMPORT ====================
+
+IMPORT_BATCH_SIZE = 1000
+
+# Namespace for UUIDs derived from (source, xref) of external GEDCOM files
+GEDCOM_NAMESPACE = uuid.UUID('6f1c0d43-5a7e-4b8e-9a55-2d3f0c6b9e11')
+
+LINE_PATTERN = re.compile(r'^\s*(\d+)\s+(?:(@[^@]+@)\s+)?(\S+)(?:\s(.*))?$')
+YEAR_PATTERN = re.compile(r'(\d{3,4})(?!.*\d{3,4})')
+
+
+class GedcomRecord:
+    """A level-0 record: xref, tag, value and its sub-lines as (level, tag, value)"""
+    
+    def __init__(self, xref, tag, value):
+        self.xref = xref
+        self.tag = tag
+        self.value = value
+        self.lines = []
+    
+    def values(self, tag, level=1):
+        return [v for lvl, t, v in self.lines if lvl == level and t == tag]
+    
+    def substructures(self, tag):
+        """Yield the sub-lines under each level-1 line with this tag"""
+        current = None
+        for lvl, t, v in self.lines:
+            if lvl == 1:
+                if current is not None:
+                    yield current
+                current = [(lvl, t, v)] if t == tag else None
+            elif current is not None:
+                current.append((lvl, t, v))
+        if current is not None:
+            yield current
+
+
+def iter_records(lines):
+    """Parse GEDCOM lines into records one at a time"""
+    record = None
+    for raw in lines:
+        match = LINE_PATTERN.match(raw.rstrip('\r\n'))
+        if not match:
+            continue
+        level, xref, tag, value = int(match.group(1)), match.group(2), match.group(3).upper(), match.group(4) or ''
+        if level == 0:
+            if record is not None:
+                yield record
+            record = GedcomRecord(xref, tag, value)
+        elif record is not None:
+            record.lines.append((level, tag, value.replace('@@', '@')))
+    if record is not None:
+        yield record
+
+
+def clean_name(value):
+    """'Given /Surname/' -> 'Given Surname'"""
+    return ' '.join(value.replace('/', ' ').split())
+
+
+def event_year(record, tag):
+    for sub in record.substructures(tag):
+        for lvl, t, v in sub:
+            if t == 'DATE':
+                match = YEAR_PATTERN.search(v)
+                if match:
+                    return int(match.group(1))
+    return None
+
+
+def record_uuid(record):
+    """UUID stored by our own export (REFN with TYPE UUID), if any"""
+    for sub in record.substructures('REFN'):
+        if any(t == 'TYPE' and v.strip().upper() == 'UUID' for lvl, t, v in sub[1:]):
+            try:
+                return uuid.UUID(sub[0][2].strip())
+            except ValueError:
+                return None
+    return None
+
+
+def person_row(record, person_id, layer=BASE_LAYER):
+    """Person column values from an INDI record, or None if it has no name"""
+    names = [clean_name(v) for v in record.values('NAME')]
+    names = [n for n in names if n]
+    if not names:
+        return None
+    latin = [n for n in names if all(ord(c) < 128 for c in n)]
+    other = [n for n in names if n not in latin]
+    name_original = latin[0] if latin else names[0]
+    sex = (record.values('SEX') or [''])[0].strip().upper()
+    return {
+        'id': person_id,
+        'name_original': name_original,
+        'name_amharic': other[0] if other and other[0] != name_original else None,
+        'name_normalized': ' '.join(name_original.lower().split()),
+        'layer': layer,
+        'birth_year': event_year(record, 'BIRT'),
+        'death_year': event_year(record, 'DEAT'),
+        'gender': {'M': 'male', 'F': 'female'}.get(sex)
+    }
+
+
+class GedcomImporter:
+    """One-pass GEDCOM loader; call feed() with records, then finish()"""
+    
+    def __init__(self, source, layer=BASE_LAYER, batch_size=IMPORT_BATCH_SIZE):
+        self.source = source
+        self.layer = layer
+        self.batch_size = batch_size
+        self.xref_ids = {}       # only xrefs whose INDI carries its own UUID
+        self.people_batch = []
+        self.edges = []          # (parent xref, child xref, relation_type)
+        self.people_created = 0
+        self.people_updated = 0
+        self.relationships_created = 0
+        self.families = 0
+        self.rejected = []
+    
+    def person_id(self, xref):
+        return self.xref_ids.get(xref) or uuid.uuid5(GEDCOM_NAMESPACE, f'{self.source}:{xref}')
+    
+    def feed(self, record):
+        if record.tag == 'INDI' and record.xref:
+            own_id = record_uuid(record)
+            if own_id:
+                self.xref_ids[record.xref] = own_id
+            row = person_row(record, own_id or self.person_id(record.xref), self.layer)
+            if row is None:
+                self.rejected.append({'record': record.xref, 'reason': 'INDI record has no NAME'})
+                return
+            self.people_batch.append(row)
+            if len(self.people_batch) >= self.batch_size:
+                self.flush_people()
+        elif record.tag == 'FAM':
+            self.families += 1
+            husbands = record.values('HUSB')
+            wives = record.values('WIFE')
+            for child in record.values('CHIL'):
+                for husband in husbands[:1]:
+                    self.edges.append((husband.strip(), child.strip(), 'father'))
+                for wife in wives[:1]:
+                    self.edges.append((wife.strip(), child.strip(), 'mother'))
+    
+    def flush_people(self):
+        if not self.people_batch:
+            return
+        # A file may repeat an INDI; keep the last occurrence so one statement
+        # never touches the same row twice
+        rows = list({row['id']: row for row in self.people_batch}.values())
+        statement = insert(Person).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Person.id],
+            set_={
+                'name_original': statement.excluded.name_original,
+                'name_amharic': statement.excluded.name_amharic,
+                'name_normalized': statement.excluded.name_normalized,
+                'birth_year': statement.excluded.birth_year,
+                'death_year': statement.excluded.death_year,
+                'gender': statement.excluded.gender,
+                # Written outside the CSV/JSON imports: their next re-import must not skip this row
+                'content_hash': None
+            }
+        ).returning(Person.id, Person.layer, literal_column('(xmax = 0)').label('inserted'))
+        changes = []
+        for person_id, layer, inserted in db.session.execute(statement):
+            if inserted:
+                self.people_created += 1
+            else:
+                self.people_updated += 1
+            changes.append(person_change('insert' if inserted else 'update', person_id, layer))
+        record_changes(db.session, changes)
+        clear_link_hashes(change['entity_id'] for change in changes if change['op'] == 'update')
+        self.people_batch = []
+    
+    def flush_edges(self, edges):
+        rows = []
+        for parent_xref, child_xref, relation_type in edges:
+            parent_id = self.person_id(parent_xref)
+            child_id = self.person_id(child_xref)
+            if parent_id != child_id:
+                rows.append((parent_id, child_id, relation_type))
+        if not rows:
+            return
+        
+        # Only edges whose people exist; a pair already linked (with any relation
+        # type, e.g. 'parent' exported as HUSB) is left untouched
+        edge_values = values(
+            column('parent_id', UUID(as_uuid=True)),
+            column('child_id', UUID(as_uuid=True)),
+            column('relation_type', db.String),
+            name='edges'
+        ).data(rows)
+        parent = aliased(Person)
+        child = aliased(Person)
+        source = select(
+            func.gen_random_uuid(), edge_values.c.parent_id, edge_values.c.child_id,
+            edge_values.c.relation_type, literal_column("'public'"), literal(self.layer)
+        ).select_from(edge_values).join(
+            parent, parent.id == edge_values.c.parent_id
+        ).join(
+            child, child.id == edge_values.c.child_id
+        ).where(
+            ~exists().where(
+                Relationship.parent_id == edge_values.c.parent_id,
+                Relationship.child_id == edge_values.c.child_id
+            )
+        )
+        statement = insert(Relationship).from_select(
+            ['id', 'parent_id', 'child_id', 'relation_type', 'visibility', 'layer'], source
+        ).on_conflict_do_nothing().returning(Relationship.id, Relationship.parent_id, Relationship.child_id)
+        created = db.session.execute(statement).all()
+        self.relationships_created += len(created)
+        record_changes(db.session, [
+            relationship_change('insert', rel_id, self.layer, parent_id, child_id)
+            for rel_id, parent_id, child_id in created
+        ])
+    
+    def finish(self):
+        """Write the remaining people, then all relationships (their people now exist)"""
+        self.flush_people()
+        for start in range(0, len(self.edges), self.batch_size):
+            self.flush_edges(self.edges[start:start + self.batch_size])
+        
+        return {
+            'people': {
+                'created': self.people_created,
+                'updated': self.people_updated
+            },
+            'relationships': {
+                'created': self.relationships_created,
+                'skipped': len(self.edges) - self.relationships_created
+            },
+            'families': self.families,
+            'rejected': self.rejected
+        }
+
+
+def import_gedcom(lines, source, layer=BASE_LAYER):
+    """Import a GEDCOM text stream into a layer; the caller commits"""
+    importer = GedcomImporter(source, layer)
+    for record in iter_records(lines):
+        importer.feed(record)
+    return importer.finish()
@@ -0,0 +1,251 @@
+"""
+In-memory snapshot of a layer stack (people + public relationships).
+
+Loading the whole graph takes two queries, so traversals that would otherwise
+issue one query per hop (BFS, ancestor walks) read from this snapshot instead.
+One snapshot is kept per layer stack (layers.py); a stack is still loaded with
+the same two queries.
+
+Snapshots carry the tree version (changelog.py) they reflect. After an admin
+change in this process (invalidate_graph), or once GRAPH_CACHE_TTL seconds have
+passed (changes made by other workers), the snapshot is brought up to date by
+applying the change log since its version: only the people and adjacency lists
+touched by those changes are reloaded. A full rebuild happens only without a
+previous snapshot or after a large batch of changes.
+"""
+import threading
+import time
+import uuid
+import logging
+from sqlalchemy import or_
+from models import db, Person, Relationship
+from changelog import current_version, changes_since
+from config import Config
+from layers import DEFAULT_STACK, stack_key
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_snapshots = {}  # stack key -> GraphSnapshot
+_generation = 0  # bumped by invalidate_graph
+
+# Larger deltas rebuild the snapshot from scratch
+MAX_DELTA_CHANGES = 1000
+
+# Snapshots kept for non-default stacks before the oldest is dropped
+MAX_CACHED_STACKS = 8
+
+
+class GraphSnapshot:
+    """Adjacency lists for a layer stack, keyed by person ID string"""
+    
+    def __init__(self, people, parents, children, version, layers=DEFAULT_STACK):
+        self.people = people        # id -> person dict (to_dict shape + years/gender)
+        self.parents = parents      # child id -> [(parent id, relation_type), ...]
+        self.children = children    # parent id -> [child id, ...] in import order
+        self.version = version      # change-log tree version
+        self.layers = layers
+        self.generation = _generation
+        self.built_at = time.time()
+    
+    def person_dict(self, person_id):
+        """Public dict for a person (same shape as Person.to_dict)"""
+        person = self.people.get(str(person_id))
+        if not person:
+            return None
+        return {'id': person['id'], 'name': person['name'], 'name_amharic': person['name_amharic']}
+    
+    def preferred_parent(self, person_id):
+        """Parent ID preferring father, else mother, else any (same rule as the API)"""
+        rels = self.parents.get(str(person_id), [])
+        for wanted in ('father', 'mother'):
+            for parent_id, relation_type in rels:
+                if relation_type == wanted:
+                    return parent_id
+        return rels[0][0] if rels else None
+    
+    def is_current(self):
+        return self.generation == _generation and time.time() - self.built_at <= Config.GRAPH_CACHE_TTL
+
+
+def load_people(layers, ids=None):
+    """Person dicts for the stack (optionally only the given IDs), keyed by ID string"""
+    query = db.session.query(
+        Person.id, Person.name_original, Person.name_amharic,
+        Person.birth_year, Person.death_year, Person.gender
+    ).filter(Person.layer.in_(layers))
+    if ids is not None:
+        query = query.filter(Person.id.in_(ids))
+    people = {}
+    for row in query:
+        person_id = str(row.id)
+        people[person_id] = {
+            'id': person_id,
+            'name': row.name_original,
+            'name_amharic': row.name_amharic or None,
+            'birth_year': row.birth_year,
+            'death_year': row.death_year,
+            'gender': row.gender
+        }
+    return people
+
+
+def load_relationships(layers, *criteria):
+    """Public relationships in the stack, in import order"""
+    return db.session.query(
+        Relationship.parent_id, Relationship.child_id, Relationship.relation_type
+    ).filter(
+        Relationship.visibility == 'public', Relationship.layer.in_(layers), *criteria
+    ).order_by(Relationship.created_at.asc(), Relationship.id.asc()).all()  # id breaks ties deterministically
+
+
+def build_graph(version, layers=DEFAULT_STACK):
+    """Load the stack's people and public relationships with two bulk queries"""
+    people = load_people(layers)
+    parents = {}
+    children = {}
+    for rel in load_relationships(layers):
+        parent_id = str(rel.parent_id)
+        child_id = str(rel.child_id)
+        if parent_id not in people or child_id not in people:
+            continue
+        parents.setdefault(child_id, []).append((parent_id, rel.relation_type))
+        children.setdefault(parent_id, []).append(child_id)
+    
+    return GraphSnapshot(people, parents, children, version, layers)
+
+
+def apply_changes(snapshot, changes, version):
+    """
+    New snapshot with the change-log rows applied: changed people are reloaded, and
+    the parent lists of affected children and child lists of affected parents are
+    rebuilt from the database. The old snapshot is left untouched for its readers.
+    """
+    layers = snapshot.layers
+    person_ids = {c.entity_id for c in changes if c.entity == 'person'}
+    parent_ids = {c.parent_id for c in changes if c.entity == 'relationship'} | person_ids
+    child_ids = {c.child_id for c in changes if c.entity == 'relationship'} | person_ids
+    
+    people = dict(snapshot.people)
+    if person_ids:
+        fresh = load_people(layers, person_ids)
+        for person_id in person_ids:
+            key = str(person_id)
+            if key in fresh:
+                people[key] = fresh[key]
+            else:
+                people.pop(key, None)  # deleted or moved out of the stack
+        # A person entering or leaving the stack also changes the lists of its
+        # relatives, which the change rows do not name
+        for rel in load_relationships(
+            layers, or_(Relationship.parent_id.in_(person_ids), Relationship.child_id.in_(person_ids))
+        ):
+            parent_ids.add(rel.parent_id)
+            child_ids.add(rel.child_id)
+        for person_id in person_ids:
+            key = str(person_id)
+            for parent_id, _ in snapshot.parents.get(key, ()):
+                parent_ids.add(parent_id)
+            child_ids.update(snapshot.children.get(key, ()))
+    
+    parent_keys = {str(p) for p in parent_ids}
+    child_keys = {str(c) for c in child_ids}
+    parents = dict(snapshot.parents)
+    children = dict(snapshot.children)
+    for key in parent_keys:
+        children.pop(key, None)
+    for key in child_keys:
+        parents.pop(key, None)
+    
+    for rel in load_relationships(layers, or_(
+        Relationship.parent_id.in_([uuid.UUID(k) for k in parent_keys]),
+        Relationship.child_id.in_([uuid.UUID(k) for k in child_keys])
+    )):
+        parent_id = str(rel.parent_id)
+        child_id = str(rel.child_id)
+        if parent_id not in people or child_id not in people:
+            continue
+        if child_id in child_keys:
+            parents.setdefault(child_id, []).append((parent_id, rel.relation_type))
+        if parent_id in parent_keys:
+            children.setdefault(parent_id, []).append(child_id)
+    
+    return GraphSnapshot(people, parents, children, version, layers)
+
+
+def refresh_graph(snapshot, layers):
+    """Bring a stack's snapshot up to the current tree version"""
+    started = time.perf_counter()
+    version = current_version()
+    
+    if snapshot is not None and snapshot.version == version:
+        # Nothing committed since; just restart the TTL
+        snapshot.generation = _generation
+        snapshot.built_at = time.time()
+        return snapshot
+    
+    if snapshot is not None and snapshot.version < version:
+        changes, has_more = changes_since(snapshot.version, limit=MAX_DELTA_CHANGES, until=version)
+        if not has_more and len(changes) <= MAX_DELTA_CHANGES:
+            updated = apply_changes(snapshot, changes, version)
+            logger.info(
+                f'Graph snapshot for {",".join(layers)} updated to version {version}: '
+                f'{len(changes)} changes in {(time.perf_counter() - started) * 1000:.1f} ms'
+            )
+            return updated
+    
+    snapshot = build_graph(version, layers)
+    logger.info(
+        f'Graph snapshot built for {",".join(layers)} at version {version}: {len(snapshot.people)} people, '
+        f'{sum(len(c) for c in snapshot.children.values())} relationships '
+        f'in {(time.perf_counter() - started) * 1000:.1f} ms'
+    )
+    return snapshot
+
+
+def get_graph(layers=DEFAULT_STACK):
+    """Return the stack's snapshot, refreshing it if missing, invalidated or stale"""
+    key = stack_key(layers)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot.is_current():
+        return snapshot
+    
+    with _lock:
+        # Another thread may have refreshed it while we waited
+        snapshot = _snapshots.get(key)
+        if snapshot is None or not snapshot.is_current():
+            snapshot = refresh_graph(snapshot, key)
+            _snapshots.pop(key, None)
+            _snapshots[key] = snapshot
+            if len(_snapshots) > MAX_CACHED_STACKS:
+                # Drop the least recently refreshed stack other than the default one
+                oldest = next(k for k in _snapshots if k != DEFAULT_STACK)
+                del _snapshots[oldest]
+    return snapshot
+
+
+def invalidate_graph():
+    """Mark snapshots out of date (call after committing admin changes)"""
+    global _generation
+    with _lock:
+        _generation += 1
+
+
+def snapshot_status():
+    """Cached snapshots without loading or refreshing anything (for /readyz)"""
+    now = time.time()
+    return [
+        {
+            'layers': list(key),
+            'version': snapshot.version,
+            'people': len(snapshot.people),
+            'age_s': round(now - snapshot.built_at, 1),
+            'current': snapshot.is_current()
+        }
+        for key, snapshot in list(_snapshots.items())
+    ]
+
+
+def tree_version(layers=DEFAULT_STACK):
+    """Tree version (change-log version) of the stack's current snapshot, for cache keys"""
+    return get_graph(layers).version
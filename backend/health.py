@@ -0,0 +1,125 @@
+"""
+Liveness and readiness without a database round trip per probe.
+
+/livez only proves the process serves requests. /readyz (and /health) read a
+status that a background thread refreshes every HEALTH_CHECK_INTERVAL seconds:
+one SELECT 1 (with its latency), the latest tree version and the time of the
+last admin change from the change log. Probe responses add the connection pool
+statistics, the cached graph snapshots and the last integrity report from
+memory, so a probe costs no connection however often it is called.
+
+The monitor thread starts with the first probe in each worker; that first probe
+runs the check itself. A worker is ready while the database answered the
+latest check and that check is recent (within three intervals).
+"""
+import threading
+import time
+import logging
+from sqlalchemy import func
+from models import db, ChangeLog
+from config import Config
+from graph import snapshot_status
+from layers import DEFAULT_STACK
+from integrity import last_report
+from request_log import dropped_records
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER_INTERVALS = 3
+
+_started_at = time.time()
+_lock = threading.Lock()
+_monitor = None
+_status = None
+
+
+def check_database():
+    """Run the probe queries; returns the status dict (never raises)"""
+    started = time.perf_counter()
+    status = {'checked_at': time.time()}
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        status['latency_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        version, last_change = db.session.query(
+            func.coalesce(func.max(ChangeLog.tree_version), 0), func.max(ChangeLog.created_at)
+        ).one()
+        status.update(
+            database='connected',
+            tree_version=version,
+            last_change_at=last_change.isoformat() if last_change else None
+        )
+    except Exception as e:
+        logger.error(f'Database health check failed: {e}')
+        status.update(database='disconnected', error=str(e))
+    finally:
+        db.session.remove()
+    return status
+
+
+def run_monitor(app):
+    global _status
+    while True:
+        time.sleep(Config.HEALTH_CHECK_INTERVAL)
+        with app.app_context():
+            _status = check_database()
+
+
+def current_status(app):
+    """The latest database status, starting the monitor (and checking once) on first use"""
+    global _monitor, _status
+    if _monitor is None:
+        with _lock:
+            if _monitor is None:
+                with app.app_context():
+                    _status = check_database()
+                _monitor = threading.Thread(target=run_monitor, args=(app,), name='health-monitor', daemon=True)
+                _monitor.start()
+    return _status
+
+
+def pool_status():
+    pool = db.engine.pool
+    stats = {'status': pool.status()}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
+def readiness(app):
+    """(ready, report) for /readyz"""
+    status = current_status(app)
+    age = time.time() - status['checked_at']
+    fresh = age <= STALE_AFTER_INTERVALS * Config.HEALTH_CHECK_INTERVAL
+    ready = status['database'] == 'connected' and fresh
+    
+    snapshots = snapshot_status()
+    report = last_report()
+    default = next((s for s in snapshots if tuple(s['layers']) == DEFAULT_STACK), None)
+    behind_by = None
+    if default is not None and status['database'] == 'connected':
+        # Versions committed (by any worker) that this worker's snapshot has not applied yet
+        behind_by = status['tree_version'] - default['version']
+    return ready, {
+        'status': 'ready' if ready else 'not_ready',
+        'uptime_s': round(time.time() - _started_at, 1),
+        'database': dict(status, age_s=round(age, 1), stale=not fresh),
+        'pool': pool_status(),
+        'graph': {
+            'loaded': default is not None,
+            'behind_by': behind_by,
+            'snapshots': snapshots
+        },
+        'integrity': {
+            'ok': report['ok'],
+            'counts': report['counts'],
+            'checked_at': report['checked_at']
+        } if report else None,
+        'log_records_dropped': dropped_records()
+    }
+
+
+def liveness():
+    """Liveness payload (no I/O)"""
+    return {'status': 'ok', 'uptime_s': round(time.time() - _started_at, 1)}
@@ -0,0 +1,242 @@
+"""
+Dry run of /admin/import/combined: what an import would do, without writing.
+
+The people named in the file (as children and as parents), the people given
+by ID and the relationships of every parent candidate are loaded with a few
+bulk IN queries. The import is then replayed in memory with the same rules
+import_combined applies row by row: name matching, duplicate-name
+disambiguation (ID, birth/death year, existing children, most recent) and
+duplicate-relationship checks. People created earlier in the file are visible
+to later rows, exactly as they are during a real import.
+"""
+import uuid
+from datetime import datetime, timezone
+from models import db, Person, Relationship
+from bulk_people import most_recent
+
+# Values per IN (...) query
+PLAN_BATCH_SIZE = 5000
+
+# created_at for people the import would create: newer than everything stored
+NOT_YET_CREATED = datetime.max.replace(tzinfo=timezone.utc)
+
+
+class PlannedPerson:
+    """A stored person, or one the import would create (id is None)"""
+    
+    __slots__ = ('id', 'name_original', 'name_amharic', 'birth_year', 'death_year', 'created_at', 'row')
+    
+    def __init__(self, id, name_original, name_amharic, birth_year=None, death_year=None,
+                 created_at=NOT_YET_CREATED, row=None):
+        self.id = id
+        self.name_original = name_original
+        self.name_amharic = name_amharic
+        self.birth_year = birth_year
+        self.death_year = death_year
+        self.created_at = created_at
+        self.row = row
+    
+    @property
+    def key(self):
+        """Stable reference for matching: the UUID string, or new:<row> for people to create"""
+        return str(self.id) if self.id else f'new:{self.row}'
+    
+    def describe(self):
+        return {'id': str(self.id) if self.id else None, 'name': self.name_original}
+
+
+def batches(values):
+    values = list(values)
+    for start in range(0, len(values), PLAN_BATCH_SIZE):
+        yield values[start:start + PLAN_BATCH_SIZE]
+
+
+def id_batches(ids):
+    """batches() of ID strings or UUIDs, as UUIDs for the IN lists"""
+    return batches(uuid.UUID(str(person_id)) for person_id in ids)
+
+
+def load_people_by_name(names):
+    """Base-layer people per normalized name, oldest first"""
+    by_name = {}
+    for batch in batches(names):
+        rows = db.session.query(
+            Person.id, Person.name_normalized, Person.name_original, Person.name_amharic,
+            Person.birth_year, Person.death_year, Person.created_at
+        ).filter(Person.layer == 'base', Person.name_normalized.in_(batch)).order_by(
+            Person.created_at.asc(), Person.id.asc()
+        )
+        for row in rows:
+            by_name.setdefault(row.name_normalized, []).append(PlannedPerson(
+                row.id, row.name_original, row.name_amharic, row.birth_year, row.death_year, row.created_at
+            ))
+    return by_name
+
+
+def load_existing_ids(ids):
+    """Stored person IDs (any layer) among ids"""
+    found = set()
+    for batch in id_batches(ids):
+        found.update(str(row.id) for row in db.session.query(Person.id).filter(Person.id.in_(batch)))
+    return found
+
+
+def load_edges(parent_ids):
+    """(parent, child, relation_type) triples of the given parents, as ID strings"""
+    edges = set()
+    for batch in id_batches(parent_ids):
+        rows = db.session.query(
+            Relationship.parent_id, Relationship.child_id, Relationship.relation_type
+        ).filter(Relationship.parent_id.in_(batch))
+        edges.update((str(row.parent_id), str(row.child_id), row.relation_type) for row in rows)
+    return edges
+
+
+def plan_combined_import(people_data, relationships_data, normalize_name, known_ids=None):
+    """
+    The people and relationships import_combined would create, update, match
+    ambiguously or reject for the same parsed rows. Row numbers follow the
+    real import's (people_data and relationships_data indexes). known_ids maps
+    the names of skipped, unchanged rows to their people.
+    """
+    known_ids = known_ids or {}
+    child_names = {normalize_name(entry['english_name']) for entry in people_data}
+    parent_names = {normalize_name(rel['parent_english_name']) for rel in relationships_data}
+    by_name = load_people_by_name(child_names | parent_names)
+    
+    direct_ids = set()
+    for entry in people_data:
+        try:
+            direct_ids.add(uuid.UUID(entry['id']))
+        except (KeyError, ValueError, TypeError, AttributeError):
+            pass
+    existing_ids = load_existing_ids(direct_ids) | set(known_ids.values())
+    
+    # Step 1: people (import_people_batch updates the most recent person with the normalized name)
+    people_plan = {'create': [], 'update': [], 'unchanged': 0, 'ambiguous': [], 'rejected': []}
+    for idx, entry in enumerate(people_data):
+        english_name = entry['english_name']
+        amharic_name = entry.get('amharic_name')
+        name_normalized = normalize_name(english_name)
+        candidates = by_name.get(name_normalized)
+        if not candidates:
+            by_name[name_normalized] = [PlannedPerson(None, english_name, amharic_name, row=idx)]
+            people_plan['create'].append({'row': idx, 'name': english_name, 'name_amharic': amharic_name})
+            continue
+        
+        existing = most_recent(candidates)
+        changes = {}
+        if existing.name_original != english_name:
+            changes['name_original'] = [existing.name_original, english_name]
+        if amharic_name and existing.name_amharic != amharic_name:
+            changes['name_amharic'] = [existing.name_amharic, amharic_name]
+        if changes:
+            people_plan['update'].append({'row': idx, 'id': existing.describe()['id'], 'changes': changes})
+            existing.name_original = english_name
+            if amharic_name:
+                existing.name_amharic = amharic_name
+        else:
+            people_plan['unchanged'] += 1
+    
+    # Step 2: name -> person, with the same disambiguation as the real import
+    name_to_person = {
+        name: PlannedPerson(uuid.UUID(person_id), name, None) for name, person_id in known_ids.items()
+    }
+    for idx, entry in enumerate(people_data):
+        english_name = entry['english_name']
+        person_id = entry.get('id')
+        try:
+            if person_id and str(uuid.UUID(person_id)) in existing_ids:
+                name_to_person[english_name] = PlannedPerson(uuid.UUID(person_id), english_name, None)
+                continue
+        except (ValueError, TypeError, AttributeError):
+            pass  # Invalid UUID, fall through to name matching
+        
+        candidates = by_name.get(normalize_name(english_name), [])
+        if not candidates:
+            continue
+        if len(candidates) == 1:
+            name_to_person[english_name] = candidates[0]
+            continue
+        
+        matched, resolved_by = None, 'most_recent'
+        if entry.get('birth_year'):
+            matched = next((p for p in candidates if p.birth_year == entry['birth_year']), None)
+            resolved_by = 'birth_year'
+        if not matched and entry.get('death_year'):
+            matched = next((p for p in candidates if p.death_year == entry['death_year']), None)
+            resolved_by = 'death_year'
+        if not matched:
+            matched, resolved_by = most_recent(candidates), 'most_recent'
+        name_to_person[english_name] = matched
+        people_plan['ambiguous'].append({
+            'row': idx,
+            'name': english_name,
+            'candidates': [p.describe()['id'] for p in candidates],
+            'matched': matched.describe()['id'],
+            'resolved_by': resolved_by
+        })
+    
+    # Step 3: relationships, against the stored edges of every parent candidate
+    parent_candidate_ids = {
+        str(p.id) for name in parent_names for p in by_name.get(name, ()) if p.id
+    }
+    edges = load_edges(parent_candidate_ids | existing_ids)
+    pairs = {(parent, child) for parent, child, _ in edges}
+    parents_with_children = {parent for parent, _, _ in edges}
+    
+    rels_plan = {'create': [], 'existing': 0, 'ambiguous': [], 'rejected': []}
+    for idx, rel in enumerate(relationships_data):
+        parent_name = rel['parent_english_name']
+        parent = name_to_person.get(parent_name)
+        child = name_to_person.get(rel['child_english_name'])
+        
+        if not parent:
+            candidates = by_name.get(normalize_name(parent_name), [])
+            if len(candidates) == 1:
+                parent = candidates[0]
+            elif len(candidates) > 1:
+                resolved_by = None
+                if child:
+                    parent = next((p for p in candidates if (p.key, child.key) in pairs), None)
+                    resolved_by = 'existing_relationship' if parent else None
+                    if not parent:
+                        parent = next((p for p in candidates if p.key in parents_with_children), None)
+                        resolved_by = 'has_children' if parent else None
+                if not parent:
+                    parent, resolved_by = most_recent(candidates), 'most_recent'
+                rels_plan['ambiguous'].append({
+                    'row': idx,
+                    'parent': parent_name,
+                    'candidates': [p.describe()['id'] for p in candidates],
+                    'matched': parent.describe()['id'],
+                    'resolved_by': resolved_by
+                })
+            if parent:
+                name_to_person[parent_name] = parent
+        
+        if not parent:
+            rels_plan['rejected'].append({'row': idx, 'reason': f"Parent '{parent_name}' not found."})
+            continue
+        if not child:
+            rels_plan['rejected'].append({'row': idx, 'reason': f"Child '{rel['child_english_name']}' not found."})
+            continue
+        if parent.key == child.key:
+            rels_plan['rejected'].append({'row': idx, 'reason': 'Parent and child cannot be the same'})
+            continue
+        
+        edge = (parent.key, child.key, rel['relation_type'])
+        if edge in edges:
+            rels_plan['existing'] += 1
+            continue
+        edges.add(edge)
+        pairs.add((parent.key, child.key))
+        parents_with_children.add(parent.key)
+        rels_plan['create'].append({
+            'row': idx,
+            'parent': parent.describe(),
+            'child': child.describe(),
+            'relation_type': rel['relation_type']
+        })
+    
+    return {'people': people_plan, 'relationships': rels_plan}
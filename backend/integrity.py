@@ -0,0 +1,194 @@
+"""
+Whole-graph integrity checks, in linear time over all layers.
+
+People and relationships are loaded with two column-only queries, then:
+
+  - cycles: strongly connected components of the parent -> child graph
+    (Tarjan, iterative) with more than one person, or one person who is
+    their own parent
+  - multiple_parents: children with more than one distinct father, or mother,
+    or more than two parents in all; a 'parent' link counts as a father or
+    mother link by the parent's gender
+  - orphaned_relationships: rows whose parent or child does not exist, or a
+    base-layer row touching a person outside base (hidden from base readers)
+  - birth_year_inversions: parents born in the same year as, or after, a child
+
+Runs in the background after every admin change (maintenance.py) and on demand from
+/admin/validate or validate_tree.py. The latest report is kept in memory.
+"""
+import time
+import logging
+from models import db, Person, Relationship
+from layers import BASE_LAYER
+
+logger = logging.getLogger(__name__)
+
+# Problems listed per category; the counts are always complete
+MAX_REPORTED = 100
+
+# How a 'parent' link counts towards the one-father, one-mother check
+GENDER_ROLES = {'male': 'father', 'female': 'mother'}
+
+_last_report = None
+
+
+def tarjan_scc(nodes, edges):
+    """Strongly connected components (lists of nodes) of the graph, iteratively"""
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+    for start in nodes:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(edges.get(start, ())))]
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(edges.get(successor, ()))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+def check_graph(people, rels):
+    """
+    Problems by category in people ({id string: row with name_original,
+    birth_year, gender, layer}) and rels (rows with id, parent_id, child_id,
+    relation_type, layer)
+    """
+    def person_ref(person_id):
+        person = people.get(person_id)
+        return {'id': person_id, 'name': person.name_original if person else None}
+    
+    edges = {}
+    orphaned = []
+    inversions = []
+    parents_by_role = {}  # child id -> {'father'/'mother'/'parent': {parent ids}}
+    for rel in rels:
+        parent_id, child_id = str(rel.parent_id), str(rel.child_id)
+        parent, child = people.get(parent_id), people.get(child_id)
+        if parent is None or child is None:
+            orphaned.append({
+                'relationship_id': str(rel.id),
+                'reason': 'missing parent' if parent is None else 'missing child',
+                'parent_id': parent_id,
+                'child_id': child_id
+            })
+            continue
+        if rel.layer == BASE_LAYER and (parent.layer != BASE_LAYER or child.layer != BASE_LAYER):
+            orphaned.append({
+                'relationship_id': str(rel.id),
+                'reason': 'base relationship to a person outside base',
+                'parent_id': parent_id,
+                'child_id': child_id
+            })
+        edges.setdefault(parent_id, []).append(child_id)
+        role = rel.relation_type
+        if role == 'parent':
+            role = GENDER_ROLES.get(parent.gender, 'parent')
+        parents_by_role.setdefault(child_id, {}).setdefault(role, set()).add(parent_id)
+        if parent.birth_year is not None and child.birth_year is not None and parent.birth_year >= child.birth_year:
+            inversions.append({
+                'relationship_id': str(rel.id),
+                'parent': dict(person_ref(parent_id), birth_year=parent.birth_year),
+                'child': dict(person_ref(child_id), birth_year=child.birth_year)
+            })
+    
+    cycles = [
+        [person_ref(person_id) for person_id in component]
+        for component in tarjan_scc(list(edges), edges)
+        if len(component) > 1 or component[0] in edges.get(component[0], ())
+    ]
+    multiple_parents = []
+    for child_id, roles in parents_by_role.items():
+        found = [(role, roles[role]) for role in ('father', 'mother') if len(roles.get(role, ())) > 1]
+        all_parents = set().union(*roles.values())
+        if not found and len(all_parents) > 2:
+            found = [('any', all_parents)]
+        multiple_parents.extend(
+            {
+                'child': person_ref(child_id),
+                'relation_type': role,
+                'parents': [person_ref(parent_id) for parent_id in sorted(parent_ids)]
+            }
+            for role, parent_ids in found
+        )
+    
+    return {
+        'cycles': cycles,
+        'multiple_parents': multiple_parents,
+        'orphaned_relationships': orphaned,
+        'birth_year_inversions': inversions
+    }
+
+
+def validate_tree():
+    """Integrity report for the whole stored graph"""
+    started = time.perf_counter()
+    people = {
+        str(row.id): row
+        for row in db.session.query(
+            Person.id, Person.name_original, Person.birth_year, Person.gender, Person.layer
+        )
+    }
+    rels = db.session.query(
+        Relationship.id, Relationship.parent_id, Relationship.child_id,
+        Relationship.relation_type, Relationship.layer
+    ).all()
+    
+    problems = check_graph(people, rels)
+    return {
+        'ok': not any(problems.values()),
+        'people': len(people),
+        'relationships': len(rels),
+        'counts': {name: len(found) for name, found in problems.items()},
+        'problems': {name: found[:MAX_REPORTED] for name, found in problems.items()},
+        'checked_at': time.time(),
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def run_validation():
+    """Validate, keep the report for last_report() and log a summary of any problems"""
+    global _last_report
+    report = validate_tree()
+    _last_report = report
+    if not report['ok']:
+        found = ', '.join(f'{count} {name}' for name, count in report['counts'].items() if count)
+        logger.warning(f'Tree integrity problems: {found} (see /admin/validate)')
+    return report
+
+
+def last_report():
+    """The most recent report from this process, or None"""
+    return _last_report
@@ -0,0 +1,158 @@
+"""
+Nested-interval labels over the preferred-parent tree.
+
+Every person's displayed lineage follows one preferred parent (father, else
+mother, else any - the rule /api/neighborhood uses). Those links form a
+forest; an Euler tour over it numbers each person on entry (tree_pre) and on
+exit (tree_post) with one shared counter. Then:
+
+  - Y's branch is every person with Y.tree_pre <= tree_pre <= Y.tree_post,
+    a range predicate on the indexed tree_pre column, and
+  - X descends from Y iff Y.tree_pre < X.tree_pre and X.tree_post < Y.tree_post,
+    a constant-time comparison.
+
+Labels cover the base layer only - people and links in other layers get no
+labels, so an overlay never changes a base answer. They are recomputed in
+memory after each admin change, on a background thread (maintenance.py; O(n)
+with two column-only queries); only rows whose labels moved are written.
+Reads over another layer stack walk that stack's graph snapshot instead
+(preferred_branch, descends_from).
+"""
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from models import db, Person, Relationship
+from layers import BASE_LAYER
+
+# pg_advisory_xact_lock key that serializes relabelling
+LABEL_LOCK_KEY = 727366
+UPDATE_BATCH_SIZE = 5000
+
+UPDATE_LABELS_SQL = text("""
+UPDATE people SET tree_pre = v.tree_pre, tree_post = v.tree_post
+FROM unnest(:ids, :pres, :posts) AS v(id, tree_pre, tree_post)
+WHERE people.id = v.id
+""").bindparams(
+    bindparam('ids', type_=ARRAY(UUID(as_uuid=True))),
+    bindparam('pres', type_=ARRAY(db.Integer)),
+    bindparam('posts', type_=ARRAY(db.Integer))
+)
+
+
+def preferred_parent_forest():
+    """
+    (people, children, roots): current labels per person ID (every layer) in
+    creation order, the base-layer preferred-parent tree as parent ID -> [child
+    IDs], and the base people without a base parent.
+    """
+    people = {}
+    base_people = set()
+    for row in db.session.query(Person.id, Person.tree_pre, Person.tree_post, Person.layer).order_by(
+        Person.created_at.asc(), Person.id.asc()
+    ):
+        people[row.id] = (row.tree_pre, row.tree_post)
+        if row.layer == BASE_LAYER:
+            base_people.add(row.id)
+    rank = {'father': 0, 'mother': 1}
+    preferred = {}
+    for rel in db.session.query(
+        Relationship.parent_id, Relationship.child_id, Relationship.relation_type
+    ).filter(Relationship.visibility == 'public', Relationship.layer == BASE_LAYER).order_by(
+        Relationship.created_at.asc(), Relationship.id.asc()
+    ):
+        if rel.child_id not in base_people or rel.parent_id not in base_people:
+            continue
+        current = preferred.get(rel.child_id)
+        if current is None or rank.get(rel.relation_type, 2) < rank.get(current[1], 2):
+            preferred[rel.child_id] = (rel.parent_id, rel.relation_type)
+    
+    children = {}
+    for child_id, (parent_id, _) in preferred.items():
+        children.setdefault(parent_id, []).append(child_id)
+    # Siblings in creation order, so labels move as little as possible between runs
+    order = {person_id: i for i, person_id in enumerate(people)}
+    for kids in children.values():
+        kids.sort(key=lambda c: order.get(c, -1))
+    roots = [p for p in people if p in base_people and p not in preferred]
+    return people, children, roots
+
+
+def compute_labels(roots, children):
+    """Euler-tour (tree_pre, tree_post) per person reachable from the roots"""
+    labels = {}
+    counter = 0
+    for root in roots:
+        counter += 1
+        pre = {root: counter}
+        stack = [(root, iter(children.get(root, ())))]
+        while stack:
+            node, kids = stack[-1]
+            child = next(kids, None)
+            if child is None:
+                stack.pop()
+                counter += 1
+                labels[node] = (pre[node], counter)
+            elif child not in pre and child not in labels:
+                counter += 1
+                pre[child] = counter
+                stack.append((child, iter(children.get(child, ()))))
+    return labels
+
+
+def refresh_labels():
+    """
+    Recompute labels and write the changed ones in the current transaction
+    (the caller commits). People outside base, or on a preferred-parent cycle,
+    get no labels.
+    Returns the number of people whose labels changed.
+    """
+    db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': LABEL_LOCK_KEY})
+    people, children, roots = preferred_parent_forest()
+    labels = compute_labels(roots, children)
+    
+    changed = [
+        (person_id, *labels.get(person_id, (None, None)))
+        for person_id, current in people.items()
+        if labels.get(person_id, (None, None)) != current
+    ]
+    for start in range(0, len(changed), UPDATE_BATCH_SIZE):
+        batch = changed[start:start + UPDATE_BATCH_SIZE]
+        db.session.execute(UPDATE_LABELS_SQL, {
+            'ids': [row[0] for row in batch],
+            'pres': [row[1] for row in batch],
+            'posts': [row[2] for row in batch]
+        })
+    return len(changed)
+
+
+def is_descendant(person_labels, ancestor_labels):
+    """Constant-time test on (tree_pre, tree_post) pairs; False when either is unlabelled"""
+    if None in person_labels or None in ancestor_labels:
+        return False
+    return ancestor_labels[0] < person_labels[0] and person_labels[1] < ancestor_labels[1]
+
+
+def preferred_branch(snapshot, root_id):
+    """IDs of root_id and their descendants along the snapshot's preferred-parent lines"""
+    root_id = str(root_id)
+    branch = {root_id}
+    stack = [root_id]
+    while stack:
+        node = stack.pop()
+        for child in snapshot.children.get(node, ()):
+            if child not in branch and snapshot.preferred_parent(child) == node:
+                branch.add(child)
+                stack.append(child)
+    return branch
+
+
+def descends_from(snapshot, person_id, ancestor_id):
+    """is_descendant() by walking the snapshot's preferred parents (for non-base stacks)"""
+    ancestor_id = str(ancestor_id)
+    seen = set()
+    node = snapshot.preferred_parent(str(person_id))
+    while node is not None and node not in seen:
+        if node == ancestor_id:
+            return True
+        seen.add(node)
+        node = snapshot.preferred_parent(node)
+    return False
@@ -0,0 +1,288 @@
+"""
+Kinship engine over the full parent DAG (fathers, mothers and other parents).
+
+Works on a GraphSnapshot (graph.py), so a relationship query costs no database
+round trips. For two people it:
+  1. walks up all parents of each person once, recording the minimum
+     generation depth of every ancestor,
+  2. intersects the two ancestor maps and keeps the lowest common ancestors
+     (common ancestors none of whose children are also common ancestors),
+  3. ranks one kinship path per lowest common ancestor by consanguinity
+     degree (full before half relations).
+
+The coefficient of relationship is twice the kinship coefficient, computed
+with the standard recursion (KinshipCoefficients) rather than from the lowest
+common ancestors alone: a common ancestor above an LCA still contributes
+through paths that avoid the LCA (e.g. through a second child of that
+ancestor), and an inbred ancestor contributes (1 + F) instead of 1.
+"""
+from collections import deque
+
+MAX_PATHS = 10
+
+
+def ancestor_depths(snapshot, person_id):
+    """BFS up all parents: {ancestor_id: minimum generations above person} (person at 0)"""
+    depths = {person_id: 0}
+    queue = deque([person_id])
+    while queue:
+        current = queue.popleft()
+        depth = depths[current] + 1
+        for parent_id, _ in snapshot.parents.get(current, ()):
+            if parent_id not in depths:
+                depths[parent_id] = depth
+                queue.append(parent_id)
+    return depths
+
+
+def lowest_common_ancestors(snapshot, depths1, depths2):
+    """Common ancestors that have no child which is also a common ancestor"""
+    if len(depths1) > len(depths2):
+        small, large = depths2, depths1
+    else:
+        small, large = depths1, depths2
+    common = {a for a in small if a in large}
+    return [
+        a for a in common
+        if not any(child in common for child in snapshot.children.get(a, ()))
+    ]
+
+
+def parents_first(snapshot, person_ids):
+    """
+    {person: rank} over the people and all their ancestors, every parent ranked
+    before its children. People on a cycle are ranked after the rest; the
+    recursion below ignores parent links that do not go to a lower rank.
+    """
+    seen = set(person_ids)
+    queue = deque(person_ids)
+    while queue:
+        node = queue.popleft()
+        for parent_id, _ in snapshot.parents.get(node, ()):
+            if parent_id not in seen:
+                seen.add(parent_id)
+                queue.append(parent_id)
+    
+    pending = {node: len({p for p, _ in snapshot.parents.get(node, ())}) for node in seen}
+    ready = deque(node for node, count in pending.items() if count == 0)
+    rank = {}
+    while ready:
+        node = ready.popleft()
+        rank[node] = len(rank)
+        for child in set(snapshot.children.get(node, ())):
+            if child in pending and child not in rank:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+    for node in sorted(seen - rank.keys()):
+        rank[node] = len(rank)
+    return rank
+
+
+class KinshipCoefficients:
+    """
+    Kinship coefficients phi by the standard recursion, memoized across pairs:
+      
+      phi(x, x) = (1 + F_x) / 2, with F_x = phi between x's parents
+      phi(x, y) = sum over x's parents p of w * phi(p, y), x ranked after y
+    
+    Each recorded parent passes on a gene with probability w = 1/2 (1/k when a
+    person has k > 2 recorded parents); unrecorded parents are unrelated to
+    everyone. The coefficient of relationship is 2 * phi.
+    """
+    
+    def __init__(self, snapshot, person_ids):
+        self.rank = parents_first(snapshot, person_ids)
+        self.parents = {}
+        for node, node_rank in self.rank.items():
+            ids = {p for p, _ in snapshot.parents.get(node, ())}
+            self.parents[node] = [p for p in ids if self.rank[p] < node_rank]
+        self.memo = {}
+    
+    def key(self, a, b):
+        return (a, b) if self.rank[a] >= self.rank[b] else (b, a)
+    
+    def dependencies(self, a, b):
+        parents = self.parents[a]
+        if a == b:
+            return [self.key(p, q) for i, p in enumerate(parents) for q in parents[i + 1:]]
+        return [self.key(p, b) for p in parents]
+    
+    def evaluate(self, a, b):
+        parents = self.parents[a]
+        memo = self.memo
+        if a == b:
+            pairs = [memo[self.key(p, q)] for i, p in enumerate(parents) for q in parents[i + 1:]]
+            inbreeding = sum(pairs) / len(pairs) if pairs else 0.0
+            return (1 + inbreeding) / 2
+        weight = 1 / max(2, len(parents))
+        return weight * sum(memo[self.key(p, b)] for p in parents)
+    
+    def phi(self, a, b):
+        """Kinship coefficient of two people of the set (iterative, so deep trees are fine)"""
+        root = self.key(a, b)
+        stack = [root]
+        while stack:
+            pair = stack[-1]
+            if pair in self.memo:
+                stack.pop()
+                continue
+            missing = [d for d in self.dependencies(*pair) if d not in self.memo]
+            if missing:
+                stack.extend(missing)
+                continue
+            self.memo[pair] = self.evaluate(*pair)
+            stack.pop()
+        return self.memo[root]
+    
+    def relationship(self, a, b):
+        """Coefficient of relationship (1.0 for the same person)"""
+        return 1.0 if a == b else 2 * self.phi(a, b)
+
+
+def shortest_path_down(snapshot, ancestor_id, depths):
+    """
+    One shortest lineage from the person (depth 0) up to ancestor_id, as a list of
+    IDs starting with the person. Steps down from the ancestor through children
+    whose depth is one less, preferring the snapshot's child order.
+    """
+    path = [ancestor_id]
+    current = ancestor_id
+    while depths[current] > 0:
+        wanted = depths[current] - 1
+        current = next(c for c in snapshot.children.get(current, ()) if depths.get(c) == wanted)
+        path.append(current)
+    path.reverse()
+    return path
+
+
+def is_half_relation(snapshot, ancestor_id, child1_id, child2_id):
+    """
+    The two children of the common ancestor on each line are half-siblings only when
+    both have another recorded parent and those parents differ. Most imported rows
+    record a single parent, so an unknown second parent is not treated as half.
+    """
+    if child1_id == child2_id:
+        return False
+    others1 = {p for p, _ in snapshot.parents.get(child1_id, ()) if p != ancestor_id}
+    others2 = {p for p, _ in snapshot.parents.get(child2_id, ()) if p != ancestor_id}
+    return bool(others1) and bool(others2) and not (others1 & others2)
+
+
+def ordinal(n):
+    if 10 <= n % 100 <= 20:
+        suffix = 'th'
+    else:
+        suffix = {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th')
+    return f'{n}{suffix}'
+
+
+def removed_text(n):
+    return {0: '', 1: ' Once Removed', 2: ' Twice Removed'}.get(n, f' {n} Times Removed')
+
+
+def greats(n):
+    return 'Great-' * n
+
+
+def kinship_labels(gen1, gen2, half=False):
+    """
+    Describe a relationship from each person's generations below the common ancestor.
+    Returns (relationship_type, person1_label, person2_label).
+    """
+    prefix = 'Half-' if half else ''
+    
+    if gen1 == 0 and gen2 == 0:
+        return 'Same person', 'Same Person', 'Same Person'
+    
+    if gen1 == 0 or gen2 == 0:
+        # One is a direct ancestor of the other
+        distance = gen1 + gen2
+        older = greats(distance - 2) + ('Grandparent' if distance > 1 else 'Parent')
+        younger = greats(distance - 2) + ('Grandchild' if distance > 1 else 'Child')
+        relationship_type = f'{older} and {younger}'
+        return (relationship_type, older, younger) if gen1 == 0 else (relationship_type, younger, older)
+    
+    if gen1 == 1 and gen2 == 1:
+        if half:
+            return 'Half-Siblings', 'Half-Sibling', 'Half-Sibling'
+        return 'Siblings (same parent)', 'Sibling', 'Sibling'
+    
+    if gen1 == 1 or gen2 == 1:
+        # Aunt/Uncle line: the one at generation 1 is the sibling of an ancestor
+        extra = greats(max(gen1, gen2) - 2)
+        elder = f'{prefix}{extra}Aunt/Uncle'
+        junior = f'{prefix}{extra}Niece/Nephew'
+        relationship_type = f'{elder} and {junior}'
+        return (relationship_type, elder, junior) if gen1 == 1 else (relationship_type, junior, elder)
+    
+    cousin = f'{prefix}{ordinal(min(gen1, gen2) - 1)} Cousin'
+    removed = removed_text(abs(gen1 - gen2))
+    return f'{cousin}s{removed}', f'{cousin}{removed}', f'{cousin}{removed}'
+
+
+def compute_kinship(snapshot, person1_id, person2_id, max_paths=MAX_PATHS):
+    """
+    Relationship between two people over all parent links.
+    Returns {'common_ancestors', 'paths', 'coefficient_of_relationship'}; paths are ranked
+    closest first (civil degree, then canon degree, full before half relations).
+    """
+    person1_id = str(person1_id)
+    person2_id = str(person2_id)
+    depths1 = ancestor_depths(snapshot, person1_id)
+    depths2 = ancestor_depths(snapshot, person2_id)
+    
+    lcas = lowest_common_ancestors(snapshot, depths1, depths2)
+    if not lcas:
+        return {'common_ancestors': [], 'paths': [], 'coefficient_of_relationship': 0.0}
+    
+    # Over all common ancestors, not only the LCAs (see the module docstring)
+    coefficient = KinshipCoefficients(snapshot, [person1_id, person2_id]).relationship(person1_id, person2_id)
+    
+    paths = []
+    for a in lcas:
+        gen1, gen2 = depths1[a], depths2[a]
+        path1 = shortest_path_down(snapshot, a, depths1)
+        path2 = shortest_path_down(snapshot, a, depths2)
+        half = gen1 > 0 and gen2 > 0 and is_half_relation(snapshot, a, path1[gen1 - 1], path2[gen2 - 1])
+        relationship_type, label1, label2 = kinship_labels(gen1, gen2, half)
+        paths.append({
+            'common_ancestor': snapshot.person_dict(a),
+            'person1_generations': gen1,
+            'person2_generations': gen2,
+            'degree': gen1 + gen2,
+            'canon_degree': max(gen1, gen2),
+            'half': half,
+            'relationship_type': relationship_type,
+            'person1_relationship_label': label1,
+            'person2_relationship_label': label2,
+            'person1_path': [snapshot.person_dict(p) for p in path1],
+            'person2_path': [snapshot.person_dict(p) for p in path2],
+        })
+    paths.sort(key=lambda p: (
+        p['degree'], p['canon_degree'], p['half'], p['common_ancestor']['name']
+    ))
+    paths = paths[:max_paths]
+    
+    common_ancestors = [
+        dict(snapshot.person_dict(a), person1_generations=depths1[a], person2_generations=depths2[a])
+        for a in sorted(lcas, key=lambda a: (depths1[a] + depths2[a], snapshot.people[a]['name']))
+    ]
+    
+    return {
+        'common_ancestors': common_ancestors,
+        'paths': paths,
+        'coefficient_of_relationship': round(coefficient, 6)
+    }
+
+
+def preferred_lineage(snapshot, person_id):
+    """Person followed by preferred parents (father, else mother) up to the root"""
+    lineage = []
+    seen = set()
+    current = str(person_id)
+    while current and current not in seen:
+        seen.add(current)
+        lineage.append(snapshot.person_dict(current))
+        current = snapshot.preferred_parent(current)
+    return lineage
@@ -0,0 +1,156 @@
+"""
+Pairwise kinship for a group of people in one pass.
+
+The shared ancestors of the group are found with one upward BFS, ordered
+children-before-parents, and the depth matrix is filled in that single pass
+with column operations covering every person at once:
+
+  D[i, a]  generations from person i up to ancestor a (inf if not an ancestor)
+
+For a row i, every pair (i, j) is then evaluated at once with NumPy: common
+ancestors are a boolean mask, and lowest common ancestors are the common ones
+with no child in the mask (a reduceat over the ancestors' child edges). Only
+the labels of the closest LCA per pair are finished in Python. The
+coefficient of relationship of pairs with a common ancestor comes from one
+kinship.KinshipCoefficients shared by the whole group (its memo is reused
+across pairs), the same definition /api/relationship uses.
+"""
+from collections import deque
+import numpy as np
+from kinship import shortest_path_down, is_half_relation, kinship_labels, KinshipCoefficients
+
+MAX_MATRIX_PEOPLE = 100
+
+
+def shared_ancestors(snapshot, person_ids):
+    """Everyone reachable upward from the group, children before parents (cycles are dropped)"""
+    seen = set(person_ids)
+    queue = deque(person_ids)
+    while queue:
+        node = queue.popleft()
+        for parent_id, _ in snapshot.parents.get(node, ()):
+            if parent_id not in seen:
+                seen.add(parent_id)
+                queue.append(parent_id)
+    
+    pending = {a: sum(1 for c in snapshot.children.get(a, ()) if c in seen) for a in seen}
+    ready = deque(a for a, count in pending.items() if count == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for parent_id, _ in snapshot.parents.get(node, ()):
+            pending[parent_id] -= 1
+            if pending[parent_id] == 0:
+                ready.append(parent_id)
+    return order
+
+
+class RowDepths:
+    """Read-only {ancestor: depth} view of one row of D, for kinship.shortest_path_down"""
+    
+    def __init__(self, row, universe):
+        self.row = row
+        self.universe = universe
+    
+    def get(self, node, default=None):
+        column = self.universe.get(node)
+        if column is None or not np.isfinite(self.row[column]):
+            return default
+        return int(self.row[column])
+    
+    def __getitem__(self, node):
+        return int(self.row[self.universe[node]])
+
+
+def compute_kinship_matrix(snapshot, person_ids):
+    """
+    Matrices over person_ids (ID strings present in the snapshot):
+    degree, generations, closest common ancestor, relationship labels and
+    coefficient of relationship for every ordered pair.
+    """
+    n = len(person_ids)
+    ancestors = shared_ancestors(snapshot, person_ids)
+    universe = {a: k for k, a in enumerate(ancestors)}
+    size = len(ancestors)
+    
+    D = np.full((n, size), np.inf)
+    for i, person_id in enumerate(person_ids):
+        if person_id in universe:
+            D[i, universe[person_id]] = 0
+    
+    # Child edges inside the ancestor universe, grouped by parent (for the DP and reduceat)
+    edges = sorted(
+        (universe[a], universe[c])
+        for a in ancestors for c in snapshot.children.get(a, ()) if c in universe
+    )
+    edge_parents = np.array([p for p, _ in edges], dtype=np.int64)
+    edge_children = np.array([c for _, c in edges], dtype=np.int64)
+    if edges:
+        parents_with_children, starts = np.unique(edge_parents, return_index=True)
+        ends = np.append(starts[1:], len(edges))
+        # Columns are in children-before-parents order, so each parent's children are final
+        for a, start, end in zip(parents_with_children, starts, ends):
+            kids = edge_children[start:end]
+            D[:, a] = np.minimum(D[:, a], D[:, kids].min(axis=1) + 1)
+    F = np.isfinite(D)
+    
+    degree = [[None] * n for _ in range(n)]
+    generations = [[None] * n for _ in range(n)]
+    common = [[None] * n for _ in range(n)]
+    relationship = [[None] * n for _ in range(n)]
+    labels = [[None] * n for _ in range(n)]
+    coefficient = np.zeros((n, n))
+    kinship = KinshipCoefficients(snapshot, list(person_ids))
+    paths = {}  # (row, ancestor) -> shortest lineage, for half-relation checks
+    
+    def lineage(row, a):
+        if (row, a) not in paths:
+            paths[(row, a)] = shortest_path_down(snapshot, a, RowDepths(D[row], universe))
+        return paths[(row, a)]
+    
+    for i in range(n):
+        common_mask = F[i] & F  # (n, size): common ancestors of (i, j) for every j
+        has_common_child = np.zeros_like(common_mask)
+        if edges:
+            has_common_child[:, parents_with_children] = np.logical_or.reduceat(
+                common_mask[:, edge_children], starts, axis=1
+            )
+        lca = common_mask & ~has_common_child
+        
+        total = np.where(lca, D[i] + D, np.inf)
+        # Closest first by civil degree, then canon degree (ties keep universe order)
+        rank = total * 1024 + np.maximum(D[i], D)
+        best = np.argmin(rank, axis=1)
+        
+        for j in range(n):
+            a_idx = best[j]
+            if not lca[j, a_idx]:
+                continue
+            a = ancestors[a_idx]
+            coefficient[i, j] = kinship.relationship(person_ids[i], person_ids[j])
+            gen1, gen2 = int(D[i, a_idx]), int(D[j, a_idx])
+            half = gen1 > 0 and gen2 > 0 and is_half_relation(
+                snapshot, a, lineage(i, a)[gen1 - 1], lineage(j, a)[gen2 - 1]
+            )
+            relationship_type, label1, _ = kinship_labels(gen1, gen2, half)
+            degree[i][j] = gen1 + gen2
+            generations[i][j] = [gen1, gen2]
+            common[i][j] = a
+            relationship[i][j] = relationship_type
+            labels[i][j] = label1
+    
+    ancestor_ids = sorted({a for row in common for a in row if a is not None})
+    ancestor_index = {a: k for k, a in enumerate(ancestor_ids)}
+    
+    return {
+        'people': [snapshot.person_dict(p) for p in person_ids],
+        'ancestors': [snapshot.person_dict(a) for a in ancestor_ids],
+        'common_ancestor': [[ancestor_index.get(a) for a in row] for row in common],
+        'degree': degree,
+        'generations': generations,
+        'relationship_type': relationship,
+        'label': labels,
+        'coefficient_of_relationship': np.round(coefficient, 6).tolist(),
+        'tree_version': snapshot.version
+    }
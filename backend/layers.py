@@ -0,0 +1,49 @@
+"""
+Layer stacks for overlay reads.
+
+Every person and relationship belongs to one layer: 'base' is the book's tree,
+other layers (e.g. a family's private branch) attach to it without copying it.
+A read names a stack of layers (?layers=base,family-abebe) and sees the union
+of their rows. Each read is still a single query - the stack becomes one
+`layer IN (...)` predicate served by the composite (layer, ...) indexes - so
+stacking layers never multiplies queries per hop.
+"""
+import re
+
+BASE_LAYER = 'base'
+DEFAULT_STACK = (BASE_LAYER,)
+MAX_STACK_SIZE = 5
+
+LAYER_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,49}$')
+
+
+def parse_layer_stack(value):
+    """
+    Parse a comma-separated layer stack. Returns a tuple of layer names in the
+    given order without duplicates; raises ValueError for invalid input.
+    """
+    if not value:
+        return DEFAULT_STACK
+    names = [name.strip().lower() for name in value.split(',') if name.strip()]
+    if not names:
+        return DEFAULT_STACK
+    for name in names:
+        if not LAYER_NAME_PATTERN.match(name):
+            raise ValueError(f'Invalid layer name: {name}')
+    stack = tuple(dict.fromkeys(names))
+    if len(stack) > MAX_STACK_SIZE:
+        raise ValueError(f'Too many layers (max {MAX_STACK_SIZE})')
+    return stack
+
+
+def validate_layer_name(value):
+    """Validate a single layer name for writes; returns the normalized name"""
+    name = (value or BASE_LAYER).strip().lower()
+    if not LAYER_NAME_PATTERN.match(name):
+        raise ValueError(f'Invalid layer name: {name}')
+    return name
+
+
+def stack_key(layers):
+    """Order-independent cache key for a stack (the union does not depend on order)"""
+    return tuple(sorted(layers))
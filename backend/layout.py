@@ -0,0 +1,257 @@
+"""
+Tidy-tree layout of a descendant chart, computed on the server.
+
+Uses Walker's algorithm with Buchheim, Jünger and Leipert's linear-time
+improvements (threads, ancestor pointers and deferred shifts): parents are
+centred over their children, identical subtrees are drawn identically and
+siblings are at least one unit apart. Coordinates are in sibling-distance
+units (x) and generations (y), so the client only scales them.
+
+The chart is the spanning tree reached by level order from the root over the
+graph snapshot: a descendant with two parents in the chart (a cousin marriage)
+is placed under the first one reached, and the other link is returned in
+extra_edges. Layouts are cached per (root, depth, layer stack, tree version).
+"""
+import threading
+from collections import OrderedDict
+from graph import get_graph
+from layers import DEFAULT_STACK
+
+DEFAULT_LAYOUT_DEPTH = 4
+MAX_LAYOUT_DEPTH = 30
+MAX_LAYOUT_NODES = 5000
+MAX_CACHED_LAYOUTS = 256
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+class LayoutNode:
+    """Node state for the Buchheim-Walker passes"""
+    
+    __slots__ = ('id', 'parent', 'children', 'number', 'depth', 'x', 'mod',
+                 'thread', 'ancestor', 'change', 'shift')
+    
+    def __init__(self, node_id, parent, number, depth):
+        self.id = node_id
+        self.parent = parent
+        self.children = []
+        self.number = number  # 1-based position among siblings
+        self.depth = depth
+        self.x = 0.0
+        self.mod = 0.0
+        self.thread = None
+        self.ancestor = self
+        self.change = 0.0
+        self.shift = 0.0
+    
+    def left(self):
+        return self.thread or (self.children[0] if self.children else None)
+    
+    def right(self):
+        return self.thread or (self.children[-1] if self.children else None)
+    
+    def left_brother(self):
+        if self.parent is None or self.number == 1:
+            return None
+        return self.parent.children[self.number - 2]
+    
+    def leftmost_sibling(self):
+        if self.parent is None or self.number == 1:
+            return None
+        return self.parent.children[0]
+
+
+def first_walk(v, distance=1.0):
+    """Post-order pass: preliminary x and modifiers"""
+    if not v.children:
+        brother = v.left_brother()
+        v.x = brother.x + distance if brother else 0.0
+        return
+    
+    default_ancestor = v.children[0]
+    for w in v.children:
+        first_walk(w, distance)
+        default_ancestor = apportion(w, default_ancestor, distance)
+    execute_shifts(v)
+    
+    midpoint = (v.children[0].x + v.children[-1].x) / 2
+    brother = v.left_brother()
+    if brother:
+        v.x = brother.x + distance
+        v.mod = v.x - midpoint
+    else:
+        v.x = midpoint
+
+
+def apportion(v, default_ancestor, distance):
+    """Push v's subtree right until its left contour clears the subtrees to its left"""
+    w = v.left_brother()
+    if w is None:
+        return default_ancestor
+    
+    # i/o = inside/outside contour, r/l = right/left subtree
+    vir = vor = v
+    vil = w
+    vol = v.leftmost_sibling()
+    sir = sor = v.mod
+    sil = vil.mod
+    sol = vol.mod
+    while vil.right() and vir.left():
+        vil = vil.right()
+        vir = vir.left()
+        vol = vol.left()
+        vor = vor.right()
+        vor.ancestor = v
+        shift = (vil.x + sil) - (vir.x + sir) + distance
+        if shift > 0:
+            move_subtree(greatest_distinct_ancestor(vil, v, default_ancestor), v, shift)
+            sir += shift
+            sor += shift
+        sil += vil.mod
+        sir += vir.mod
+        sol += vol.mod
+        sor += vor.mod
+    
+    if vil.right() and not vor.right():
+        vor.thread = vil.right()
+        vor.mod += sil - sor
+    else:
+        if vir.left() and not vol.left():
+            vol.thread = vir.left()
+            vol.mod += sir - sol
+        default_ancestor = v
+    return default_ancestor
+
+
+def greatest_distinct_ancestor(vil, v, default_ancestor):
+    if vil.ancestor.parent is v.parent:
+        return vil.ancestor
+    return default_ancestor
+
+
+def move_subtree(wl, wr, shift):
+    subtrees = wr.number - wl.number
+    wr.change -= shift / subtrees
+    wr.shift += shift
+    wl.change += shift / subtrees
+    wr.x += shift
+    wr.mod += shift
+
+
+def execute_shifts(v):
+    """Spread the deferred shifts over the children in one right-to-left pass"""
+    shift = 0.0
+    change = 0.0
+    for w in reversed(v.children):
+        w.x += shift
+        w.mod += shift
+        change += w.change
+        shift += w.shift + change
+
+
+def second_walk(root):
+    """Pre-order pass: final x = preliminary x + sum of ancestors' modifiers"""
+    stack = [(root, 0.0)]
+    while stack:
+        v, m = stack.pop()
+        v.x += m
+        for w in v.children:
+            stack.append((w, m + v.mod))
+
+
+def descendant_tree(snapshot, root_id, depth, max_nodes=MAX_LAYOUT_NODES):
+    """
+    Level-order spanning tree of root's descendants up to depth generations.
+    Whole generations are dropped once max_nodes would be exceeded.
+    Returns (root node, nodes in level order, extra edges, generations, truncated).
+    """
+    root = LayoutNode(root_id, None, 1, 0)
+    nodes = [root]
+    placed = {root_id: root}
+    extra_edges = []
+    frontier = [root]
+    generations = 0
+    truncated = False
+    
+    while frontier and generations < depth:
+        next_frontier = []
+        next_ids = set()
+        next_edges = []
+        for parent in frontier:
+            for child_id in snapshot.children.get(parent.id, ()):
+                if child_id in placed or child_id in next_ids:
+                    next_edges.append((parent.id, child_id))
+                    continue
+                child = LayoutNode(child_id, parent, len(parent.children) + 1, parent.depth + 1)
+                parent.children.append(child)
+                next_frontier.append(child)
+                next_ids.add(child_id)
+        if not next_frontier:
+            break
+        if len(nodes) + len(next_frontier) > max_nodes:
+            for parent in frontier:
+                parent.children = []
+            truncated = True
+            break
+        for child in next_frontier:
+            placed[child.id] = child
+        nodes.extend(next_frontier)
+        extra_edges.extend(next_edges)
+        frontier = next_frontier
+        generations += 1
+    
+    return root, nodes, extra_edges, generations, truncated
+
+
+def compute_layout(snapshot, root_id, depth):
+    root, nodes, extra_edges, generations, truncated = descendant_tree(snapshot, root_id, depth)
+    first_walk(root)
+    second_walk(root)
+    
+    # Shift so the leftmost node is at x = 0
+    min_x = min(node.x for node in nodes)
+    result = []
+    for node in nodes:
+        person = snapshot.person_dict(node.id)
+        result.append(dict(
+            person,
+            x=round(node.x - min_x, 3),
+            y=node.depth,
+            parent_id=node.parent.id if node.parent else None
+        ))
+    
+    return {
+        'root_id': root_id,
+        'depth': depth,
+        'generations': generations,
+        'truncated': truncated,
+        'tree_version': snapshot.version,
+        'layers': list(snapshot.layers),
+        'width': max(node['x'] for node in result),
+        'height': generations,
+        'nodes': result,
+        'extra_edges': [{'parent_id': p, 'child_id': c} for p, c in extra_edges]
+    }
+
+
+def get_layout(root_id, depth=DEFAULT_LAYOUT_DEPTH, layers=DEFAULT_STACK):
+    """Cached layout of root's descendant chart, or None if root is not in the layer stack"""
+    snapshot = get_graph(layers)
+    root_id = str(root_id)
+    if root_id not in snapshot.people:
+        return None
+    
+    key = (root_id, depth, snapshot.layers, snapshot.version)
+    with _lock:
+        layout = _cache.get(key)
+        if layout is not None:
+            _cache.move_to_end(key)
+            return layout
+    
+    layout = compute_layout(snapshot, root_id, depth)
+    with _lock:
+        _cache[key] = layout
+        while len(_cache) > MAX_CACHED_LAYOUTS:
+            _cache.popitem(last=False)
+    return layout
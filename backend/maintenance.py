@@ -0,0 +1,74 @@
+"""
+Tree maintenance after admin writes, off the request thread.
+
+tree_changed() (routes.py) marks the graph snapshots stale inline and hands
+the O(n) work - recomputing branch labels (intervals.py) and re-running the
+integrity checks (integrity.py) - to one background thread per worker.
+Writes that arrive while a pass runs are coalesced into a single follow-up
+pass, so a burst of imports or deletes costs at most two passes and no
+request waits for either. Until the pass finishes, within= searches use the
+previous labels and /health reports the previous integrity report.
+"""
+import threading
+import logging
+from models import db
+from intervals import refresh_labels
+from integrity import run_validation
+
+logger = logging.getLogger(__name__)
+
+_changed = threading.Condition()
+_pending = False
+_running = False
+_worker = None
+
+
+def run_pass():
+    """Relabel and re-validate once; errors are logged, never raised"""
+    try:
+        refresh_labels()
+        db.session.commit()
+    except Exception as e:
+        # Labels only serve within= searches; the next pass retries
+        db.session.rollback()
+        logger.error(f'Failed to refresh branch labels: {e}', exc_info=True)
+    try:
+        run_validation()
+    except Exception as e:
+        logger.error(f'Integrity validation failed: {e}', exc_info=True)
+    finally:
+        db.session.remove()
+
+
+def run_worker(app):
+    global _pending, _running
+    while True:
+        with _changed:
+            _changed.wait_for(lambda: _pending)
+            _pending = False
+            _running = True
+        try:
+            with app.app_context():
+                run_pass()
+        finally:
+            with _changed:
+                _running = False
+                _changed.notify_all()
+
+
+def schedule(app):
+    """Request a maintenance pass after a committed change, starting the worker on first use"""
+    global _pending, _worker
+    with _changed:
+        _pending = True
+        # A forked worker process inherits the Thread object but not the thread
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=run_worker, args=(app,), name='tree-maintenance', daemon=True)
+            _worker.start()
+        _changed.notify_all()
+
+
+def wait_idle(timeout=None):
+    """Block until no pass is pending or running (scripts and tests); False on timeout"""
+    with _changed:
+        return _changed.wait_for(lambda: not _pending and not _running, timeout)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, CheckConstraint, UniqueConstraint, Integer, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, CheckConstraint, UniqueConstraint, Integer, BigInteger, Text, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -19,12 +19,23 @@ class Person(db.Model):
     birth_year = Column(Integer, nullable=True)
     death_year = Column(Integer, nullable=True)
     gender = Column(String(10), nullable=True)  # 'male', 'female', or null
+    # Nested-interval labels over the preferred-parent tree (intervals.py)
+    tree_pre = Column(Integer, nullable=True, index=True)
+    tree_post = Column(Integer, nullable=True)
+    # Hash of the parentless import row that last wrote this person; unchanged rows are skipped on re-import
+    content_hash = Column(String(32), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     parent_relationships = relationship('Relationship', foreign_keys='Relationship.child_id', back_populates='child')
     child_relationships = relationship('Relationship', foreign_keys='Relationship.parent_id', back_populates='parent')
     
+    __table_args__ = (
+        # Layer-stack reads filter on layer IN (...) first
+        Index('idx_people_layer_name_normalized', 'layer', 'name_normalized'),
+        Index('idx_people_layer_created_at', 'layer', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': str(self.id),
@@ -44,6 +55,9 @@ class Relationship(db.Model):
     child_id = Column(UUID(as_uuid=True), ForeignKey('people.id'), nullable=False, index=True)
     relation_type = Column(String(20), nullable=False)  # 'father', 'mother', 'parent'
     visibility = Column(String(20), default='public', nullable=False)
+    layer = Column(String(50), default='base', server_default='base', nullable=False)
+    # Hash of the combined-import row that created or confirmed this link (content_hash.py)
+    content_hash = Column(String(32), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
@@ -54,8 +68,45 @@ class Relationship(db.Model):
         CheckConstraint('parent_id != child_id', name='no_self_reference'),
         UniqueConstraint('parent_id', 'child_id', 'relation_type', name='unique_relationship'),
         CheckConstraint("relation_type IN ('father', 'mother', 'parent')", name='valid_relation_type'),
+        Index('idx_relationships_layer_parent_id', 'layer', 'parent_id'),
+        Index('idx_relationships_layer_child_id', 'layer', 'child_id'),
     )
     
     def __repr__(self):
         return f'<Relationship {self.parent_id} -> {self.child_id} ({self.relation_type})>'
 
+
+class ChangeLog(db.Model):
+    """Append-only record of admin changes; one tree_version per committed transaction"""
+    __tablename__ = 'change_log'
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    tree_version = Column(BigInteger, nullable=False, index=True)
+    entity = Column(String(20), nullable=False)  # 'person' or 'relationship'
+    op = Column(String(10), nullable=False)  # 'insert', 'update' or 'delete'
+    entity_id = Column(UUID(as_uuid=True), nullable=False)
+    layer = Column(String(50), nullable=True)
+    parent_id = Column(UUID(as_uuid=True), nullable=True)  # relationship rows only
+    child_id = Column(UUID(as_uuid=True), nullable=True)  # relationship rows only
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    
+    __table_args__ = (
+        CheckConstraint("entity IN ('person', 'relationship')", name='valid_change_entity'),
+        CheckConstraint("op IN ('insert', 'update', 'delete')", name='valid_change_op'),
+    )
+    
+    def to_dict(self):
+        change = {
+            'tree_version': self.tree_version,
+            'entity': self.entity,
+            'op': self.op,
+            'id': str(self.entity_id),
+            'layer': self.layer
+        }
+        if self.entity == 'relationship':
+            change['parent_id'] = str(self.parent_id) if self.parent_id else None
+            change['child_id'] = str(self.child_id) if self.child_id else None
+        return change
+    
+    def __repr__(self):
+        return f'<ChangeLog v{self.tree_version} {self.op} {self.entity} {self.entity_id}>'
@@ -0,0 +1,202 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries X-Profile: 1 together with a valid
+X-ADMIN-TOKEN, or is picked at random with probability PROFILE_SAMPLE_RATE.
+Only that request's thread runs under cProfile, and every SQL statement it
+executes is timed. Other requests pay one random() call.
+
+Results stay in memory (the most recent PROFILE_MAX_STORED per worker) and are
+read through /admin/profiles: the slowest recent requests, the hottest
+functions and queries of one request, and its raw pstats dump, which opens in
+snakeviz or flameprof for a flame graph. Profiled responses carry an
+X-Profile-Id header.
+"""
+import cProfile
+import marshal
+import random
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from flask import request, g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERIES_KEPT = 200
+STATEMENT_PREVIEW_CHARS = 300
+
+_lock = threading.Lock()
+_profiles = OrderedDict()  # profile id -> RequestProfile, oldest first
+_active = threading.local()
+
+
+class RequestProfile:
+    """Profiler, query timings and timing of one request"""
+    
+    def __init__(self, method, path, query_string, trigger):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.profiler = cProfile.Profile()
+        self.stats = None  # pstats data (the marshal-able dict), once finished
+        self.queries = []
+        self.query_count = 0
+        self.query_ms = 0.0
+    
+    def add_query(self, statement, duration_ms):
+        self.query_count += 1
+        self.query_ms += duration_ms
+        if len(self.queries) < MAX_QUERIES_KEPT:
+            self.queries.append({
+                'statement': ' '.join(statement.split())[:STATEMENT_PREVIEW_CHARS],
+                'duration_ms': round(duration_ms, 2)
+            })
+    
+    def finish(self, status):
+        self.profiler.disable()
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        self.status = status
+        self.profiler.create_stats()
+        self.stats = self.profiler.stats
+        self.profiler = None
+    
+    def summary(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'query_string': self.query_string,
+            'status': self.status,
+            'trigger': self.trigger,
+            'started_at': self.started_at,
+            'duration_ms': self.duration_ms,
+            'query_count': self.query_count,
+            'query_ms': round(self.query_ms, 1)
+        }
+    
+    def top_functions(self, limit, sort='cumulative'):
+        """The limit hottest functions by cumulative or own (tottime) time"""
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in self.stats.items():
+            rows.append({
+                'function': name,
+                'location': f'{filename}:{line}',
+                'calls': calls,
+                'own_ms': round(tottime * 1000, 2),
+                'cumulative_ms': round(cumtime * 1000, 2)
+            })
+        key = 'own_ms' if sort == 'tottime' else 'cumulative_ms'
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+    
+    def slowest_queries(self, limit):
+        return sorted(self.queries, key=lambda q: q['duration_ms'], reverse=True)[:limit]
+    
+    def pstats_dump(self):
+        """Bytes in the format pstats.Stats.dump_stats writes (a .prof file)"""
+        return marshal.dumps(self.stats)
+
+
+def wants_profile():
+    """How this request triggers profiling ('header' or 'sampled'), or None"""
+    if request.headers.get('X-Profile') == '1':
+        token = request.headers.get('X-ADMIN-TOKEN')
+        if token and token == Config.ADMIN_TOKEN:
+            return 'header'
+    if Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def store(profile):
+    with _lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > Config.PROFILE_MAX_STORED:
+            _profiles.popitem(last=False)
+
+
+def recent_profiles(limit, sort='duration'):
+    """Summaries of stored profiles: slowest first, or most recent first with sort='recent'"""
+    with _lock:
+        profiles = list(_profiles.values())
+    if sort == 'recent':
+        profiles.reverse()
+    else:
+        profiles.sort(key=lambda p: p.duration_ms, reverse=True)
+    return [p.summary() for p in profiles[:limit]]
+
+
+def get_profile(profile_id):
+    with _lock:
+        return _profiles.get(profile_id)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_active, 'profile', None) is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = getattr(_active, 'profile', None)
+    starts = conn.info.get('profile_query_start')
+    if profile is not None and starts:
+        profile.add_query(statement, (time.perf_counter() - starts.pop()) * 1000)
+
+
+def start_profile():
+    trigger = wants_profile()
+    if not trigger:
+        return
+    profile = RequestProfile(request.method, request.path, request.query_string.decode('utf-8', 'replace'), trigger)
+    try:
+        profile.profiler.enable()
+    except ValueError as e:
+        # Another profiler is active in this process (e.g. a debugger)
+        logger.warning(f'Profiling skipped for {request.path}: {e}')
+        return
+    _active.profile = profile
+    g.request_profile = profile
+
+
+def finish_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+    _active.profile = None
+    profile.finish(response.status_code)
+    store(profile)
+    response.headers['X-Profile-Id'] = profile.id
+    logger.info(
+        f'Profiled {profile.method} {profile.path}: {profile.duration_ms}ms, '
+        f'{profile.query_count} queries ({round(profile.query_ms, 1)}ms), id {profile.id}'
+    )
+    return response
+
+
+def abandon_profile(error=None):
+    """teardown: make sure a request that never produced a response stops profiling"""
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        _active.profile = None
+        profile.profiler.disable()
+
+
+def init_app(app):
+    """Install the profiling hooks on the app and the query timers on all engines"""
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(abandon_profile)
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
@@ -0,0 +1,23 @@
+"""
+Recompute the nested-interval branch labels (people.tree_pre / tree_post).
+Admin imports and deletes keep them up to date; run this once after
+add_tree_intervals.sql, or if labels are suspected to be out of date.
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+from app import create_app, db
+from intervals import refresh_labels
+
+app = create_app()
+
+with app.app_context():
+    changed = refresh_labels()
+    db.session.commit()
+    print(f"Branch labels updated for {changed} people")
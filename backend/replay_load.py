@@ -0,0 +1,240 @@
+"""
+Replay recorded traffic against a running instance and report per-endpoint
+throughput, latency percentiles and error rates.
+
+Reads the access records the app logs (JSON lines with LOG_FORMAT=json, or
+"... INFO access GET /api/search?q=hai 200 3.1ms" with LOG_FORMAT=text) or a
+captured access log in common/combined format ('"GET /path HTTP/1.1"'), from
+files or stdin. Requests are sent with their original spacing divided by
+--speed (0 sends them as fast as the client pool allows) by --concurrency
+worker threads. Only GET requests are replayed (logs do not record POST
+bodies, and admin writes should not be repeated).
+
+    python replay_load.py render.log --base-url http://127.0.0.1:5000 --speed 4 --concurrency 32
+
+Endpoints are grouped by method and path with UUIDs replaced by {id}.
+Latency is measured from when a request is sent; "lag" is how far behind its
+scheduled time it was sent, which grows when the client pool is saturated.
+"""
+import argparse
+import json
+import math
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Text access log: "2026-01-05 10:00:00,123 INFO access GET /api/tree?depth=3 200 4.2ms"
+# (older logs: "... INFO app GET /api/tree")
+APP_LOG_LINE = re.compile(
+    r'(?P<time>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) INFO (?:access|app) (?P<method>[A-Z]+) (?P<path>/\S*)'
+)
+# Common/combined access log: '... [05/Jan/2026:10:00:00 +0000] "GET /api/tree?depth=3 HTTP/1.1" 200 ...'
+ACCESS_LOG_LINE = re.compile(
+    r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>/\S*) HTTP/[0-9.]+"'
+)
+UUID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_line(line):
+    """(timestamp in seconds or None, method, path with query) of a request line, or None"""
+    start = line.find('{"')
+    if start != -1:
+        try:
+            entry = json.loads(line[start:])
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict) and entry.get('logger') == 'access':
+            path = entry['path'] + ('?' + entry['query'] if entry.get('query') else '')
+            return datetime.fromisoformat(entry['ts']).timestamp(), entry['method'], path
+    match = APP_LOG_LINE.search(line)
+    if match:
+        timestamp = datetime.strptime(match['time'], '%Y-%m-%d %H:%M:%S,%f').timestamp()
+        return timestamp, match['method'], match['path']
+    match = ACCESS_LOG_LINE.search(line)
+    if match:
+        try:
+            timestamp = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z').timestamp()
+        except ValueError:
+            timestamp = None
+        return timestamp, match['method'], match['path']
+    return None
+
+
+def read_requests(paths, methods):
+    """(offset in seconds from the first request, method, path) in log order, plus skipped count"""
+    requests = []
+    skipped = 0
+    first = None
+    for path in paths or ['-']:
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+        try:
+            for line in source:
+                parsed = parse_line(line)
+                if not parsed:
+                    continue
+                timestamp, method, request_path = parsed
+                if method not in methods or request_path.startswith('/admin/'):
+                    skipped += 1
+                    continue
+                if timestamp is not None and first is None:
+                    first = timestamp
+                offset = timestamp - first if timestamp is not None else 0.0
+                requests.append((max(offset, 0.0), method, request_path))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+    return requests, skipped
+
+
+def endpoint_key(method, path):
+    return f"{method} {UUID_PATTERN.sub('{id}', path.split('?', 1)[0])}"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class Results:
+    """Latencies and outcomes per endpoint, shared by the worker threads"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}  # key -> {'latencies': [...], 'status': {code: n}, 'errors': n}
+        self.lags = []
+    
+    def add(self, key, latency_ms, status, lag_ms):
+        with self._lock:
+            endpoint = self.endpoints.setdefault(key, {'latencies': [], 'status': {}, 'errors': 0})
+            endpoint['latencies'].append(latency_ms)
+            endpoint['status'][status] = endpoint['status'].get(status, 0) + 1
+            if status == 'error' or (isinstance(status, int) and status >= 500):
+                endpoint['errors'] += 1
+            self.lags.append(lag_ms)
+    
+    def report(self, elapsed):
+        def summary(latencies, count, errors):
+            latencies = sorted(latencies)
+            row = {
+                'requests': count,
+                'rps': round(count / elapsed, 1) if elapsed else None,
+                'error_rate': round(errors / count, 4) if count else 0,
+                'max_ms': round(latencies[-1], 1) if latencies else None
+            }
+            row.update((f'p{pct}_ms', round(percentile(latencies, pct), 1) if latencies else None) for pct in PERCENTILES)
+            return row
+        
+        endpoints = {}
+        for key, endpoint in sorted(self.endpoints.items(), key=lambda item: -len(item[1]['latencies'])):
+            row = summary(endpoint['latencies'], len(endpoint['latencies']), endpoint['errors'])
+            row['status'] = {str(code): n for code, n in sorted(endpoint['status'].items(), key=lambda item: str(item[0]))}
+            endpoints[key] = row
+        all_latencies = [ms for endpoint in self.endpoints.values() for ms in endpoint['latencies']]
+        total = summary(all_latencies, len(all_latencies), sum(e['errors'] for e in self.endpoints.values()))
+        lags = sorted(self.lags)
+        total['lag_p99_ms'] = round(percentile(lags, 99), 1) if lags else None
+        return {'elapsed_s': round(elapsed, 2), 'total': total, 'endpoints': endpoints}
+
+
+def send(base_url, method, path, headers, timeout):
+    """(status code or 'error', latency in ms)"""
+    req = urllib.request.Request(base_url + path, method=method, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 'error'
+    return status, (time.perf_counter() - started) * 1000
+
+
+def replay(requests, base_url, speed, concurrency, headers, timeout):
+    """Send the requests on schedule with a pool of concurrency threads; returns the report"""
+    results = Results()
+    
+    def worker(due, method, path):
+        lag_ms = max((time.perf_counter() - due) * 1000, 0.0)
+        status, latency_ms = send(base_url, method, path, headers, timeout)
+        results.add(endpoint_key(method, path), latency_ms, status, lag_ms)
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset, method, path in requests:
+            due = started + (offset / speed if speed else 0.0)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(worker, due, method, path)
+    return results.report(time.perf_counter() - started)
+
+
+def print_report(report):
+    total = report['total']
+    print(
+        f"{total['requests']} requests in {report['elapsed_s']}s: {total['rps']} req/s, "
+        f"error rate {total['error_rate']:.2%}, p50 {total['p50_ms']}ms, p99 {total['p99_ms']}ms, "
+        f"schedule lag p99 {total['lag_p99_ms']}ms"
+    )
+    header = f"{'endpoint':<48} {'reqs':>7} {'req/s':>8} {'err%':>6} " + ' '.join(f"{f'p{pct}':>8}" for pct in PERCENTILES) + f" {'max':>8}"
+    print(header)
+    for key, row in report['endpoints'].items():
+        percentiles = ' '.join(f"{row[f'p{pct}_ms']:>8}" for pct in PERCENTILES)
+        print(f"{key[:48]:<48} {row['requests']:>7} {row['rps']:>8} {row['error_rate'] * 100:>6.2f} {percentiles} {row['max_ms']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay logged requests against a running instance')
+    parser.add_argument('logs', nargs='*', help='log files (app access log, JSON or text, or common/combined access log); default stdin')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiple; 0 sends as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads')
+    parser.add_argument('--limit', type=int, help='replay only the first N requests')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--header', action='append', default=[], help='extra header "Name: value" (repeatable)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+    
+    if args.speed < 0 or args.concurrency < 1:
+        parser.error('--speed must be >= 0 and --concurrency >= 1')
+    headers = {'Accept-Encoding': 'gzip'}
+    for header in args.header:
+        name, _, value = header.partition(':')
+        headers[name.strip()] = value.strip()
+    
+    requests, skipped = read_requests(args.logs, {'GET'})
+    if args.limit:
+        requests = requests[:args.limit]
+    if not requests:
+        print('No replayable requests found', file=sys.stderr)
+        return 1
+    duration = requests[-1][0] / args.speed if args.speed else 0
+    print(
+        f'Replaying {len(requests)} requests ({skipped} non-GET or admin skipped) against {args.base_url} '
+        f'over ~{duration:.0f}s with {args.concurrency} clients',
+        file=sys.stderr
+    )
+    
+    report = replay(requests, args.base_url.rstrip('/'), args.speed, args.concurrency, headers, args.timeout)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
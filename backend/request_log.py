@@ -0,0 +1,191 @@
+"""
+Non-blocking, structured logging.
+
+Request threads only put records on an in-memory queue (QueueHandler); a
+QueueListener thread formats them and writes to stdout. Tracebacks are
+formatted on the listener thread too, so a request that logs an error does
+not pay for it. When the queue is full, records are dropped (and counted)
+rather than blocking the request.
+
+With LOG_FORMAT=json every record is one JSON object. Records logged while a
+request is handled carry its request id (X-Request-ID, or a generated one,
+echoed on the response). Each request ends with one "access" record: method,
+path, query, status, duration_ms and the number of SQL queries it ran.
+High-volume endpoints can be sampled with LOG_SAMPLE_RATES (path prefix =
+rate); errors and requests slower than LOG_SLOW_REQUEST_MS are always logged.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+access_logger = logging.getLogger('access')
+
+_listener = None
+_handler = None
+_request_state = threading.local()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks, adds the request id and defers traceback formatting"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Merge args into the message here (they may change after this call returns),
+        # but leave exc_info for the listener's formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, request_id, fields and exception"""
+    
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_sample_rates(value):
+    """'/api/search=0.1,/api/suggest=0.05' -> [(prefix, rate)], longest prefix first"""
+    rates = []
+    for item in (value or '').split(','):
+        prefix, _, rate = item.partition('=')
+        if prefix.strip() and rate.strip():
+            rates.append((prefix.strip(), min(max(float(rate), 0.0), 1.0)))
+    return sorted(rates, key=lambda item: len(item[0]), reverse=True)
+
+
+def configure_logging(level, log_format='json', queue_size=10000):
+    """Route all logging through a queue to a stdout writer thread"""
+    global _listener, _handler
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    
+    _listener = logging.handlers.QueueListener(_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _restart_listener():
+    # A forked worker inherits the queue but not the listener thread
+    global _listener
+    if _listener is not None:
+        _listener = logging.handlers.QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass
+        _listener = None
+
+
+def dropped_records():
+    """Records dropped because the queue was full (this process)"""
+    return _handler.dropped if _handler else 0
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_request_state, 'active', False):
+        _request_state.queries += 1
+
+
+def init_app(app):
+    """Request ids, per-request query counts and the sampled access log"""
+    sample_rates = parse_sample_rates(app.config.get('LOG_SAMPLE_RATES'))
+    slow_ms = app.config.get('LOG_SLOW_REQUEST_MS', 1000)
+    
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        _request_state.active = True
+        _request_state.queries = 0
+    
+    @app.after_request
+    def log_access(response):
+        _request_state.active = False
+        started = g.get('request_started')
+        if started is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        
+        rate = next((rate for prefix, rate in sample_rates if request.path.startswith(prefix)), 1.0)
+        if rate < 1.0 and response.status_code < 500 and duration_ms < slow_ms and random.random() >= rate:
+            return response
+        
+        query = request.query_string.decode('utf-8', 'replace')
+        access_logger.info(
+            f"{request.method} {request.path}{'?' + query if query else ''} {response.status_code} {duration_ms}ms",
+            extra={'fields': {
+                'method': request.method,
+                'path': request.path,
+                'query': query,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+                'queries': _request_state.queries,
+                'sample_rate': rate
+            }}
+        )
+        return response
+    
+    @app.teardown_request
+    def end_request(error=None):
+        _request_state.active = False
+    
+    if not event.contains(Engine, 'after_cursor_execute', count_query):
+        event.listen(Engine, 'after_cursor_execute', count_query)
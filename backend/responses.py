@@ -0,0 +1,112 @@
+"""
+Response encoding: a faster JSON provider and Accept-Encoding compression.
+
+orjson and brotli are optional - without them the app falls back to the
+standard library json module and gzip-only compression.
+"""
+import gzip
+import logging
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'application/javascript',
+    'image/svg+xml',
+}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that keeps UTF-8 as-is (Amharic names are not \\u-escaped)
+    and serializes with orjson when it is installed.
+    """
+    ensure_ascii = False
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # orjson produces bytes, so skip the str round trip
+        body = orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def choose_encoding(accept_encodings):
+    """Pick 'br' or 'gzip' from the client's Accept-Encoding, or None"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, min_size):
+    """Compress a buffered response body if the client accepts it and it is worth it"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code == 204
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+    
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=5)
+    else:
+        compressed = gzip.compress(body, compresslevel=6)
+    
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Install the JSON provider and response compression on the app"""
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+    
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 500)
+    
+    @app.after_request
+    def compress(response):
+        try:
+            return compress_response(response, min_size)
+        except Exception as e:
+            logger.error(f'Response compression failed: {e}')
+            return response
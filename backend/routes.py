@@ -1,18 +1,36 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from sqlalchemy import or_, func, and_
 from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from collections import deque
 import uuid
 import re
 import logging
 from models import db, Person, Relationship
 from config import Config
+from graph import get_graph, invalidate_graph, tree_version
+from throttle import SingleFlight, rate_limited
+from layers import DEFAULT_STACK, parse_layer_stack, validate_layer_name, stack_key
+from changelog import changes_since, current_version, record_changes, relationship_change, MAX_CHANGES_PAGE
+from intervals import is_descendant, preferred_branch, descends_from
+from maintenance import schedule as schedule_maintenance
+from content_hash import row_hash, stored_hashes, store_hashes, store_relationship_hashes
+from integrity import run_validation
+from import_plan import load_existing_ids, load_edges
+from health import current_status, readiness, liveness
+from profiling import recent_profiles, get_profile
+from branch import branch_ids, preview_delete, delete_branch, preview_reattach, reattach_branch
+from bulk_people import upsert_people, insert_people, merge_people_by_name, most_recent, OPTIONAL_COLUMNS
+from kinship import compute_kinship, ancestor_depths, preferred_lineage
 
 logger = logging.getLogger(__name__)
 
 api_bp = Blueprint('api', __name__)
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Coalesces identical concurrent /api/relationship computations
+relationship_flight = SingleFlight()
+
 
 def normalize_name(name):
     """Normalize name for search: lowercase, remove extra spaces"""
@@ -36,25 +54,71 @@ def get_error_response(code, message, status_code=400):
     return jsonify({'error': {'code': code, 'message': message}}), status_code
 
 
+def get_layer_stack():
+    """Layer stack for a read from ?layers=a,b (default: base only); ValueError if invalid"""
+    return parse_layer_stack(request.args.get('layers'))
+
+
+def stack_relationships(layers, **filters):
+    """Public relationships in the layer stack; served by the (layer, parent_id/child_id) indexes"""
+    return Relationship.query.filter_by(visibility='public', **filters).filter(
+        Relationship.layer.in_(layers)
+    )
+
+
+# Rows per multi-row INSERT in /admin/import/relationships
+RELATIONSHIP_INSERT_BATCH = 1000
+
+# Fuzzy matches checked against ?within= before the 25 results are taken
+MAX_FUZZY_CANDIDATES = 500
+
+# Column order for format=compact list responses
+COMPACT_PERSON_FIELDS = ['id', 'name', 'name_amharic']
+
+
+def people_list_response(key, people):
+    """
+    jsonify a list of people (Person objects or rows with id/name_original/name_amharic).
+    With ?format=compact the list is sent as rows in COMPACT_PERSON_FIELDS order
+    instead of repeating the keys for every person.
+    """
+    if request.args.get('format') == 'compact':
+        return jsonify({
+            'fields': COMPACT_PERSON_FIELDS,
+            key: [[str(p.id), p.name_original, p.name_amharic or None] for p in people]
+        })
+    return jsonify({
+        key: [{'id': str(p.id), 'name': p.name_original, 'name_amharic': p.name_amharic or None} for p in people]
+    })
+
+
 # ==================== API ROUTES ====================
 
 @api_bp.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
-    try:
-        # Check database connection
-        db.session.execute(db.text('SELECT 1'))
-        db_status = 'connected'
-    except Exception as e:
-        logger.error(f'Database health check failed: {e}')
-        db_status = 'disconnected'
-    
+    """Health check endpoint (database status from the background health monitor)"""
+    status = current_status(current_app._get_current_object())
     return jsonify({
         'status': 'ok',
-        'database': db_status
+        'database': status['database']
     })
 
 
+@api_bp.route('/livez', methods=['GET'])
+def livez():
+    """Liveness probe: the process is serving requests (no database access)"""
+    return jsonify(liveness())
+
+
+@api_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness probe: cached database status, pool statistics, graph snapshot freshness"""
+    ready, report = readiness(current_app._get_current_object())
+    response = jsonify(report)
+    response.status_code = 200 if ready else 503
+    return response
+
+
 @api_bp.route('/api/root', methods=['GET'])
 def get_root():
     """Get the root person (King Sahle Selassie or oldest base person)"""
@@ -80,8 +144,13 @@ def get_root():
 
 @api_bp.route('/api/search', methods=['GET'])
 def search():
-    """Search for people by name (max 25 results)"""
+    """
+    Search for people by name (max 25 results), optionally ?within=<person_id>'s branch.
+    mode=fuzzy tolerates misspellings (ranked by edit distance) instead of substring matching.
+    """
     query = request.args.get('q', '').strip()
+    within = request.args.get('within')
+    mode = request.args.get('mode', 'substring')
     
     if not query:
         return get_error_response('BAD_REQUEST', 'Query parameter "q" is required')
@@ -89,11 +158,50 @@ def search():
     if len(query) > 100:
         return get_error_response('BAD_REQUEST', 'Query too long (max 100 characters)')
     
+    if mode not in ('substring', 'fuzzy'):
+        return get_error_response('BAD_REQUEST', 'Invalid "mode" (use substring or fuzzy)')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
     try:
         normalized_query = normalize_name(query)
         
-        # Base query - only base layer for Phase 1
-        base_query = Person.query.filter_by(layer='base')
+        # People in the requested layer stack (one IN predicate, not a query per layer)
+        base_query = Person.query.filter(Person.layer.in_(layers))
+        
+        if within:
+            if not validate_uuid(within):
+                return get_error_response('BAD_REQUEST', 'Invalid "within" person ID format')
+            if layers == DEFAULT_STACK:
+                branch = db.session.query(Person.tree_pre, Person.tree_post).filter(
+                    Person.id == within, Person.layer.in_(layers)
+                ).first()
+                if not branch:
+                    return get_error_response('NOT_FOUND', 'Person not found')
+                if branch.tree_pre is None:
+                    return get_error_response('SERVER_ERROR', 'Branch index is not built yet', 503)
+                # The branch is a range on the (base-layer) interval labels
+                base_query = base_query.filter(Person.tree_pre.between(branch.tree_pre, branch.tree_post))
+            else:
+                # Labels only describe base; other stacks walk their snapshot
+                snapshot = get_graph(layers)
+                if str(uuid.UUID(within)) not in snapshot.people:
+                    return get_error_response('NOT_FOUND', 'Person not found')
+                branch_ids = [uuid.UUID(p) for p in preferred_branch(snapshot, uuid.UUID(within))]
+                base_query = base_query.filter(Person.id.in_(branch_ids))
+        
+        if mode == 'fuzzy':
+            from fuzzy import fuzzy_search
+            # Ranked from the in-memory index; the database only fetches the winners by primary key
+            ranked = [person_id for person_id, _ in fuzzy_search(query, layers)[:MAX_FUZZY_CANDIDATES]]
+            if not within:
+                ranked = ranked[:25]
+            found = {str(p.id): p for p in base_query.filter(Person.id.in_(ranked)).all()} if ranked else {}
+            results = [found[person_id] for person_id in ranked if person_id in found]
+            return people_list_response('results', results[:25])
         
         # Search: exact match, starts with, contains (English names)
         exact_matches = base_query.filter(Person.name_normalized == normalized_query).all()
@@ -121,14 +229,48 @@ def search():
         results = exact_matches + starts_with + contains[:25 - len(exact_matches) - len(starts_with)]
         results = results[:25]
         
-        return jsonify({
-            'results': [person.to_dict() for person in results]
-        })
+        return people_list_response('results', results)
     except Exception as e:
         logger.error(f'Error in search: {e}', exc_info=True)
         return get_error_response('SERVER_ERROR', 'Search failed', 500)
 
 
+@api_bp.route('/api/suggest', methods=['GET'])
+def suggest():
+    """Autocomplete: up to 10 people whose English or Amharic name has a word starting with prefix"""
+    from suggest import get_suggest_index, TOP_K
+    prefix = request.args.get('prefix', '').strip()
+    
+    if not prefix:
+        return get_error_response('BAD_REQUEST', 'Query parameter "prefix" is required')
+    
+    if len(prefix) > 100:
+        return get_error_response('BAD_REQUEST', 'Prefix too long (max 100 characters)')
+    
+    try:
+        limit = int(request.args.get('limit', TOP_K))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"limit" must be an integer')
+    if not 1 <= limit <= TOP_K:
+        return get_error_response('BAD_REQUEST', f'"limit" must be between 1 and {TOP_K}')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        index = get_suggest_index(layers)
+        return jsonify({
+            'prefix': prefix,
+            'suggestions': index.suggest(prefix, limit),
+            'tree_version': index.version
+        })
+    except Exception as e:
+        logger.error(f'Error in suggest: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Suggest failed', 500)
+
+
 @api_bp.route('/api/neighborhood/<person_id>', methods=['GET'])
 def get_neighborhood(person_id):
     """
@@ -139,15 +281,20 @@ def get_neighborhood(person_id):
         return get_error_response('BAD_REQUEST', 'Invalid person ID format')
     
     try:
-        person = Person.query.filter_by(id=person_id, layer='base').first()
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        person = Person.query.filter(Person.id == person_id, Person.layer.in_(layers)).first()
         if not person:
             return get_error_response('NOT_FOUND', 'Person not found')
         
         # Get parent relationships (where this person is the child)
-        parent_rels = Relationship.query.filter_by(
-            child_id=person.id,
-            visibility='public'
-        ).options(joinedload(Relationship.parent)).all()
+        parent_rels = stack_relationships(layers, child_id=person.id).options(
+            joinedload(Relationship.parent)
+        ).all()
+        parent_rels = [rel for rel in parent_rels if rel.parent.layer in layers]
         
         # Choose parent: prefer father, else mother, else any
         parent = None
@@ -170,14 +317,13 @@ def get_neighborhood(person_id):
             parent_type = parent_rels[0].relation_type
         
         # Get children (where this person is the parent)
-        child_rels = Relationship.query.filter_by(
-            parent_id=person.id,
-            visibility='public'
-        ).options(joinedload(Relationship.child)).all()
+        child_rels = stack_relationships(layers, parent_id=person.id).options(
+            joinedload(Relationship.child)
+        ).all()
         
         # Preserve import order by sorting by relationship created_at (matches CSV import order)
         children = sorted(child_rels, key=lambda rel: rel.created_at)
-        children = [rel.child for rel in children]
+        children = [rel.child for rel in children if rel.child.layer in layers]
         
         response = {
             'parent': parent.to_dict() if parent else None,
@@ -200,15 +346,20 @@ def get_person(person_id):
         return get_error_response('BAD_REQUEST', 'Invalid person ID format')
     
     try:
-        person = Person.query.filter_by(id=person_id, layer='base').first()
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        person = Person.query.filter(Person.id == person_id, Person.layer.in_(layers)).first()
         if not person:
             return get_error_response('NOT_FOUND', 'Person not found')
         
         # Get all parent relationships
-        parent_rels = Relationship.query.filter_by(
-            child_id=person.id,
-            visibility='public'
-        ).options(joinedload(Relationship.parent)).all()
+        parent_rels = stack_relationships(layers, child_id=person.id).options(
+            joinedload(Relationship.parent)
+        ).all()
+        parent_rels = [rel for rel in parent_rels if rel.parent.layer in layers]
         
         father = None
         mother = None
@@ -223,14 +374,13 @@ def get_person(person_id):
                 other_parents.append(rel.parent)
         
         # Get all children
-        child_rels = Relationship.query.filter_by(
-            parent_id=person.id,
-            visibility='public'
-        ).options(joinedload(Relationship.child)).all()
+        child_rels = stack_relationships(layers, parent_id=person.id).options(
+            joinedload(Relationship.child)
+        ).all()
         
         # Preserve import order by sorting by relationship created_at (matches CSV import order)
         children = sorted(child_rels, key=lambda rel: rel.created_at)
-        children = [rel.child for rel in children]
+        children = [rel.child for rel in children if rel.child.layer in layers]
         
         return jsonify({
             'person': person.to_dict(),
@@ -249,18 +399,25 @@ def get_person(person_id):
 
 @api_bp.route('/api/people', methods=['GET'])
 def get_all_people():
-    """Get all people for dropdown selection"""
+    """Get all people for dropdown selection (?format=compact for rows instead of objects)"""
     try:
-        people = Person.query.filter_by(layer='base').order_by(Person.name_original.asc()).all()
-        return jsonify({
-            'people': [person.to_dict() for person in people]
-        })
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        # Only the columns the response needs, no ORM objects
+        people = db.session.query(
+            Person.id, Person.name_original, Person.name_amharic
+        ).filter(Person.layer.in_(layers)).order_by(Person.name_original.asc()).all()
+        return people_list_response('people', people)
     except Exception as e:
         logger.error(f'Error getting all people: {e}', exc_info=True)
         return get_error_response('SERVER_ERROR', 'Failed to get people', 500)
 
 
 @api_bp.route('/api/relationship', methods=['GET'])
+@rate_limited()
 def get_relationship():
     """Get relationship showing each person with their parent"""
     person1_id = request.args.get('person1_id')
@@ -273,384 +430,306 @@ def get_relationship():
         return get_error_response('BAD_REQUEST', 'Invalid person ID format')
     
     try:
-        person1 = Person.query.filter_by(id=person1_id, layer='base').first()
-        person2 = Person.query.filter_by(id=person2_id, layer='base').first()
-        
-        if not person1 or not person2:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        # Identical concurrent requests (same pair, stack and tree version) share one computation
+        result = relationship_flight.do(
+            ('relationship', person1_id, person2_id, stack_key(layers), tree_version(layers)),
+            lambda: find_relationship(person1_id, person2_id, layers)
+        )
+        if result is None:
             return get_error_response('NOT_FOUND', 'One or both persons not found')
         
-        # Helper function to get parent (prefer father, else mother, else any)
-        def get_parent(person_id):
-            parent_rels = Relationship.query.filter_by(
-                child_id=person_id,
-                visibility='public'
-            ).options(joinedload(Relationship.parent)).all()
-            
-            parent = None
-            for rel in parent_rels:
-                if rel.relation_type == 'father':
-                    parent = rel.parent
-                    break
-            
-            if not parent:
-                for rel in parent_rels:
-                    if rel.relation_type == 'mother':
-                        parent = rel.parent
-                        break
-            
-            if not parent and parent_rels:
-                parent = parent_rels[0].parent
-            
-            return parent
-        
-        # Build lineages going up until we find a common ancestor
-        person1_lineage = [person1.to_dict()]
-        person2_lineage = [person2.to_dict()]
-        
-        # Track all ancestors we've seen for both people
-        person1_ancestors = {person1_id: 0}  # Store generation level
-        person2_ancestors = {person2_id: 0}
-        
-        # Build person1's lineage going up (keep going until we find common ancestor or reach root)
-        current1 = person1_id
-        generation1 = 0
-        while True:
-            parent1 = get_parent(current1)
-            if not parent1:
-                break
-            
-            # Check if we've seen this ancestor before (cycle detection)
-            if parent1.id in person1_ancestors:
-                break
-            
-            generation1 += 1
-            person1_ancestors[parent1.id] = generation1
-            person1_lineage.append(parent1.to_dict())
-            current1 = parent1.id
-        
-        # Build person2's lineage going up, checking for common ancestor at each step
-        current2 = person2_id
-        generation2 = 0
-        common_ancestor = None
-        common_ancestor_id = None
-        
-        while True:
-            parent2 = get_parent(current2)
-            if not parent2:
-                break
-            
-            generation2 += 1
-            
-            # Check if this ancestor is in person1's ancestors
-            if parent2.id in person1_ancestors:
-                common_ancestor = parent2
-                common_ancestor_id = parent2.id
-                person2_lineage.append(parent2.to_dict())
-                break
-            
-            person2_ancestors[parent2.id] = generation2
-            person2_lineage.append(parent2.to_dict())
-            current2 = parent2.id
-        
-        # If we found common ancestor in person2's path, trim person1's lineage
-        if common_ancestor_id:
-            person1_lineage_trimmed = []
-            for person_dict in person1_lineage:
-                person1_lineage_trimmed.append(person_dict)
-                if person_dict.get('id') == str(common_ancestor_id):
-                    break
-            person1_lineage = person1_lineage_trimmed
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Error finding relationship: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to find relationship', 500)
+
+
+def find_relationship(person1_id, person2_id, layers=DEFAULT_STACK):
+    """
+    Relationship over all parent links (fathers, mothers, other parents).
+    The closest kinship path fills the lineage fields the relationship view renders;
+    every lowest common ancestor and its ranked path are returned alongside.
+    Returns the response dict, or None if either person is not in the layer stack.
+    """
+    snapshot = get_graph(layers)
+    person1_id = str(uuid.UUID(person1_id))
+    person2_id = str(uuid.UUID(person2_id))
+    
+    if person1_id not in snapshot.people or person2_id not in snapshot.people:
+        return None
+    
+    kinship = compute_kinship(snapshot, person1_id, person2_id)
+    
+    common_ancestor = None
+    relationship_type = None
+    siblings_info = None
+    person1_relationship_label = None
+    person2_relationship_label = None
+    
+    if kinship['paths']:
+        best = kinship['paths'][0]
+        person1_lineage = best['person1_path']
+        person2_lineage = best['person2_path']
+        common_ancestor = best['common_ancestor']
+        relationship_type = best['relationship_type']
+        person1_relationship_label = best['person1_relationship_label']
+        person2_relationship_label = best['person2_relationship_label']
+        
+        # The people one generation below the common ancestor are siblings
+        gen1 = best['person1_generations']
+        gen2 = best['person2_generations']
+        if gen1 > 0 and gen2 > 0:
+            siblings_info = {
+                'person1': person1_lineage[gen1 - 1],
+                'person2': person2_lineage[gen2 - 1],
+                'generation_level': gen1,
+                'relationship': 'siblings',
+                'half': best['half']
+            }
+    else:
+        # Not related: show each person's preferred-parent lineage up to their root
+        person1_lineage = preferred_lineage(snapshot, person1_id)
+        person2_lineage = preferred_lineage(snapshot, person2_id)
+    
+    return {
+        'found': True,
+        'person1_lineage': person1_lineage,
+        'person2_lineage': person2_lineage,
+        'common_ancestor': common_ancestor,
+        'relationship_type': relationship_type,
+        'siblings_info': siblings_info,
+        'person1_relationship_label': person1_relationship_label,
+        'person2_relationship_label': person2_relationship_label,
+        'common_ancestors': kinship['common_ancestors'],
+        'paths': kinship['paths'],
+        'coefficient_of_relationship': kinship['coefficient_of_relationship']
+    }
+
+
+@api_bp.route('/api/kinship-matrix', methods=['POST'])
+@rate_limited()
+def get_kinship_matrix():
+    """
+    Pairwise relationships for a group of people: body {"person_ids": [...]}.
+    Row i, column j describes person i relative to person j.
+    """
+    from kinship_matrix import compute_kinship_matrix, MAX_MATRIX_PEOPLE
+    
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('person_ids'), list):
+        return get_error_response('BAD_REQUEST', 'Missing "person_ids" array in request body')
+    
+    person_ids = data['person_ids']
+    if not 1 <= len(person_ids) <= MAX_MATRIX_PEOPLE:
+        return get_error_response('BAD_REQUEST', f'"person_ids" must contain 1 to {MAX_MATRIX_PEOPLE} IDs')
+    if not all(isinstance(p, str) and validate_uuid(p) for p in person_ids):
+        return get_error_response('BAD_REQUEST', 'Invalid person ID format')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        snapshot = get_graph(layers)
+        person_ids = list(dict.fromkeys(str(uuid.UUID(p)) for p in person_ids))
+        missing = [p for p in person_ids if p not in snapshot.people]
+        if missing:
+            return get_error_response('NOT_FOUND', f'Persons not found: {", ".join(missing)}')
+        
+        return jsonify(compute_kinship_matrix(snapshot, person_ids))
+    except Exception as e:
+        logger.error(f'Error computing kinship matrix: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to compute kinship matrix', 500)
+
+
+@api_bp.route('/api/is-descendant', methods=['GET'])
+def get_is_descendant():
+    """
+    Whether person_id descends from ancestor_id along preferred-parent lines:
+    an O(1) label test for the base layer, a walk up the snapshot for other stacks
+    """
+    person_id = request.args.get('person_id')
+    ancestor_id = request.args.get('ancestor_id')
+    
+    if not person_id or not ancestor_id:
+        return get_error_response('BAD_REQUEST', 'Both person_id and ancestor_id are required')
+    
+    if not validate_uuid(person_id) or not validate_uuid(ancestor_id):
+        return get_error_response('BAD_REQUEST', 'Invalid person ID format')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        person_key = str(uuid.UUID(person_id))
+        ancestor_key = str(uuid.UUID(ancestor_id))
+        if layers == DEFAULT_STACK:
+            rows = db.session.query(Person.id, Person.tree_pre, Person.tree_post).filter(
+                Person.id.in_([uuid.UUID(person_id), uuid.UUID(ancestor_id)]), Person.layer.in_(layers)
+            ).all()
+            labels = {str(row.id): (row.tree_pre, row.tree_post) for row in rows}
+            if person_key not in labels or ancestor_key not in labels:
+                return get_error_response('NOT_FOUND', 'One or both persons not found')
+            result = is_descendant(labels[person_key], labels[ancestor_key])
         else:
-            # If not found yet, continue going up person1's side to find if person2 is in person1's ancestors
-            # This handles the case where person2 reached root but person1 has more ancestors
-            current1 = person1_lineage[-1].get('id') if person1_lineage else None
-            if current1:
-                current1 = uuid.UUID(current1)
-                generation1 = person1_ancestors.get(current1, 0)
-                
-                while True:
-                    parent1 = get_parent(current1)
-                    if not parent1:
-                        break
-                    
-                    if parent1.id in person1_ancestors:
-                        break
-                    
-                    generation1 += 1
-                    person1_ancestors[parent1.id] = generation1
-                    person1_lineage.append(parent1.to_dict())
-                    
-                    # Check if person2 is in this ancestor's descendants or if this is person2
-                    if parent1.id == person2_id or parent1.id in person2_ancestors:
-                        common_ancestor = parent1
-                        common_ancestor_id = parent1.id
-                        # Trim person2's lineage
-                        person2_lineage_trimmed = []
-                        for person_dict in person2_lineage:
-                            person2_lineage_trimmed.append(person_dict)
-                            if person_dict.get('id') == str(common_ancestor_id):
-                                break
-                        person2_lineage = person2_lineage_trimmed
-                        break
-                    
-                    current1 = parent1.id
-        
-        # Calculate relationship type and identify siblings
-        relationship_type = None
-        siblings_info = None
-        if common_ancestor_id:
-            # Get generation levels from the lineage arrays
-            gen1 = -1
-            gen2 = -1
-            for idx, person_dict in enumerate(person1_lineage):
-                if person_dict.get('id') == str(common_ancestor_id):
-                    gen1 = idx
-                    break
-            for idx, person_dict in enumerate(person2_lineage):
-                if person_dict.get('id') == str(common_ancestor_id):
-                    gen2 = idx
-                    break
-            
-            # Check if the people one generation below the common ancestor are siblings
-            # They are siblings if they share the common ancestor as their parent
-            if gen1 > 0 and gen2 > 0:
-                person1_below = person1_lineage[gen1 - 1]
-                person2_below = person2_lineage[gen2 - 1]
-                
-                # Verify they are actually siblings by checking if they share the common ancestor as parent
-                person1_below_id = uuid.UUID(person1_below.get('id'))
-                person2_below_id = uuid.UUID(person2_below.get('id'))
-                
-                # Check if person1_below has common_ancestor as parent
-                person1_has_ancestor_as_parent = Relationship.query.filter_by(
-                    child_id=person1_below_id,
-                    parent_id=common_ancestor_id,
-                    visibility='public'
-                ).first() is not None
-                
-                # Check if person2_below has common_ancestor as parent
-                person2_has_ancestor_as_parent = Relationship.query.filter_by(
-                    child_id=person2_below_id,
-                    parent_id=common_ancestor_id,
-                    visibility='public'
-                ).first() is not None
-                
-                # If both have the common ancestor as their parent, they are siblings
-                if person1_has_ancestor_as_parent and person2_has_ancestor_as_parent:
-                    siblings_info = {
-                        'person1': person1_below,
-                        'person2': person2_below,
-                        'generation_level': gen1,
-                        'relationship': 'siblings'
-                    }
-            
-            if gen1 == 0 and gen2 == 0:
-                relationship_type = "Same person"
-            elif gen1 == 1 and gen2 == 1:
-                relationship_type = "Siblings (same parent)"
-            elif gen1 == 1 and gen2 == 2:
-                relationship_type = "Aunt/Uncle and Niece/Nephew"
-            elif gen1 == 2 and gen2 == 1:
-                relationship_type = "Aunt/Uncle and Niece/Nephew"
-            elif gen1 == 2 and gen2 == 2:
-                relationship_type = "1st Cousins"
-            elif gen1 == 1:
-                # Person1 is child of common ancestor, person2 is further down
-                if gen2 == 3:
-                    relationship_type = "Great-Aunt/Uncle and Great-Niece/Nephew"
-                elif gen2 == 4:
-                    relationship_type = "Great-Great-Aunt/Uncle and Great-Great-Niece/Nephew"
-                else:
-                    relationship_type = f"{gen2 - gen1} generation(s) removed"
-            elif gen2 == 1:
-                # Person2 is child of common ancestor, person1 is further down
-                if gen1 == 3:
-                    relationship_type = "Great-Aunt/Uncle and Great-Niece/Nephew"
-                elif gen1 == 4:
-                    relationship_type = "Great-Great-Aunt/Uncle and Great-Great-Niece/Nephew"
-                else:
-                    relationship_type = f"{gen1 - gen2} generation(s) removed"
-            else:
-                # Both are multiple generations from common ancestor
-                min_gen = min(gen1, gen2)
-                diff = abs(gen1 - gen2)
-                
-                # Calculate individual cousin levels
-                person1_cousin_level = gen1 - 1
-                person2_cousin_level = gen2 - 1
-                
-                # Helper function to get cousin label
-                def get_cousin_label(level):
-                    if level == 1:
-                        return "1st Cousin"
-                    elif level == 2:
-                        return "2nd Cousin"
-                    elif level == 3:
-                        return "3rd Cousin"
-                    elif level == 4:
-                        return "4th Cousin"
-                    else:
-                        return f"{level}th Cousin"
-                
-                # Create relationship type based on individual levels
-                if diff == 0:
-                    # Same generation level
-                    if person1_cousin_level == 1:
-                        relationship_type = "1st Cousins"
-                    elif person1_cousin_level == 2:
-                        relationship_type = "2nd Cousins"
-                    elif person1_cousin_level == 3:
-                        relationship_type = "3rd Cousins"
-                    elif person1_cousin_level == 4:
-                        relationship_type = "4th Cousins"
-                    else:
-                        relationship_type = f"{person1_cousin_level}th Cousins"
-                else:
-                    # Different generations - show both levels
-                    label1 = get_cousin_label(person1_cousin_level)
-                    label2 = get_cousin_label(person2_cousin_level)
-                    relationship_type = f"{label1} and {label2}"
-        
-        # Determine relationship labels for each person based on their individual generation levels
-        person1_relationship_label = None
-        person2_relationship_label = None
-        
-        if relationship_type and common_ancestor:
-            if relationship_type == "Same person":
-                person1_relationship_label = "Same Person"
-                person2_relationship_label = "Same Person"
-            elif relationship_type == "Siblings (same parent)":
-                person1_relationship_label = "Sibling"
-                person2_relationship_label = "Sibling"
-            elif "Cousins" in relationship_type or "cousins" in relationship_type.lower():
-                # Calculate individual cousin levels based on each person's generation from common ancestor
-                # gen1 and gen2 are already calculated above (they should be >= 0 if common_ancestor exists)
-                # Cousin level = gen - 1 (gen=1 is sibling, gen=2 is 1st cousin, gen=3 is 2nd cousin, etc.)
-                # Only calculate if gen1 and gen2 are valid (>= 0) and > 1 (since gen=1 is sibling, not cousin)
-                person1_cousin_level = gen1 - 1 if gen1 >= 0 and gen1 > 1 else None
-                person2_cousin_level = gen2 - 1 if gen2 >= 0 and gen2 > 1 else None
-                
-                # Assign labels based on individual cousin levels
-                if person1_cousin_level == 1:
-                    person1_relationship_label = "1st Cousin"
-                elif person1_cousin_level == 2:
-                    person1_relationship_label = "2nd Cousin"
-                elif person1_cousin_level == 3:
-                    person1_relationship_label = "3rd Cousin"
-                elif person1_cousin_level == 4:
-                    person1_relationship_label = "4th Cousin"
-                elif person1_cousin_level and person1_cousin_level > 4:
-                    person1_relationship_label = f"{person1_cousin_level}th Cousin"
-                else:
-                    person1_relationship_label = "Cousin"
-                
-                if person2_cousin_level == 1:
-                    person2_relationship_label = "1st Cousin"
-                elif person2_cousin_level == 2:
-                    person2_relationship_label = "2nd Cousin"
-                elif person2_cousin_level == 3:
-                    person2_relationship_label = "3rd Cousin"
-                elif person2_cousin_level == 4:
-                    person2_relationship_label = "4th Cousin"
-                elif person2_cousin_level and person2_cousin_level > 4:
-                    person2_relationship_label = f"{person2_cousin_level}th Cousin"
-                else:
-                    person2_relationship_label = "Cousin"
-            elif "Aunt/Uncle" in relationship_type or "Niece/Nephew" in relationship_type:
-                # Determine which is the aunt/uncle and which is the niece/nephew
-                if gen1 == 1:
-                    # Person1 is child of common ancestor, Person2 is further down
-                    person1_relationship_label = "Aunt/Uncle"
-                    person2_relationship_label = "Niece/Nephew"
-                else:
-                    # Person2 is child of common ancestor, Person1 is further down
-                    person1_relationship_label = "Niece/Nephew"
-                    person2_relationship_label = "Aunt/Uncle"
-            elif "Great-Aunt/Uncle" in relationship_type:
-                if gen1 == 1:
-                    person1_relationship_label = "Great-Aunt/Uncle"
-                    person2_relationship_label = "Great-Niece/Nephew"
-                else:
-                    person1_relationship_label = "Great-Niece/Nephew"
-                    person2_relationship_label = "Great-Aunt/Uncle"
-            elif "Great-Great-Aunt/Uncle" in relationship_type:
-                if gen1 == 1:
-                    person1_relationship_label = "Great-Great-Aunt/Uncle"
-                    person2_relationship_label = "Great-Great-Niece/Nephew"
-                else:
-                    person1_relationship_label = "Great-Great-Niece/Nephew"
-                    person2_relationship_label = "Great-Great-Aunt/Uncle"
-            
-            # Fallback: If labels weren't set but we have a relationship, calculate them based on generation levels
-            if not person1_relationship_label and gen1 >= 0 and gen2 >= 0:
-                # Calculate based on generation distance from common ancestor
-                if gen1 == 0:
-                    person1_relationship_label = "Same Person"
-                elif gen1 == 1:
-                    person1_relationship_label = "Child of Common Ancestor"
-                elif gen1 == 2:
-                    person1_relationship_label = "1st Cousin"
-                elif gen1 == 3:
-                    person1_relationship_label = "2nd Cousin"
-                elif gen1 == 4:
-                    person1_relationship_label = "3rd Cousin"
-                elif gen1 == 5:
-                    person1_relationship_label = "4th Cousin"
-                else:
-                    person1_relationship_label = f"{gen1 - 1}th Cousin"
-            
-            if not person2_relationship_label and gen1 >= 0 and gen2 >= 0:
-                # Calculate based on generation distance from common ancestor
-                if gen2 == 0:
-                    person2_relationship_label = "Same Person"
-                elif gen2 == 1:
-                    person2_relationship_label = "Child of Common Ancestor"
-                elif gen2 == 2:
-                    person2_relationship_label = "1st Cousin"
-                elif gen2 == 3:
-                    person2_relationship_label = "2nd Cousin"
-                elif gen2 == 4:
-                    person2_relationship_label = "3rd Cousin"
-                elif gen2 == 5:
-                    person2_relationship_label = "4th Cousin"
-                else:
-                    person2_relationship_label = f"{gen2 - 1}th Cousin"
+            snapshot = get_graph(layers)
+            if person_key not in snapshot.people or ancestor_key not in snapshot.people:
+                return get_error_response('NOT_FOUND', 'One or both persons not found')
+            result = descends_from(snapshot, person_key, ancestor_key)
         
         return jsonify({
-            'found': True,
-            'person1_lineage': person1_lineage,
-            'person2_lineage': person2_lineage,
-            'common_ancestor': common_ancestor.to_dict() if common_ancestor else None,
-            'relationship_type': relationship_type,
-            'siblings_info': siblings_info,
-            'person1_relationship_label': person1_relationship_label,
-            'person2_relationship_label': person2_relationship_label
+            'person_id': person_key,
+            'ancestor_id': ancestor_key,
+            'is_descendant': result
         })
     except Exception as e:
-        logger.error(f'Error finding relationship: {e}', exc_info=True)
-        return get_error_response('SERVER_ERROR', 'Failed to find relationship', 500)
+        logger.error(f'Error checking descent: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to check descent', 500)
+
 
+@api_bp.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Dynasty-wide statistics (generation sizes, children per person, lifespans, gender ratios)"""
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        # NumPy is only loaded when statistics are first requested
+        from analytics import get_tree_stats
+        return jsonify(get_tree_stats(layers))
+    except Exception as e:
+        logger.error(f'Error computing stats: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to compute statistics', 500)
 
-def bfs_shortest_path(start_id, end_id):
+
+@api_bp.route('/api/layout/<person_id>', methods=['GET'])
+def get_layout_view(person_id):
+    """Tidy-tree x/y coordinates for a person's descendants (?depth=N generations, default 4)"""
+    if not validate_uuid(person_id):
+        return get_error_response('BAD_REQUEST', 'Invalid person ID format')
+    
+    from layout import get_layout, DEFAULT_LAYOUT_DEPTH, MAX_LAYOUT_DEPTH
+    try:
+        depth = int(request.args.get('depth', DEFAULT_LAYOUT_DEPTH))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"depth" must be an integer')
+    if not 1 <= depth <= MAX_LAYOUT_DEPTH:
+        return get_error_response('BAD_REQUEST', f'"depth" must be between 1 and {MAX_LAYOUT_DEPTH}')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        layout = get_layout(uuid.UUID(person_id), depth, layers)
+        if layout is None:
+            return get_error_response('NOT_FOUND', 'Person not found')
+        return jsonify(layout)
+    except Exception as e:
+        logger.error(f'Error computing layout: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to compute layout', 500)
+
+
+@api_bp.route('/api/chart/<person_id>', methods=['GET'])
+@rate_limited()
+def get_chart_file(person_id):
+    """
+    Printable chart of a person's descendants: ?depth=N generations (default 4),
+    ?format=svg (default) or png. Rendered once per tree version and served from disk.
+    """
+    if not validate_uuid(person_id):
+        return get_error_response('BAD_REQUEST', 'Invalid person ID format')
+    
+    from layout import DEFAULT_LAYOUT_DEPTH, MAX_LAYOUT_DEPTH
+    from charts import get_chart, ChartUnavailable, MIMETYPES
+    try:
+        depth = int(request.args.get('depth', DEFAULT_LAYOUT_DEPTH))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"depth" must be an integer')
+    if not 1 <= depth <= MAX_LAYOUT_DEPTH:
+        return get_error_response('BAD_REQUEST', f'"depth" must be between 1 and {MAX_LAYOUT_DEPTH}')
+    
+    fmt = request.args.get('format', 'svg').lower()
+    if fmt not in MIMETYPES:
+        return get_error_response('BAD_REQUEST', '"format" must be svg or png')
+    
+    try:
+        layers = get_layer_stack()
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        chart = get_chart(uuid.UUID(person_id), depth, layers, fmt)
+        if chart is None:
+            return get_error_response('NOT_FOUND', 'Person not found')
+        
+        data, key = chart
+        response = Response(data, mimetype=MIMETYPES[fmt])
+        response.headers['Content-Disposition'] = f'inline; filename="descendants-{person_id}-{depth}.{fmt}"'
+        response.set_etag(key)
+        return response.make_conditional(request)
+    except ChartUnavailable as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    except Exception as e:
+        logger.error(f'Error rendering chart: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to render chart', 500)
+
+
+@api_bp.route('/api/changes', methods=['GET'])
+def get_changes():
+    """
+    Changes since a tree version, for incremental sync: ?since=<version>&limit=<n>.
+    Pages always end on a whole version; continue with since=next_since while has_more.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', MAX_CHANGES_PAGE))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"since" and "limit" must be integers')
+    
+    if since < 0 or not 1 <= limit <= MAX_CHANGES_PAGE:
+        return get_error_response('BAD_REQUEST', f'"since" must be >= 0 and "limit" between 1 and {MAX_CHANGES_PAGE}')
+    
+    try:
+        changes, has_more = changes_since(since, limit)
+        response = jsonify({
+            'since': since,
+            'tree_version': current_version(),
+            'changes': [change.to_dict() for change in changes],
+            'has_more': has_more,
+            'next_since': changes[-1].tree_version if changes else since
+        })
+        # Clients poll this; never serve a cached page
+        response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        logger.error(f'Error getting changes: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Failed to get changes', 500)
+
+
+def bfs_shortest_path(start_id, end_id, layers=DEFAULT_STACK):
     """BFS to find shortest path between two people (undirected)"""
     if start_id == end_id:
         return [start_id]
     
-    # Build adjacency list (undirected)
-    relationships = Relationship.query.filter_by(visibility='public').all()
+    # Undirected adjacency from the cached graph snapshot
+    snapshot = get_graph(layers)
     graph = {}
-    
-    for rel in relationships:
-        parent_id = str(rel.parent_id)
-        child_id = str(rel.child_id)
-        
-        if parent_id not in graph:
-            graph[parent_id] = []
-        if child_id not in graph:
-            graph[child_id] = []
-        
-        graph[parent_id].append(child_id)
-        graph[child_id].append(parent_id)
+    for child_id, parent_rels in snapshot.parents.items():
+        for parent_id, _ in parent_rels:
+            graph.setdefault(parent_id, []).append(child_id)
+            graph.setdefault(child_id, []).append(parent_id)
     
     start_str = str(start_id)
     end_str = str(end_id)
@@ -676,52 +755,19 @@ def bfs_shortest_path(start_id, end_id):
     return []
 
 
-def find_common_ancestor(person1_id, person2_id):
-    """Find common ancestor by getting all ancestors of both and finding intersection"""
-    # Get all ancestors of person1
-    ancestors1 = get_all_ancestors(person1_id)
+def find_common_ancestor(person1_id, person2_id, layers=DEFAULT_STACK):
+    """Find the closest lowest common ancestor over all parent links"""
+    kinship = compute_kinship(get_graph(layers), person1_id, person2_id, max_paths=1)
     
-    # Get all ancestors of person2
-    ancestors2 = get_all_ancestors(person2_id)
-    
-    # Find common ancestors (intersection)
-    common_ancestors = ancestors1.intersection(ancestors2)
-    
-    if not common_ancestors:
+    if not kinship['paths']:
         return None
     
-    # Find the most recent common ancestor (closest to both people)
-    # We'll use BFS from both people to find the closest one
-    # For now, just return the first one found (we can improve this later)
-    for ancestor_id in common_ancestors:
-        ancestor = Person.query.get(ancestor_id)
-        if ancestor:
-            return ancestor
-    
-    return None
+    return Person.query.get(uuid.UUID(kinship['paths'][0]['common_ancestor']['id']))
 
 
-def get_all_ancestors(person_id):
-    """Get all ancestors of a person (recursive)"""
-    ancestors = set()
-    queue = deque([person_id])
-    
-    while queue:
-        current = queue.popleft()
-        if current in ancestors:
-            continue
-        ancestors.add(current)
-        
-        # Get parents
-        parent_rels = Relationship.query.filter_by(
-            child_id=current,
-            visibility='public'
-        ).all()
-        
-        for rel in parent_rels:
-            queue.append(rel.parent_id)
-    
-    return ancestors
+def get_all_ancestors(person_id, layers=DEFAULT_STACK):
+    """Get all ancestors of a person, including the person (as ID strings)"""
+    return set(ancestor_depths(get_graph(layers), str(person_id)))
 
 
 def get_ancestry_path(person_id):
@@ -778,6 +824,124 @@ def get_person_name(person_id):
 
 # ==================== ADMIN ROUTES ====================
 
+def tree_changed():
+    """After an admin commit: mark graph snapshots stale, relabel and re-validate in the background"""
+    invalidate_graph()
+    schedule_maintenance(current_app._get_current_object())
+
+
+def import_year(value, column):
+    """An import row's year as an int (None stays None); ValueError names the column"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f'{column} must be an integer')
+    try:
+        year = int(value)
+    except ValueError:
+        raise ValueError(f'{column} must be an integer')
+    if not -2**31 <= year < 2**31:
+        raise ValueError(f'{column} is out of range')
+    return year
+
+
+def import_text(value, column):
+    """An import row's optional text field, stripped (empty -> None); ValueError if not text"""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{column} must be a string')
+    return value.strip() or None
+
+
+def people_import_row(person_data):
+    """
+    (person UUID or None, people row with its content_hash) for an
+    /admin/import/people row; ValueError carries the rejection reason
+    """
+    if not isinstance(person_data, dict):
+        raise ValueError('Row must be an object')
+    # Support both formats: 'name_original' (old) or 'english_name' (new)
+    name_original = import_text(person_data.get('english_name', person_data.get('name_original')), 'english_name')
+    if not name_original:
+        raise ValueError('Missing english_name or name_original')
+    # Amharic name (optional) - support both 'amharic_name' and 'name_amharic'
+    name_amharic = import_text(person_data.get('amharic_name', person_data.get('name_amharic')), 'amharic_name')
+    
+    person_id = None
+    if 'id' in person_data and person_data['id']:
+        if not isinstance(person_data['id'], str) or not validate_uuid(person_data['id']):
+            raise ValueError('Invalid UUID format')
+        person_id = uuid.UUID(person_data['id'])
+    
+    row = {
+        'name_original': name_original,
+        'name_amharic': name_amharic,
+        'name_normalized': normalize_name(name_original),
+        'layer': validate_layer_name(person_data.get('layer'))
+    }
+    # birth_year, death_year and gender are only overwritten when the row has them
+    for column in OPTIONAL_COLUMNS:
+        if column in person_data:
+            row[column] = import_text(person_data[column], column) if column == 'gender' else import_year(person_data[column], column)
+    if row.get('gender') and len(row['gender']) > Person.gender.type.length:
+        raise ValueError(f'gender must be at most {Person.gender.type.length} characters')
+    row['content_hash'] = row_hash(
+        name_original, name_amharic, row.get('birth_year'), row.get('death_year'), row.get('gender'), row['layer']
+    )
+    return person_id, row
+
+
+def combined_import_row(row):
+    """
+    (person entry, relationship entry or None) for an /admin/import/combined row,
+    or None for a row without a name; ValueError carries the rejection reason
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    english_name = import_text(row.get('english_name', row.get('name_original')), 'english_name')
+    if not english_name:
+        return None
+    
+    person_entry = {
+        'english_name': english_name,
+        'amharic_name': import_text(row.get('amharic_name', row.get('name_amharic')), 'amharic_name')
+    }
+    # Include birth_year and death_year for duplicate name matching
+    for column in ('birth_year', 'death_year'):
+        year = import_year(row.get(column), column)
+        if year:
+            person_entry[column] = year
+    
+    # Support direct ID specification for unambiguous matching
+    person_id = import_text(row.get('person_id'), 'person_id')
+    if person_id:
+        person_entry['id'] = person_id
+    
+    # Extract relationship data
+    english_parent_name = import_text(row.get('english_parent_name', row.get('parent_name')), 'english_parent_name')
+    relation_type = (import_text(row.get('relation_type'), 'relation_type') or 'parent').lower()
+    if relation_type not in ('father', 'mother', 'parent'):
+        raise ValueError('relation_type must be father, mother or parent')
+    person_entry['content_hash'] = row_hash(
+        english_name, person_entry['amharic_name'],
+        person_entry.get('birth_year'), person_entry.get('death_year'),
+        parent=english_parent_name, relation_type=relation_type
+    )
+    
+    rel_data = None
+    if english_parent_name:
+        rel_data = {
+            'child_english_name': english_name,
+            'parent_english_name': english_parent_name,
+            'relation_type': relation_type,
+            'child_birth_year': person_entry.get('birth_year'),
+            'child_death_year': person_entry.get('death_year'),
+            'content_hash': person_entry['content_hash']
+        }
+    return person_entry, rel_data
+
+
 def check_admin_token():
     """Check admin token from header"""
     token = request.headers.get('X-ADMIN-TOKEN')
@@ -786,6 +950,92 @@ def check_admin_token():
     return None
 
 
+@admin_bp.route('/validate', methods=['GET'])
+def validate():
+    """
+    Integrity report over the whole graph (admin only): cycles, children with several
+    fathers or mothers, orphaned relationship rows and parent/child birth-year inversions.
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    try:
+        return jsonify(run_validation())
+    except Exception as e:
+        logger.error(f'Error validating tree: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', 'Validation failed', 500)
+
+
+@admin_bp.route('/profiles', methods=['GET'])
+def list_profiles():
+    """
+    Profiled requests kept by this worker (admin only): slowest first, or most recent
+    first with ?sort=recent. Requests are profiled on X-Profile: 1 or PROFILE_SAMPLE_RATE.
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"limit" must be an integer')
+    sort = request.args.get('sort', 'duration')
+    if sort not in ('duration', 'recent'):
+        return get_error_response('BAD_REQUEST', 'sort must be duration or recent')
+    
+    return jsonify({
+        'profiles': recent_profiles(max(limit, 1), sort),
+        'sample_rate': Config.PROFILE_SAMPLE_RATE,
+        'max_stored': Config.PROFILE_MAX_STORED
+    })
+
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+def get_request_profile(profile_id):
+    """One profiled request (admin only): hottest functions (?sort=cumulative|tottime) and slowest queries"""
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    profile = get_profile(profile_id)
+    if not profile:
+        return get_error_response('NOT_FOUND', 'Profile not found')
+    
+    try:
+        limit = int(request.args.get('limit', 30))
+    except ValueError:
+        return get_error_response('BAD_REQUEST', '"limit" must be an integer')
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime'):
+        return get_error_response('BAD_REQUEST', 'sort must be cumulative or tottime')
+    
+    return jsonify(dict(
+        profile.summary(),
+        functions=profile.top_functions(max(limit, 1), sort),
+        queries=profile.slowest_queries(max(limit, 1))
+    ))
+
+
+@admin_bp.route('/profiles/<profile_id>.prof', methods=['GET'])
+def download_request_profile(profile_id):
+    """Raw pstats dump of one profiled request (admin only), for snakeviz or flameprof"""
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    profile = get_profile(profile_id)
+    if not profile:
+        return get_error_response('NOT_FOUND', 'Profile not found')
+    
+    return Response(
+        profile.pstats_dump(),
+        mimetype='application/octet-stream',
+        headers={'Content-Disposition': f'attachment; filename=profile-{profile_id}.prof'}
+    )
+
+
 @admin_bp.route('/import/people', methods=['POST'])
 def import_people():
     """Import people (admin only)"""
@@ -802,79 +1052,41 @@ def import_people():
         if not isinstance(people_data, list):
             return get_error_response('BAD_REQUEST', '"people" must be an array')
         
-        created_count = 0
-        updated_count = 0
+        unchanged_count = 0
         rejected = []
+        keyed_rows = []
+        new_rows = []
         
+        # Validate every row on its own, so a bad row is rejected without failing the import
+        valid_rows = []
         for idx, person_data in enumerate(people_data):
             try:
-                # Support both formats: 'name_original' (old) or 'english_name' (new)
-                name_original = person_data.get('english_name', person_data.get('name_original', '')).strip()
-                if not name_original:
-                    rejected.append({'row': idx, 'reason': 'Missing english_name or name_original'})
-                    continue
-                
-                # Amharic name (optional) - support both 'amharic_name' and 'name_amharic'
-                name_amharic = person_data.get('amharic_name', person_data.get('name_amharic', '')).strip() or None
-                
-                person_id = None
-                if 'id' in person_data and person_data['id']:
-                    if not validate_uuid(person_data['id']):
-                        rejected.append({'row': idx, 'reason': 'Invalid UUID format'})
-                        continue
-                    person_id = uuid.UUID(person_data['id'])
-                
-                name_normalized = normalize_name(name_original)
-                
-                # Upsert
-                if person_id:
-                    person = Person.query.get(person_id)
-                    if person:
-                        person.name_original = name_original
-                        person.name_amharic = name_amharic
-                        person.name_normalized = name_normalized
-                        person.layer = person_data.get('layer', 'base')
-                        if 'birth_year' in person_data:
-                            person.birth_year = person_data['birth_year']
-                        if 'death_year' in person_data:
-                            person.death_year = person_data['death_year']
-                        if 'gender' in person_data:
-                            person.gender = person_data['gender']
-                        updated_count += 1
-                    else:
-                        person = Person(
-                            id=person_id,
-                            name_original=name_original,
-                            name_amharic=name_amharic,
-                            name_normalized=name_normalized,
-                            layer=person_data.get('layer', 'base'),
-                            birth_year=person_data.get('birth_year'),
-                            death_year=person_data.get('death_year'),
-                            gender=person_data.get('gender')
-                        )
-                        db.session.add(person)
-                        created_count += 1
-                else:
-                    person = Person(
-                        name_original=name_original,
-                        name_amharic=name_amharic,
-                        name_normalized=name_normalized,
-                        layer=person_data.get('layer', 'base'),
-                        birth_year=person_data.get('birth_year'),
-                        death_year=person_data.get('death_year'),
-                        gender=person_data.get('gender')
-                    )
-                    db.session.add(person)
-                    created_count += 1
-                
-            except Exception as e:
+                valid_rows.append(people_import_row(person_data))
+            except ValueError as e:
                 rejected.append({'row': idx, 'reason': str(e)})
         
+        # Rows imported before exactly as they are, found with one bulk hash lookup
+        stored = stored_hashes(row['content_hash'] for _, row in valid_rows)
+        for person_id, row in valid_rows:
+            stored_id = stored.get(row['content_hash'])
+            if stored_id and (person_id is None or stored_id == str(person_id)):
+                unchanged_count += 1
+            elif person_id:
+                keyed_rows.append(dict(row, id=person_id))
+            else:
+                new_rows.append(row)
+        
+        # Set-based writes: one upsert per batch of id-bearing rows, one insert per batch of the rest
+        created_count, updated_count = upsert_people(keyed_rows)
+        created_count += insert_people(new_rows)
+        
         db.session.commit()
+        tree_changed()
         
         return jsonify({
             'created': created_count,
             'updated': updated_count,
+            'unchanged': unchanged_count,
             'rejected': rejected,
             'total_processed': len(people_data)
         })
@@ -890,6 +1102,7 @@ def import_combined():
     """
     Import people and relationships from a single CSV-like structure.
     Accepts format: english_name, amharic_name, english_parent_name, amharic_parent_name
+    With ?dry_run=true nothing is written; the response lists what the import would do.
     """
     auth_error = check_admin_token()
     if auth_error:
@@ -904,64 +1117,48 @@ def import_combined():
         if not isinstance(rows_data, list):
             return get_error_response('BAD_REQUEST', '"rows" must be an array')
         
-        # Step 1: Import all people first
+        # Step 1: Import all people first. Rows are validated one by one, so a bad
+        # row is rejected on its own instead of failing the whole batch
         people_data = []
         relationships_data = []
+        rejected_rows = []
         
-        for row in rows_data:
-            # Extract person data
-            english_name = row.get('english_name', row.get('name_original', '')).strip()
-            if not english_name:
+        for row_idx, row in enumerate(rows_data):
+            try:
+                parsed = combined_import_row(row)
+            except ValueError as e:
+                rejected_rows.append({'row': row_idx, 'reason': str(e)})
                 continue
-            
-            person_entry = {
-                'english_name': english_name,
-                'amharic_name': row.get('amharic_name', row.get('name_amharic', '')).strip() or None
-            }
-            
-            # Include birth_year and death_year for duplicate name matching
-            if 'birth_year' in row and row['birth_year']:
-                try:
-                    person_entry['birth_year'] = int(row['birth_year'])
-                except (ValueError, TypeError):
-                    pass
-            
-            if 'death_year' in row and row['death_year']:
-                try:
-                    person_entry['death_year'] = int(row['death_year'])
-                except (ValueError, TypeError):
-                    pass
-            
-            # Support direct ID specification for unambiguous matching
-            if 'person_id' in row and row['person_id']:
-                person_entry['id'] = row['person_id'].strip()
-            
+            if parsed is None:
+                continue
+            person_entry, rel_data = parsed
             people_data.append(person_entry)
-            
-            # Extract relationship data
-            english_parent_name = row.get('english_parent_name', row.get('parent_name', '')).strip()
-            if english_parent_name:
-                relationships_data.append({
-                    'child_english_name': english_name,
-                    'parent_english_name': english_parent_name,
-                    'relation_type': row.get('relation_type', 'parent').strip().lower() or 'parent',
-                    'child_birth_year': person_entry.get('birth_year'),
-                    'child_death_year': person_entry.get('death_year')
-                })
+            if rel_data:
+                relationships_data.append(rel_data)
+        
+        # Rows imported before exactly as they are are skipped; their people still
+        # resolve parent names for the rows that changed
+        stored = stored_hashes(entry['content_hash'] for entry in people_data)
+        known_ids = {
+            entry['english_name']: stored[entry['content_hash']]
+            for entry in people_data if entry['content_hash'] in stored
+        }
+        unchanged_count = sum(1 for entry in people_data if entry['content_hash'] in stored)
+        people_data = [entry for entry in people_data if entry['content_hash'] not in stored]
+        relationships_data = [rel for rel in relationships_data if rel['content_hash'] not in stored]
+        
+        if request.args.get('dry_run', 'false').lower() == 'true':
+            from import_plan import plan_combined_import
+            plan = plan_combined_import(people_data, relationships_data, normalize_name, known_ids)
+            plan['people']['skipped_unchanged'] = unchanged_count
+            plan['people']['rejected'] = rejected_rows + plan['people']['rejected']
+            return jsonify(dict(plan, dry_run=True, total_processed=len(rows_data)))
         
         # Import people
         people_result = import_people_batch(people_data)
         
         # Step 2: Create name to ID mapping with smart matching for duplicates
-        # Build a map of all imported people first (by order of import)
-        imported_people_map = {}  # Maps name -> list of (person_entry, index) in import order
-        for idx, person_entry in enumerate(people_data):
-            english_name = person_entry['english_name']
-            if english_name not in imported_people_map:
-                imported_people_map[english_name] = []
-            imported_people_map[english_name].append((person_entry, idx))
-        
-        name_to_id = {}
+        name_to_id = dict(known_ids)
         for person_entry in people_data:
             english_name = person_entry['english_name']
             
@@ -980,9 +1177,9 @@ def import_combined():
             birth_year = person_entry.get('birth_year')
             death_year = person_entry.get('death_year')
             
-            # Find all people with this name
+            # Find all people with this name (oldest first, the order the dry run uses)
             query = Person.query.filter_by(name_normalized=name_normalized, layer='base')
-            candidates = query.all()
+            candidates = query.order_by(Person.created_at.asc(), Person.id.asc()).all()
             
             if len(candidates) == 0:
                 # Person not found - will be created during import
@@ -1000,26 +1197,9 @@ def import_combined():
                 if not matched and death_year:
                     matched = next((p for p in candidates if p.death_year == death_year), None)
                 
-                # Second try: Use import order - if this person appears earlier in the import,
-                # they were likely imported earlier, so match to the most recently created
-                # person with this name (likely from a previous import of the same branch)
+                # Otherwise the most recent one, the person the name merge above updated
                 if not matched:
-                    # Get the import index of this person
-                    import_entries = imported_people_map.get(english_name, [])
-                    current_idx = next((idx for entry, idx in import_entries if entry == person_entry), None)
-                    
-                    if current_idx is not None:
-                        # Check if this person appears earlier in the import (likely the parent/ancestor)
-                        earlier_entries = [idx for entry, idx in import_entries if idx < current_idx]
-                        if earlier_entries:
-                            # This person was imported before, so use the most recent match
-                            matched = sorted(candidates, key=lambda p: p.created_at, reverse=True)[0]
-                        else:
-                            # This is the first occurrence, use most recent
-                            matched = sorted(candidates, key=lambda p: p.created_at, reverse=True)[0]
-                    else:
-                        # Fallback: use most recently created
-                        matched = sorted(candidates, key=lambda p: p.created_at, reverse=True)[0]
+                    matched = most_recent(candidates)
                 
                 if matched:
                     name_to_id[english_name] = str(matched.id)
@@ -1029,6 +1209,7 @@ def import_combined():
         # Step 3: Import relationships
         created_rels = 0
         rejected_rels = []
+        applied_rels = []  # (parent_id, child_id, relation_type, row hash)
         
         for idx, rel_data in enumerate(relationships_data):
             parent_id = name_to_id.get(rel_data['parent_english_name'])
@@ -1038,7 +1219,9 @@ def import_combined():
             if not parent_id:
                 parent_name = rel_data['parent_english_name']
                 parent_normalized = normalize_name(parent_name)
-                parent_candidates = Person.query.filter_by(name_normalized=parent_normalized, layer='base').all()
+                parent_candidates = Person.query.filter_by(name_normalized=parent_normalized, layer='base').order_by(
+                    Person.created_at.asc(), Person.id.asc()
+                ).all()
                 
                 if len(parent_candidates) == 1:
                     parent_id = str(parent_candidates[0].id)
@@ -1075,7 +1258,7 @@ def import_combined():
                     
                     # Final fallback: use most recently created parent
                     if not parent_id:
-                        matched = sorted(parent_candidates, key=lambda p: p.created_at, reverse=True)[0]
+                        matched = most_recent(parent_candidates)
                         parent_id = str(matched.id)
                         name_to_id[parent_name] = parent_id
                         logger.info(f"Multiple parents named '{parent_name}' found. Using most recent: {matched.id}.")
@@ -1088,6 +1271,10 @@ def import_combined():
                 rejected_rels.append({'row': idx, 'reason': f"Child '{rel_data['child_english_name']}' not found."})
                 continue
             
+            if str(parent_id) == str(child_id):
+                rejected_rels.append({'row': idx, 'reason': 'Parent and child cannot be the same'})
+                continue
+            
             # Check if relationship already exists
             existing = Relationship.query.filter_by(
                 parent_id=parent_id,
@@ -1095,6 +1282,7 @@ def import_combined():
                 relation_type=rel_data['relation_type']
             ).first()
             
+            applied_rels.append((parent_id, child_id, rel_data['relation_type'], rel_data['content_hash']))
             if existing:
                 continue
             
@@ -1108,13 +1296,26 @@ def import_combined():
             db.session.add(relationship)
             created_rels += 1
         
+        # Remember applied rows so the next re-import skips them: rows with a parent
+        # on their relationship, the others on the person
+        with_parent = {rel['content_hash'] for rel in relationships_data}
+        db.session.flush()
+        store_relationship_hashes(applied_rels)
+        store_hashes(
+            (name_to_id[entry['english_name']], entry['content_hash'])
+            for entry in people_data
+            if entry['content_hash'] not in with_parent and entry['english_name'] in name_to_id
+        )
+        
         db.session.commit()
+        tree_changed()
         
         return jsonify({
             'people': {
                 'created': people_result.get('created', 0),
                 'updated': people_result.get('updated', 0),
-                'rejected': people_result.get('rejected', [])
+                'unchanged': unchanged_count,
+                'rejected': rejected_rows
             },
             'relationships': {
                 'created': created_rels,
@@ -1129,49 +1330,91 @@ def import_combined():
         return get_error_response('SERVER_ERROR', f'Import failed: {str(e)}', 500)
 
 
-def import_people_batch(people_data):
-    """Helper function to import a batch of people"""
-    created_count = 0
-    updated_count = 0
-    rejected = []
+@admin_bp.route('/import/gedcom', methods=['POST'])
+def import_gedcom_file():
+    """
+    Import a GEDCOM file (admin only), as the request body or a multipart "file" field.
+    ?source=<name> identifies the external tree: its xrefs map to stable UUIDs, so
+    re-importing the same source updates people instead of duplicating them.
+    Records exported by /admin/export/gedcom keep their own UUIDs (REFN).
+    Optional ?layer=<name> puts new people and relationships in that layer (default: base).
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
     
-    for idx, person_data in enumerate(people_data):
-        try:
-            english_name = person_data['english_name']
-            amharic_name = person_data.get('amharic_name')
-            
-            name_normalized = normalize_name(english_name)
-            
-            # Check if person exists
-            existing = Person.query.filter_by(name_normalized=name_normalized, layer='base').first()
-            
-            if existing:
-                existing.name_original = english_name
-                if amharic_name:
-                    existing.name_amharic = amharic_name
-                updated_count += 1
-            else:
-                person = Person(
-                    name_original=english_name,
-                    name_amharic=amharic_name,
-                    name_normalized=name_normalized,
-                    layer='base'
-                )
-                db.session.add(person)
-                created_count += 1
+    source = request.args.get('source', '').strip()
+    if not source:
+        return get_error_response('BAD_REQUEST', 'Query parameter "source" is required')
+    
+    try:
+        layer = validate_layer_name(request.args.get('layer'))
+    except ValueError as e:
+        return get_error_response('BAD_REQUEST', str(e))
+    
+    try:
+        from gedcom import import_gedcom
+        import io
+        
+        upload = request.files.get('file')
+        raw = upload.stream if upload else request.stream
+        lines = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace')
         
-        except Exception as e:
-            rejected.append({'row': idx, 'reason': str(e)})
+        result = import_gedcom(lines, source, layer)
+        db.session.commit()
+        tree_changed()
+        
+        return jsonify(result)
     
-    db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error in GEDCOM import: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', f'Import failed: {str(e)}', 500)
+
+
+def import_people_batch(people_data):
+    """
+    Helper function to import a batch of people (set-based match on the normalized base name).
+    Writes in the caller's transaction; the caller commits and calls tree_changed() once.
+    """
+    created_count, updated_count = merge_people_by_name(
+        [(person_data['english_name'], person_data.get('amharic_name')) for person_data in people_data],
+        normalize_name
+    )
     
     return {
         'created': created_count,
-        'updated': updated_count,
-        'rejected': rejected
+        'updated': updated_count
     }
 
 
+@admin_bp.route('/export/gedcom', methods=['GET'])
+def export_gedcom_file():
+    """
+    Stream the tree as GEDCOM 5.5.1 (admin only).
+    Optional ?person_id= exports only that person's branch (descendants and their co-parents).
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    person_id = request.args.get('person_id')
+    if person_id:
+        if not validate_uuid(person_id):
+            return get_error_response('BAD_REQUEST', 'Invalid person ID format')
+        if not Person.query.filter_by(id=person_id, layer='base').first():
+            return get_error_response('NOT_FOUND', 'Person not found')
+    
+    from gedcom import export_gedcom
+    filename = f'royal-family-tree-{person_id}.ged' if person_id else 'royal-family-tree.ged'
+    
+    return Response(
+        stream_with_context(export_gedcom(db.engine, person_id)),
+        mimetype='application/x-gedcom',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
 @admin_bp.route('/delete/person', methods=['POST'])
 def delete_person():
     """Delete a person and their relationships (admin only)"""
@@ -1222,6 +1465,7 @@ def delete_person():
         # Delete the person
         db.session.delete(person)
         db.session.commit()
+        tree_changed()
         
         return jsonify({
             'success': True,
@@ -1235,6 +1479,104 @@ def delete_person():
         return get_error_response('SERVER_ERROR', f'Delete failed: {str(e)}', 500)
 
 
+@admin_bp.route('/branch/delete', methods=['POST'])
+def delete_branch_route():
+    """
+    Delete a person with all their descendants and every relationship touching them (admin only).
+    
+    With ?dry_run=true nothing is written; the response shows what would be deleted.
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    try:
+        data = request.get_json() or {}
+        root_id = data.get('root_id')
+        if not root_id or not validate_uuid(root_id):
+            return get_error_response('BAD_REQUEST', 'A valid root_id is required')
+        
+        ids = branch_ids(root_id)
+        if not ids:
+            return get_error_response('NOT_FOUND', 'Person not found')
+        
+        if request.args.get('dry_run', 'false').lower() == 'true':
+            return jsonify(dict(preview_delete(ids), root_id=root_id, dry_run=True))
+        
+        deleted = delete_branch(ids)
+        db.session.commit()
+        tree_changed()
+        logger.info(f"Deleted branch {root_id}: {deleted['people']} people, {deleted['relationships']} relationships")
+        
+        return jsonify({
+            'success': True,
+            'root_id': root_id,
+            'deleted_people': deleted['people'],
+            'deleted_relationships': deleted['relationships']
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error deleting branch: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', f'Branch delete failed: {str(e)}', 500)
+
+
+@admin_bp.route('/branch/reattach', methods=['POST'])
+def reattach_branch_route():
+    """
+    Move a branch: new_parent_id becomes the only parent of root_id in the layer (admin only).
+    
+    With ?dry_run=true nothing is written; the response shows the branch and the links that would change.
+    """
+    auth_error = check_admin_token()
+    if auth_error:
+        return auth_error
+    
+    try:
+        data = request.get_json() or {}
+        root_id = data.get('root_id')
+        new_parent_id = data.get('new_parent_id')
+        relation_type = data.get('relation_type', 'parent')
+        if not root_id or not validate_uuid(root_id):
+            return get_error_response('BAD_REQUEST', 'A valid root_id is required')
+        if not new_parent_id or not validate_uuid(new_parent_id):
+            return get_error_response('BAD_REQUEST', 'A valid new_parent_id is required')
+        if relation_type not in ['father', 'mother', 'parent']:
+            return get_error_response('BAD_REQUEST', 'relation_type must be father, mother, or parent')
+        try:
+            layer = validate_layer_name(data.get('layer'))
+        except ValueError as e:
+            return get_error_response('BAD_REQUEST', str(e))
+        
+        root = Person.query.get(uuid.UUID(root_id))
+        new_parent = Person.query.get(uuid.UUID(new_parent_id))
+        if not root:
+            return get_error_response('NOT_FOUND', 'Person not found')
+        if not new_parent:
+            return get_error_response('NOT_FOUND', 'New parent not found')
+        
+        ids = branch_ids(root.id)
+        if new_parent.id in ids:
+            return get_error_response('BAD_REQUEST', 'The new parent is part of the branch (would create a cycle)')
+        
+        if request.args.get('dry_run', 'false').lower() == 'true':
+            return jsonify(dict(
+                preview_reattach(ids, root, new_parent, relation_type, layer), root_id=root_id, dry_run=True
+            ))
+        
+        moved = reattach_branch(root, new_parent, relation_type, layer)
+        db.session.commit()
+        tree_changed()
+        logger.info(f'Reattached branch {root_id} ({len(ids)} people) under {new_parent_id}')
+        
+        return jsonify(dict(moved, success=True, root_id=root_id, people=len(ids)))
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error reattaching branch: {e}', exc_info=True)
+        return get_error_response('SERVER_ERROR', f'Branch reattach failed: {str(e)}', 500)
+
+
 @admin_bp.route('/import/relationships', methods=['POST'])
 def import_relationships():
     """Import relationships (admin only)"""
@@ -1251,8 +1593,8 @@ def import_relationships():
         if not isinstance(rels_data, list):
             return get_error_response('BAD_REQUEST', '"relationships" must be an array')
         
-        created_count = 0
         rejected = []
+        candidates = []  # rows that pass the checks needing no database
         
         for idx, rel_data in enumerate(rels_data):
             try:
@@ -1286,52 +1628,73 @@ def import_relationships():
                     rejected.append({'row': idx, 'reason': f'Invalid relation_type: {relation_type}'})
                     continue
                 
-                # Check if people exist
-                parent = Person.query.get(parent_id)
-                child = Person.query.get(child_id)
-                
-                if not parent:
+                candidates.append((idx, rel_data, parent_id, child_id, relation_type))
+            
+            except Exception as e:
+                rejected.append({'row': idx, 'reason': str(e)})
+        
+        # One IN query for the referenced people and one for their stored edges; the
+        # remaining checks run in row order against these sets, which also collect
+        # the rows accepted earlier in this request
+        referenced = {str(person_id) for c in candidates for person_id in (c[2], c[3])}
+        existing_people = load_existing_ids(referenced)
+        edges = load_edges(referenced)
+        pairs = {(parent, child) for parent, child, _ in edges}
+        new_rows = []
+        
+        for idx, rel_data, parent_id, child_id, relation_type in candidates:
+            try:
+                parent_key, child_key = str(parent_id), str(child_id)
+                if parent_key not in existing_people:
                     rejected.append({'row': idx, 'reason': f'Parent {parent_id} not found'})
                     continue
-                if not child:
+                if child_key not in existing_people:
                     rejected.append({'row': idx, 'reason': f'Child {child_id} not found'})
                     continue
                 
                 # Check for circular relationship (simple check: A->B and B->A)
-                existing_reverse = Relationship.query.filter_by(
-                    parent_id=child_id,
-                    child_id=parent_id
-                ).first()
-                
-                if existing_reverse:
+                if (child_key, parent_key) in pairs:
                     rejected.append({'row': idx, 'reason': 'Circular relationship detected'})
                     continue
                 
-                # Check if relationship already exists
-                existing = Relationship.query.filter_by(
-                    parent_id=parent_id,
-                    child_id=child_id,
-                    relation_type=relation_type
-                ).first()
-                
-                if existing:
-                    # Skip duplicate
+                # Skip duplicates
+                if (parent_key, child_key, relation_type) in edges:
                     continue
                 
-                # Create relationship
-                relationship = Relationship(
-                    parent_id=parent_id,
-                    child_id=child_id,
-                    relation_type=relation_type,
-                    visibility=rel_data.get('visibility', 'public')
-                )
-                db.session.add(relationship)
-                created_count += 1
-                
+                # In a non-base layer the relationship attaches a branch to the stack
+                new_rows.append({
+                    'id': uuid.uuid4(),
+                    'parent_id': parent_id,
+                    'child_id': child_id,
+                    'relation_type': relation_type,
+                    'visibility': rel_data.get('visibility', 'public'),
+                    'layer': validate_layer_name(rel_data.get('layer'))
+                })
+                edges.add((parent_key, child_key, relation_type))
+                pairs.add((parent_key, child_key))
+            
             except Exception as e:
                 rejected.append({'row': idx, 'reason': str(e)})
         
+        rejected.sort(key=lambda r: r['row'])
+        
+        # Multi-row inserts; a row inserted concurrently by another import is skipped
+        created_count = 0
+        for start in range(0, len(new_rows), RELATIONSHIP_INSERT_BATCH):
+            statement = pg_insert(Relationship).values(
+                new_rows[start:start + RELATIONSHIP_INSERT_BATCH]
+            ).on_conflict_do_nothing().returning(
+                Relationship.id, Relationship.layer, Relationship.parent_id, Relationship.child_id
+            )
+            created = db.session.execute(statement).all()
+            created_count += len(created)
+            record_changes(db.session, [
+                relationship_change('insert', rel_id, layer, parent_id, child_id)
+                for rel_id, layer, parent_id, child_id in created
+            ])
+        
         db.session.commit()
+        tree_changed()
         
         return jsonify({
             'created': created_count,
@@ -0,0 +1,151 @@
+"""
+Autocomplete suggestions with precomputed top-k completions.
+
+Every word-start suffix of every name, English and Amharic, is a key ("haile
+selassie" and "selassie" both complete to Haile Selassie). The keys are kept
+in one sorted array, so the keys starting with a prefix form a contiguous
+range found by binary search. Candidates are ranked by importance: descendants
+along preferred-parent lines (the branch size /api/search?within= uses), then
+name.
+
+For a prefix matching more than SCAN_LIMIT keys, the top-k people are
+precomputed: those prefixes are the nodes of the trie over the sorted keys
+with more than SCAN_LIMIT leaves, and each node's top-k is merged from its
+children. Smaller ranges are ranked on the fly. Either way a keystroke costs
+one dict lookup or one bisect plus a scan of at most SCAN_LIMIT keys. The index
+is rebuilt once per tree version, one per layer stack.
+"""
+import bisect
+import heapq
+import threading
+from array import array
+from graph import get_graph, MAX_CACHED_STACKS
+from layers import DEFAULT_STACK
+
+TOP_K = 10
+SCAN_LIMIT = 64
+
+_lock = threading.Lock()
+_cached = {}  # stack key -> SuggestIndex
+
+
+def normalize_prefix(text):
+    """Same normalization as Person.name_normalized (lowercase, single spaces)"""
+    return ' '.join(text.lower().split()) if text else ''
+
+
+def name_keys(text):
+    """The normalized name and each of its word-start suffixes"""
+    words = normalize_prefix(text).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+def branch_sizes(snapshot):
+    """Descendants of each person along preferred-parent lines"""
+    children = {}
+    for person_id in snapshot.people:
+        parent_id = snapshot.preferred_parent(person_id)
+        if parent_id is not None:
+            children.setdefault(parent_id, []).append(person_id)
+    
+    sizes = {}
+    for root in snapshot.people:
+        if snapshot.preferred_parent(root) is not None:
+            continue
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if expanded:
+                sizes[node] = sum(sizes[c] + 1 for c in children.get(node, ()))
+            else:
+                stack.append((node, True))
+                stack.extend((c, False) for c in children.get(node, ()))
+    # People on a preferred-parent cycle are not reached from a root
+    for person_id in snapshot.people:
+        sizes.setdefault(person_id, 0)
+    return sizes
+
+
+class SuggestIndex:
+    """Sorted completion keys plus top-k people for the prefixes with many keys"""
+    
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        sizes = branch_sizes(snapshot)
+        # People in rank order: the ordinal is the ranking, so smaller is better
+        self.people = sorted(
+            snapshot.people,
+            key=lambda p: (-sizes[p], normalize_prefix(snapshot.people[p]['name']), p)
+        )
+        self.descendants = [sizes[p] for p in self.people]
+        
+        entries = sorted({
+            (key, ordinal)
+            for ordinal, person_id in enumerate(self.people)
+            for name in (snapshot.people[person_id]['name'], snapshot.people[person_id]['name_amharic'])
+            for key in name_keys(name)
+        })
+        self.keys = [key for key, _ in entries]
+        self.owners = array('l', (ordinal for _, ordinal in entries))
+        self.top = {}  # prefix -> top-k ordinals, for prefixes with more than SCAN_LIMIT keys
+        if len(self.keys) > SCAN_LIMIT:
+            self.precompute('', 0, len(self.keys))
+    
+    def scan(self, lo, hi):
+        """Top-k distinct people owning keys[lo:hi]"""
+        return heapq.nsmallest(TOP_K, set(self.owners[lo:hi]))
+    
+    def precompute(self, prefix, lo, hi):
+        """Store top-k for prefix (whose keys are keys[lo:hi]) and its large descendants"""
+        depth = len(prefix)
+        candidates = set()
+        i = lo
+        # A key equal to the prefix has no next character; it sorts first
+        while i < hi and len(self.keys[i]) == depth:
+            candidates.add(self.owners[i])
+            i += 1
+        while i < hi:
+            child = self.keys[i][:depth + 1]
+            j = bisect.bisect_left(self.keys, child + '\U0010ffff', i, hi)
+            if j - i > SCAN_LIMIT:
+                candidates.update(self.precompute(child, i, j))
+            else:
+                candidates.update(self.scan(i, j))
+            i = j
+        top = heapq.nsmallest(TOP_K, candidates)
+        self.top[prefix] = top
+        return top
+    
+    def suggest(self, prefix, limit=TOP_K):
+        """Person dicts (plus descendants) completing prefix, most important first"""
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        top = self.top.get(prefix)
+        if top is None:
+            lo = bisect.bisect_left(self.keys, prefix)
+            hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo)
+            top = self.scan(lo, hi)
+        return [
+            dict(self.snapshot.person_dict(self.people[o]), descendants=self.descendants[o])
+            for o in top[:limit]
+        ]
+
+
+def get_suggest_index(layers=DEFAULT_STACK):
+    """The stack's suggestion index, rebuilt when the snapshot's tree version changes"""
+    snapshot = get_graph(layers)
+    key = snapshot.layers
+    index = _cached.get(key)
+    if index and index.version == snapshot.version:
+        return index
+    
+    with _lock:
+        index = _cached.get(key)
+        if not index or index.version != snapshot.version:
+            index = SuggestIndex(snapshot)
+            if len(_cached) >= MAX_CACHED_STACKS:
+                _cached.clear()
+            _cached[key] = index
+    return index
@@ -0,0 +1,125 @@
+"""
+Shared test helpers.
+
+Most tests cover the pure graph and text logic and need no database: they run
+on in-memory snapshots shaped like graph.GraphSnapshot. Tests of the admin
+writes use the `client`/`database` fixtures, which need a PostgreSQL database
+in TEST_DATABASE_URL (every table in it is dropped and recreated per test);
+without it they are skipped.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    # Before config.py is first imported
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+
+
+class FakeSnapshot:
+    """people/parents/children/person_dict like graph.GraphSnapshot, built from edge tuples"""
+    
+    def __init__(self, edges, people=(), version=1):
+        self.people = {}
+        self.parents = {}
+        self.children = {}
+        self.version = version
+        self.layers = ('base',)
+        for person_id in people:
+            self.add_person(person_id)
+        for parent_id, child_id, *relation_type in edges:
+            self.add_person(parent_id)
+            self.add_person(child_id)
+            self.parents.setdefault(child_id, []).append((parent_id, relation_type[0] if relation_type else 'parent'))
+            self.children.setdefault(parent_id, []).append(child_id)
+    
+    def add_person(self, person_id, name=None, name_amharic=None):
+        if person_id not in self.people:
+            self.people[person_id] = {'id': person_id, 'name': name or person_id, 'name_amharic': name_amharic}
+    
+    def person_dict(self, person_id):
+        person = self.people.get(str(person_id))
+        if not person:
+            return None
+        return {'id': person['id'], 'name': person['name'], 'name_amharic': person['name_amharic']}
+    
+    def preferred_parent(self, person_id):
+        rels = self.parents.get(str(person_id), [])
+        for wanted in ('father', 'mother'):
+            for parent_id, relation_type in rels:
+                if relation_type == wanted:
+                    return parent_id
+        return rels[0][0] if rels else None
+
+
+@pytest.fixture
+def make_snapshot():
+    return FakeSnapshot
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from app import create_app
+    return create_app(enable_migrations=False)
+
+
+@pytest.fixture
+def database(app):
+    """An empty schema, inside an app context"""
+    from app import db
+    import graph
+    from maintenance import wait_idle
+    wait_idle(30)
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        graph._snapshots.clear()
+        yield db
+        db.session.remove()
+    wait_idle(30)
+
+
+@pytest.fixture
+def client(app, database):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    from config import Config
+    return {'X-ADMIN-TOKEN': Config.ADMIN_TOKEN}
+
+
+@pytest.fixture
+def add_person(database):
+    """add_person(name, **columns) -> committed Person"""
+    from models import Person
+    from routes import normalize_name
+    
+    def add(name, **columns):
+        person = Person(name_original=name, name_normalized=normalize_name(name), **columns)
+        database.session.add(person)
+        database.session.commit()
+        return person
+    return add
+
+
+@pytest.fixture
+def add_link(database):
+    """add_link(parent, child, relation_type='parent', **columns) -> committed Relationship"""
+    from models import Relationship
+    
+    def add(parent, child, relation_type='parent', **columns):
+        rel = Relationship(parent_id=parent.id, child_id=child.id, relation_type=relation_type, **columns)
+        database.session.add(rel)
+        database.session.commit()
+        return rel
+    return add
+
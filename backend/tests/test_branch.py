@@ -0,0 +1,80 @@
+from models import ChangeLog, Person, Relationship
+
+
+def post(client, headers, action, body, dry_run=False):
+    url = f'/admin/branch/{action}' + ('?dry_run=true' if dry_run else '')
+    return client.post(url, json=body, headers=headers)
+
+
+def new_changes(before):
+    return [(c.entity, c.op, c.entity_id) for c in ChangeLog.query.order_by(ChangeLog.id).all()[before:]]
+
+
+def test_delete_removes_every_descendant(client, admin_headers, add_person, add_link, database):
+    grandpa, root, outsider = add_person('Grandpa'), add_person('Root'), add_person('Outsider')
+    kid, grandkid = add_person('Kid'), add_person('Grandkid')
+    # The grandkid has a parent outside the branch and is still deleted with it
+    links = [
+        add_link(grandpa, root, 'father'), add_link(root, kid, 'father'),
+        add_link(kid, grandkid, 'father'), add_link(outsider, grandkid, 'mother', layer='alt'),
+    ]
+    link_ids = [rel.id for rel in links]
+    member_ids = [root.id, kid.id, grandkid.id]
+    
+    body = {'root_id': str(root.id)}
+    preview = post(client, admin_headers, 'delete', body, dry_run=True).get_json()
+    assert (preview['people'], preview['relationships']) == (3, 4)
+    assert [m['name'] for m in preview['members']] == ['Grandkid', 'Kid', 'Root']
+    assert Person.query.count() == 5
+    
+    before = ChangeLog.query.count()
+    result = post(client, admin_headers, 'delete', body).get_json()
+    assert (result['deleted_people'], result['deleted_relationships']) == (3, 4)
+    assert {p.name_original for p in Person.query.all()} == {'Grandpa', 'Outsider'}
+    assert Relationship.query.count() == 0
+    
+    changes = new_changes(before)
+    assert sorted(c for c in changes if c[0] == 'relationship') == sorted(
+        ('relationship', 'delete', rel_id) for rel_id in link_ids
+    )
+    assert sorted(c for c in changes if c[0] == 'person') == sorted(
+        ('person', 'delete', person_id) for person_id in member_ids
+    )
+
+
+def test_reattach_rejects_a_parent_inside_the_branch(client, admin_headers, add_person, add_link):
+    root, kid, grandkid = add_person('Root'), add_person('Kid'), add_person('Grandkid')
+    add_link(root, kid, 'father')
+    add_link(kid, grandkid, 'father')
+    
+    for inside in (root, grandkid):
+        response = post(client, admin_headers, 'reattach', {'root_id': str(root.id), 'new_parent_id': str(inside.id)})
+        assert response.status_code == 400
+        assert 'cycle' in response.get_json()['error']['message']
+    assert Relationship.query.count() == 2
+
+
+def test_reattach_moves_the_branch_in_one_layer(client, admin_headers, add_person, add_link, database):
+    old, new, root, kid = add_person('Old'), add_person('New'), add_person('Root'), add_person('Kid')
+    removed = add_link(old, root, 'father')
+    kept = add_link(old, root, 'parent', layer='alt')
+    add_link(root, kid, 'father')
+    body = {'root_id': str(root.id), 'new_parent_id': str(new.id), 'relation_type': 'father'}
+    
+    preview = post(client, admin_headers, 'reattach', body, dry_run=True).get_json()
+    assert preview['people'] == 2
+    assert [link['id'] for link in preview['removed_links']] == [str(removed.id)]
+    assert Relationship.query.filter_by(child_id=root.id).count() == 2
+    
+    before = ChangeLog.query.count()
+    result = post(client, admin_headers, 'reattach', body).get_json()
+    assert result['people'] == 2
+    assert [link['id'] for link in result['removed_links']] == [str(removed.id)]
+    
+    base_parents = Relationship.query.filter_by(child_id=root.id, layer='base').all()
+    assert [(r.parent_id, r.relation_type) for r in base_parents] == [(new.id, 'father')]
+    assert database.session.get(Relationship, kept.id) is not None
+    assert new_changes(before) == [
+        ('relationship', 'delete', removed.id),
+        ('relationship', 'insert', base_parents[0].id),
+    ]
@@ -0,0 +1,18 @@
+import charts
+from config import Config
+
+
+def test_render_returns_bytes_even_if_pruned(tmp_path, monkeypatch):
+    # Another request's prune may delete the file between the write and a read
+    monkeypatch.setitem(charts.RENDERERS, 'svg', lambda layout: b'<svg/>')
+    monkeypatch.setattr(Config, 'CHART_CACHE_MAX_FILES', 0)
+    path = str(tmp_path / 'chart.svg')
+    assert charts.render_to_cache(path, {}, 'svg') == b'<svg/>'
+    assert charts.read_cached(path) is None
+
+
+def test_cached_chart_is_not_rendered_again(tmp_path, monkeypatch):
+    path = tmp_path / 'chart.svg'
+    path.write_bytes(b'cached')
+    monkeypatch.setitem(charts.RENDERERS, 'svg', lambda layout: b'rendered')
+    assert charts.render_to_cache(str(path), {}, 'svg') == b'cached'
@@ -0,0 +1,69 @@
+from models import Person, Relationship
+
+
+def import_people(client, headers, rows):
+    return client.post('/admin/import/people', json={'people': rows}, headers=headers).get_json()
+
+
+def import_combined(client, headers, rows):
+    return client.post('/admin/import/combined', json={'rows': rows}, headers=headers).get_json()
+
+
+def test_reimport_skips_unchanged_rows(client, admin_headers):
+    rows = [{'english_name': 'Dad'}, {'english_name': 'Mom'},
+            {'english_name': 'Kid', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+            {'english_name': 'Kid', 'english_parent_name': 'Mom', 'relation_type': 'mother'}]
+    import_combined(client, admin_headers, rows)
+    again = import_combined(client, admin_headers, rows)
+    assert again['people']['unchanged'] == 4
+    assert again['relationships']['created'] == 0
+
+
+def test_deleted_link_is_recreated(client, admin_headers, database):
+    rows = [{'english_name': 'Dad'}, {'english_name': 'Mom'},
+            {'english_name': 'Kid', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+            {'english_name': 'Kid', 'english_parent_name': 'Mom', 'relation_type': 'mother'}]
+    import_combined(client, admin_headers, rows)
+    mom = Person.query.filter_by(name_original='Mom').one()
+    client.post('/admin/delete/person', json={'person_id': str(mom.id)}, headers=admin_headers)
+    result = import_combined(client, admin_headers, rows)
+    assert result['relationships']['created'] == 1
+    assert Relationship.query.count() == 2
+
+
+def test_merge_by_name_invalidates_people_row_hash(client, admin_headers, database):
+    import_people(client, admin_headers, [{'english_name': 'Tekle', 'amharic_name': 'ተክሌ'}])
+    # A row with a parent keeps its hash on the link, so the person's must be cleared
+    import_combined(client, admin_headers, [
+        {'english_name': 'Dad'},
+        {'english_name': 'Tekle', 'amharic_name': 'ተክለ', 'english_parent_name': 'Dad'}
+    ])
+    tekle = Person.query.filter_by(name_original='Tekle').one()
+    assert tekle.content_hash is None
+    result = import_people(client, admin_headers, [{'english_name': 'Tekle', 'amharic_name': 'ተክሌ'}])
+    assert result['unchanged'] == 0
+
+
+def test_people_import_invalidates_combined_row_hash(client, admin_headers, database):
+    rows = [{'english_name': 'Dad'},
+            {'english_name': 'Kid', 'amharic_name': 'ልጅ', 'english_parent_name': 'Dad', 'relation_type': 'father'}]
+    import_combined(client, admin_headers, rows)
+    kid = Person.query.filter_by(name_original='Kid').one()
+    import_people(client, admin_headers, [{'id': str(kid.id), 'english_name': 'Kid', 'amharic_name': 'ሌላ'}])
+    result = import_combined(client, admin_headers, rows)
+    assert result['people']['unchanged'] == 1  # only Dad's row
+    database.session.expire_all()
+    assert database.session.get(Person, kid.id).name_amharic == 'ልጅ'
+
+
+def test_orm_edit_clears_hashes(client, admin_headers, database):
+    rows = [{'english_name': 'Dad'}, {'english_name': 'Kid', 'english_parent_name': 'Dad', 'relation_type': 'father'}]
+    import_combined(client, admin_headers, rows)
+    dad = Person.query.filter_by(name_original='Dad').one()
+    kid = Person.query.filter_by(name_original='Kid').one()
+    assert dad.content_hash and Relationship.query.one().content_hash
+    dad.birth_year = 1900
+    kid.gender = 'male'
+    database.session.commit()
+    assert database.session.get(Person, dad.id).content_hash is None
+    assert Relationship.query.one().content_hash is None
@@ -0,0 +1,39 @@
+import pytest
+from fuzzy import NameIndex, max_distance
+
+
+@pytest.fixture
+def index(make_snapshot):
+    snapshot = make_snapshot([])
+    for person_id, name in [
+        ('1', 'Ras Asrate Kassa'), ('2', 'Haile Selassie'), ('3', 'Tekle Giyorgis'),
+        ('4', 'Haile Melekot'), ('5', 'Zewditu')
+    ]:
+        snapshot.add_person(person_id, name)
+    return NameIndex(snapshot)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Asrat', '1'),
+    ('Hayle Selassie', '2'),
+    ('Takla Giyorgis', '3'),
+])
+def test_romanized_spellings(index, query, expected):
+    assert index.search(query)[0][0] == expected
+
+
+def test_spelling_variant_plus_typo(index):
+    # Hayle -> Haile and a transposed "el"
+    assert [person_id for person_id, _ in index.search('Hayel Selassie')] == ['2']
+
+
+def test_ranked_by_distance(index):
+    results = index.search('Haile')
+    assert {person_id for person_id, _ in results} == {'2', '4'}
+    assert all(distance == 0 for _, distance in results)
+
+
+def test_short_words_need_exact_match():
+    assert max_distance('ab') == 0
+    assert max_distance('ras') == 1
+    assert max_distance('tekle') == 2
@@ -0,0 +1,110 @@
+import uuid
+from gedcom import GEDCOM_NAMESPACE, individual_xref, iter_records
+from models import Person, Relationship
+
+EXTERNAL = """0 HEAD
+0 @I1@ INDI
+1 NAME Tewodros /Kassa/
+1 SEX M
+1 BIRT
+2 DATE ABT 1818
+0 @I2@ INDI
+1 NAME Alemayehu
+1 NAME ዓለማየሁ
+1 SEX M
+0 @F1@ FAM
+1 HUSB @I1@
+1 CHIL @I2@
+0 TRLR
+"""
+
+
+def export(client, headers):
+    response = client.get('/admin/export/gedcom', headers=headers)
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def import_gedcom(client, headers, text, source):
+    response = client.post(f'/admin/import/gedcom?source={source}', data=text.encode(), headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def families(text):
+    """{child xref: (HUSB xref, WIFE xref)} from the FAM records"""
+    slots = {}
+    for record in iter_records(text.splitlines()):
+        if record.tag == 'FAM':
+            husb = (record.values('HUSB') or [None])[0]
+            wife = (record.values('WIFE') or [None])[0]
+            for child in record.values('CHIL'):
+                slots[child] = (husb, wife)
+    return slots
+
+
+def test_parent_links_fill_husb_and_wife_slots(client, admin_headers, add_person, add_link):
+    man, woman, unknown = add_person('Man', gender='male'), add_person('Woman', gender='female'), add_person('Unknown')
+    by_gender, mother_only, with_father = add_person('Kid A'), add_person('Kid B'), add_person('Kid C')
+    add_link(man, by_gender, 'parent')
+    add_link(woman, by_gender, 'parent')
+    # No father: an ungendered 'parent' takes the empty HUSB slot
+    add_link(woman, mother_only, 'mother')
+    add_link(unknown, mother_only, 'parent')
+    # With a father: it takes WIFE
+    add_link(man, with_father, 'father')
+    add_link(unknown, with_father, 'parent')
+    
+    slots = families(export(client, admin_headers))
+    
+    def xref(person):
+        return individual_xref(str(person.id))
+    
+    assert slots[xref(by_gender)] == (xref(man), xref(woman))
+    assert slots[xref(mother_only)] == (xref(unknown), xref(woman))
+    assert slots[xref(with_father)] == (xref(man), xref(unknown))
+
+
+def test_export_import_round_trip_keeps_uuids(client, admin_headers, add_person, add_link, database):
+    dad = add_person('Dad', name_amharic='አባ', gender='male', birth_year=1900, death_year=1970)
+    mom = add_person('Mom', gender='female')
+    kid = add_person('Kid')
+    add_link(dad, kid, 'father')
+    add_link(mom, kid, 'parent')
+    text = export(client, admin_headers)
+    people = {p.id: (p.name_original, p.name_amharic, p.birth_year, p.death_year, p.gender) for p in Person.query.all()}
+    
+    # Into an empty tree the REFN UUIDs are reused and 'parent' comes back by slot
+    Relationship.query.delete()
+    Person.query.delete()
+    database.session.commit()
+    result = import_gedcom(client, admin_headers, text, 'backup')
+    assert result['people'] == {'created': 3, 'updated': 0}
+    assert result['relationships']['created'] == 2
+    database.session.expire_all()
+    assert {p.id: (p.name_original, p.name_amharic, p.birth_year, p.death_year, p.gender)
+            for p in Person.query.all()} == people
+    assert {(r.parent_id, r.child_id, r.relation_type) for r in Relationship.query.all()} == {
+        (dad.id, kid.id, 'father'), (mom.id, kid.id, 'mother')
+    }
+    
+    # Into the same tree it updates those people and adds no links
+    again = import_gedcom(client, admin_headers, text, 'other-name')
+    assert again['people'] == {'created': 0, 'updated': 3}
+    assert again['relationships'] == {'created': 0, 'skipped': 2}
+
+
+def test_external_xrefs_map_to_stable_uuids(client, admin_headers, database):
+    result = import_gedcom(client, admin_headers, EXTERNAL, 'wiki')
+    assert result['people'] == {'created': 2, 'updated': 0}
+    tewodros = database.session.get(Person, uuid.uuid5(GEDCOM_NAMESPACE, 'wiki:@I1@'))
+    alemayehu = database.session.get(Person, uuid.uuid5(GEDCOM_NAMESPACE, 'wiki:@I2@'))
+    assert (tewodros.name_original, tewodros.birth_year, tewodros.gender) == ('Tewodros Kassa', 1818, 'male')
+    assert (alemayehu.name_original, alemayehu.name_amharic) == ('Alemayehu', 'ዓለማየሁ')
+    rel = Relationship.query.one()
+    assert (rel.parent_id, rel.child_id, rel.relation_type) == (tewodros.id, alemayehu.id, 'father')
+    
+    # The same source updates its people; another source is a different tree
+    assert import_gedcom(client, admin_headers, EXTERNAL, 'wiki')['people'] == {'created': 0, 'updated': 2}
+    assert import_gedcom(client, admin_headers, EXTERNAL, 'archive')['people'] == {'created': 2, 'updated': 0}
+    assert Person.query.count() == 4
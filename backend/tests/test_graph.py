@@ -0,0 +1,75 @@
+import graph
+from changelog import current_version, changes_since
+from graph import apply_changes, build_graph, refresh_graph
+from models import Relationship
+
+STACK = ('base', 'alt')
+
+
+def graph_state(snapshot):
+    return snapshot.people, snapshot.parents, snapshot.children
+
+
+def assert_delta_matches_rebuild(snapshot):
+    version = current_version()
+    changes, has_more = changes_since(snapshot.version, until=version)
+    assert changes and not has_more
+    updated = apply_changes(snapshot, changes, version)
+    assert graph_state(updated) == graph_state(build_graph(version, snapshot.layers))
+
+
+def family(add_person, add_link):
+    dad, mom = add_person('Dad'), add_person('Mom', layer='alt')
+    kid, grandkid = add_person('Kid'), add_person('Grandkid')
+    add_link(dad, kid, 'father')
+    add_link(mom, kid, 'mother', layer='alt')
+    add_link(kid, grandkid, 'father')
+    return dad, mom, kid, grandkid
+
+
+def test_person_entering_and_leaving_the_stack(add_person, add_link, database):
+    dad, mom, kid, grandkid = family(add_person, add_link)
+    outsider = add_person('Outsider', layer='other')
+    add_link(outsider, grandkid, 'mother')
+    
+    for layers in (('base',), STACK):
+        snapshot = build_graph(current_version(), layers)
+        kid.layer = 'other'
+        outsider.layer = 'alt'
+        database.session.commit()
+        assert_delta_matches_rebuild(snapshot)
+        
+        snapshot = build_graph(current_version(), layers)
+        kid.layer = 'base'
+        outsider.layer = 'other'
+        database.session.commit()
+        assert_delta_matches_rebuild(snapshot)
+
+
+def test_relationship_changes(add_person, add_link, database):
+    dad, mom, kid, grandkid = family(add_person, add_link)
+    snapshot = build_graph(current_version(), STACK)
+    
+    database.session.delete(Relationship.query.filter_by(parent_id=dad.id).one())
+    database.session.commit()
+    add_link(mom, grandkid, 'mother', layer='alt')
+    dad.name_original = 'Father'
+    database.session.commit()
+    assert_delta_matches_rebuild(snapshot)
+
+
+def test_large_delta_falls_back_to_a_rebuild(add_person, add_link, database, monkeypatch):
+    dad, mom, kid, grandkid = family(add_person, add_link)
+    snapshot = build_graph(current_version(), STACK)
+    add_link(dad, grandkid, 'parent')
+    add_person('Newcomer')
+    
+    monkeypatch.setattr(graph, 'MAX_DELTA_CHANGES', 1)
+    applied = []
+    monkeypatch.setattr(graph, 'apply_changes', lambda *args: applied.append(args))
+    refreshed = refresh_graph(snapshot, STACK)
+    
+    assert applied == []
+    assert refreshed.version == current_version()
+    assert graph_state(refreshed) == graph_state(build_graph(current_version(), STACK))
+    assert 'Newcomer' in {p['name'] for p in refreshed.people.values()}
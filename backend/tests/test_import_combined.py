@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from models import ChangeLog, Person, Relationship
+
+
+def import_combined(client, headers, rows, dry_run=False):
+    url = '/admin/import/combined' + ('?dry_run=true' if dry_run else '')
+    response = client.post(url, json={'rows': rows}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_duplicate_names_resolve_to_the_most_recent_person(client, admin_headers, add_person, database):
+    older = add_person('Kassa', created_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+    newer = add_person('Kassa', created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    rows = [
+        {'english_name': 'Kassa', 'amharic_name': 'ካሳ'},
+        {'english_name': 'Asrate', 'english_parent_name': 'Kassa', 'relation_type': 'father'},
+    ]
+    
+    plan = import_combined(client, admin_headers, rows, dry_run=True)
+    assert [u['id'] for u in plan['people']['update']] == [str(newer.id)]
+    [ambiguous] = plan['people']['ambiguous']
+    assert ambiguous['matched'] == str(newer.id)
+    
+    import_combined(client, admin_headers, rows)
+    database.session.expire_all()
+    assert database.session.get(Person, newer.id).name_amharic == 'ካሳ'
+    assert database.session.get(Person, older.id).name_amharic is None
+    assert Relationship.query.one().parent_id == newer.id
+
+
+def test_dry_run_matches_real_run(client, admin_headers, add_person, add_link):
+    dad = add_person('Dad')
+    add_person('Kid')
+    rows = [
+        {'english_name': 'Dad', 'amharic_name': 'አባ'},
+        {'english_name': 'Kid', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+        {'english_name': 'New Kid', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+        {'english_name': 'Orphan', 'english_parent_name': 'Nobody', 'relation_type': 'father'},
+        {'english_name': 'Dad', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+    ]
+    plan = import_combined(client, admin_headers, rows, dry_run=True)
+    result = import_combined(client, admin_headers, rows)
+    
+    assert len(plan['people']['create']) == result['people']['created']
+    assert len(plan['relationships']['create']) == result['relationships']['created'] == 2
+    assert plan['relationships']['rejected'] == result['relationships']['rejected']
+    created = {(str(r.parent_id), r.child.name_original) for r in Relationship.query.all()}
+    assert {(c['parent']['id'], c['child']['name']) for c in plan['relationships']['create']} == created
+    assert all(parent == str(dad.id) for parent, _ in created)
+
+
+def test_bad_rows_are_rejected_one_by_one(client, admin_headers):
+    rows = [
+        {'english_name': 'Dad'},
+        {'english_name': 'Kid', 'english_parent_name': 'Dad', 'birth_year': 'unknown'},
+        {'english_name': 7},
+        {'english_name': 'Kid', 'english_parent_name': 'Dad', 'relation_type': 'uncle'},
+        ['not', 'an', 'object'],
+        {'english_name': 'Kid', 'english_parent_name': 'Dad', 'birth_year': 1950},
+    ]
+    plan = import_combined(client, admin_headers, rows, dry_run=True)
+    result = import_combined(client, admin_headers, rows)
+    expected = [
+        {'row': 1, 'reason': 'birth_year must be an integer'},
+        {'row': 2, 'reason': 'english_name must be a string'},
+        {'row': 3, 'reason': 'relation_type must be father, mother or parent'},
+        {'row': 4, 'reason': 'Row must be an object'},
+    ]
+    assert result['people']['rejected'] == expected
+    assert plan['people']['rejected'] == expected
+    assert result['people']['created'] == 2
+    assert result['relationships']['created'] == 1
+    
+    again = import_combined(client, admin_headers, rows)
+    assert again['people']['unchanged'] == 2
+    assert again['people']['rejected'] == expected
+
+
+def test_dry_run_writes_nothing_and_counts_like_the_real_run(client, admin_headers, add_person, add_link, database):
+    dad = add_person('Dad', name_amharic='አባ')
+    kid = add_person('Kid')
+    add_link(dad, kid, 'father')
+    rows = [
+        {'english_name': 'Dad', 'amharic_name': 'አባ'},
+        {'english_name': 'Kid', 'amharic_name': 'ልጅ', 'english_parent_name': 'Dad', 'relation_type': 'father'},
+        {'english_name': 'Mom', 'amharic_name': 'እማ'},
+        {'english_name': 'Kid', 'english_parent_name': 'Mom', 'relation_type': 'mother'},
+        {'english_name': 'Baby', 'english_parent_name': 'Kid'},
+    ]
+    before = (Person.query.count(), Relationship.query.count(), ChangeLog.query.count())
+    plan = import_combined(client, admin_headers, rows, dry_run=True)
+    assert (Person.query.count(), Relationship.query.count(), ChangeLog.query.count()) == before
+    
+    result = import_combined(client, admin_headers, rows)
+    assert len(plan['people']['create']) == result['people']['created'] == 2
+    assert [u['id'] for u in plan['people']['update']] == [str(kid.id)]
+    # The real run counts every row that did not create its person as updated
+    assert len(plan['people']['update']) + plan['people']['unchanged'] == (
+        result['people']['updated'] + result['people']['unchanged']
+    )
+    assert len(plan['relationships']['create']) == result['relationships']['created'] == 2
+    assert {(c['parent']['name'], c['child']['name']) for c in plan['relationships']['create']} == {
+        (r.parent.name_original, r.child.name_original) for r in Relationship.query.all()
+    } - {('Dad', 'Kid')}
+    
+    # Once applied, the same file plans no writes
+    again = import_combined(client, admin_headers, rows, dry_run=True)
+    assert again['people']['create'] == again['people']['update'] == []
+    assert again['relationships']['create'] == []
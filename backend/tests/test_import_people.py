@@ -0,0 +1,42 @@
+from models import Person
+
+
+def import_people(client, headers, rows):
+    response = client.post('/admin/import/people', json={'people': rows}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_bad_rows_are_rejected_one_by_one(client, admin_headers):
+    result = import_people(client, admin_headers, [
+        {'english_name': 'Good One', 'birth_year': '1900'},
+        {'english_name': 5},
+        {'english_name': 'Null Amharic', 'amharic_name': None},
+        {'english_name': 'Bad Year', 'birth_year': 'soon'},
+        'not an object',
+        {'english_name': 'Bad Id', 'id': 'nope'},
+        {'english_name': 'Big Year', 'death_year': 10**12},
+        {'english_name': 'Bad Layer', 'layer': 'no spaces allowed'},
+    ])
+    assert result['created'] == 2
+    assert [r['row'] for r in result['rejected']] == [1, 3, 4, 5, 6, 7]
+    assert result['rejected'][0]['reason'] == 'english_name must be a string'
+    assert result['rejected'][1]['reason'] == 'birth_year must be an integer'
+    assert result['rejected'][3]['reason'] == 'Invalid UUID format'
+    assert Person.query.filter_by(name_original='Good One').one().birth_year == 1900
+
+
+def test_reimport_is_unchanged(client, admin_headers):
+    rows = [{'english_name': 'Asrat', 'birth_year': 1922, 'gender': 'male'}, {'english_name': 'Zewditu'}]
+    import_people(client, admin_headers, rows)
+    again = import_people(client, admin_headers, rows)
+    assert (again['created'], again['updated'], again['unchanged']) == (0, 0, 2)
+
+
+def test_keyed_rows_update_only_given_columns(client, admin_headers, add_person, database):
+    person = add_person('Menelik', birth_year=1844, gender='male')
+    result = import_people(client, admin_headers, [{'id': str(person.id), 'english_name': 'Menelik II', 'death_year': 1913}])
+    assert result['updated'] == 1
+    database.session.expire_all()
+    person = database.session.get(Person, person.id)
+    assert (person.name_original, person.birth_year, person.death_year, person.gender) == ('Menelik II', 1844, 1913, 'male')
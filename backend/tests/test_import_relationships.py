@@ -0,0 +1,91 @@
+import uuid
+import import_plan
+import routes
+from models import ChangeLog, Relationship
+
+
+def import_relationships(client, headers, rows):
+    response = client.post('/admin/import/relationships', json={'relationships': rows}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def link(parent, child, relation_type='father', **extra):
+    return {'parent_id': str(parent.id), 'child_id': str(child.id), 'relation_type': relation_type, **extra}
+
+
+def test_rejection_reasons_in_row_order(client, admin_headers, add_person, add_link):
+    dad, kid, other = add_person('Dad'), add_person('Kid'), add_person('Other')
+    add_link(kid, other, 'father')
+    missing = str(uuid.uuid4())
+    rows = [
+        {'child_id': str(kid.id), 'relation_type': 'father'},
+        {'parent_id': str(dad.id), 'child_id': str(kid.id)},
+        {'parent_id': 'not-a-uuid', 'child_id': str(kid.id), 'relation_type': 'father'},
+        link(dad, dad),
+        link(dad, kid, 'uncle'),
+        {'parent_id': missing, 'child_id': str(kid.id), 'relation_type': 'father'},
+        {'parent_id': str(dad.id), 'child_id': missing, 'relation_type': 'father'},
+        link(other, kid),
+        link(dad, kid),
+    ]
+    result = import_relationships(client, admin_headers, rows)
+    
+    assert result['created'] == 1
+    assert result['total_processed'] == len(rows)
+    assert result['rejected'] == [
+        {'row': 0, 'reason': 'Missing parent_id or child_id'},
+        {'row': 1, 'reason': 'Missing relation_type'},
+        {'row': 2, 'reason': 'Invalid UUID format'},
+        {'row': 3, 'reason': 'Parent and child cannot be the same'},
+        {'row': 4, 'reason': 'Invalid relation_type: uncle'},
+        {'row': 5, 'reason': f'Parent {missing} not found'},
+        {'row': 6, 'reason': f'Child {missing} not found'},
+        {'row': 7, 'reason': 'Circular relationship detected'},
+    ]
+
+
+def test_rows_accepted_earlier_in_the_file_count(client, admin_headers, add_person):
+    dad, kid = add_person('Dad'), add_person('Kid')
+    rows = [link(dad, kid), link(dad, kid), link(kid, dad)]
+    result = import_relationships(client, admin_headers, rows)
+    
+    # The repeat is skipped silently; the reverse edge is caught against the first row
+    assert result['created'] == 1
+    assert result['rejected'] == [{'row': 2, 'reason': 'Circular relationship detected'}]
+    assert Relationship.query.count() == 1
+
+
+def test_batched_prefetch_and_insert(client, admin_headers, add_person, monkeypatch):
+    monkeypatch.setattr(import_plan, 'PLAN_BATCH_SIZE', 2)
+    monkeypatch.setattr(routes, 'RELATIONSHIP_INSERT_BATCH', 2)
+    root = add_person('Root')
+    kids = [add_person(f'Kid {i}') for i in range(5)]
+    result = import_relationships(client, admin_headers, [link(root, kid) for kid in kids] + [link(kids[0], root)])
+    
+    assert result['created'] == 5
+    assert result['rejected'] == [{'row': 5, 'reason': 'Circular relationship detected'}]
+    assert {r.child_id for r in Relationship.query.all()} == {kid.id for kid in kids}
+
+
+def test_existing_edge_is_skipped_by_on_conflict(client, admin_headers, add_person, add_link, monkeypatch):
+    dad, kid, sibling = add_person('Dad'), add_person('Kid'), add_person('Sibling')
+    existing = add_link(dad, kid, 'father')
+    # As if another import committed the edge after this one read the stored edges
+    monkeypatch.setattr(routes, 'load_edges', lambda ids: set())
+    result = import_relationships(client, admin_headers, [link(dad, kid), link(dad, sibling)])
+    
+    assert result['created'] == 1
+    assert result['rejected'] == []
+    assert {r.id for r in Relationship.query.filter_by(child_id=kid.id)} == {existing.id}
+
+
+def test_created_rows_are_recorded_in_the_change_log(client, admin_headers, add_person, database):
+    dad, kid = add_person('Dad'), add_person('Kid')
+    before = ChangeLog.query.count()
+    import_relationships(client, admin_headers, [link(dad, kid, layer='Alt'), link(dad, kid)])
+    
+    rel = Relationship.query.filter_by(relation_type='father').one()
+    [change] = ChangeLog.query.order_by(ChangeLog.id).all()[before:]
+    assert (change.entity, change.op, change.entity_id) == ('relationship', 'insert', rel.id)
+    assert (change.layer, change.parent_id, change.child_id) == ('alt', dad.id, kid.id)
@@ -0,0 +1,51 @@
+from collections import namedtuple
+from integrity import check_graph
+
+Row = namedtuple('Row', 'name_original birth_year gender layer')
+Rel = namedtuple('Rel', 'id parent_id child_id relation_type layer')
+
+
+def people(**genders):
+    return {person_id: Row(person_id, None, gender, 'base') for person_id, gender in genders.items()}
+
+
+def rels(*edges):
+    return [Rel(f'r{i}', parent, child, relation_type, 'base') for i, (parent, child, relation_type) in enumerate(edges)]
+
+
+def test_self_loop_is_a_cycle():
+    problems = check_graph(people(a='male', b=None), rels(('a', 'a', 'parent'), ('a', 'b', 'father')))
+    assert [[member['id'] for member in cycle] for cycle in problems['cycles']] == [['a']]
+
+
+def test_longer_cycle():
+    problems = check_graph(people(a=None, b=None, c=None), rels(('a', 'b', 'parent'), ('b', 'c', 'parent'), ('c', 'a', 'parent')))
+    assert len(problems['cycles']) == 1 and len(problems['cycles'][0]) == 3
+
+
+def test_parent_links_count_by_gender():
+    problems = check_graph(
+        people(f1='male', f2='male', m='female', c=None),
+        rels(('f1', 'c', 'father'), ('f2', 'c', 'parent'), ('m', 'c', 'mother'))
+    )
+    [problem] = problems['multiple_parents']
+    assert problem['relation_type'] == 'father'
+    assert [p['id'] for p in problem['parents']] == ['f1', 'f2']
+
+
+def test_more_than_two_parents():
+    problems = check_graph(
+        people(a=None, b=None, d=None, c=None),
+        rels(('a', 'c', 'parent'), ('b', 'c', 'parent'), ('d', 'c', 'parent'))
+    )
+    [problem] = problems['multiple_parents']
+    assert problem['relation_type'] == 'any'
+    assert len(problem['parents']) == 3
+
+
+def test_father_and_mother_are_fine():
+    problems = check_graph(
+        people(f='male', m='female', c=None),
+        rels(('f', 'c', 'parent'), ('m', 'c', 'mother'), ('f', 'c', 'father'))
+    )
+    assert not any(problems.values())
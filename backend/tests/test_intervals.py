@@ -0,0 +1,56 @@
+from intervals import refresh_labels
+from models import Person
+
+
+def test_overlay_links_do_not_change_base_answers(client, add_person, add_link, database):
+    root = add_person('Root')
+    other = add_person('Other')
+    kid = add_person('Kid')
+    add_link(root, kid, 'father')
+    # An overlay would make Other the kid's preferred parent if labels spanned layers
+    add_link(other, kid, 'father', layer='alt')
+    guest = add_person('Guest', layer='alt')
+    add_link(kid, guest, 'father', layer='alt')
+    refresh_labels()
+    database.session.commit()
+    
+    assert database.session.get(Person, guest.id).tree_pre is None
+    
+    def descends(person, ancestor, layers=None):
+        params = {'person_id': str(person.id), 'ancestor_id': str(ancestor.id)}
+        if layers:
+            params['layers'] = layers
+        response = client.get('/api/is-descendant', query_string=params)
+        assert response.status_code == 200
+        return response.get_json()['is_descendant']
+    
+    assert descends(kid, root)
+    assert not descends(kid, other)
+    assert client.get('/api/is-descendant', query_string={
+        'person_id': str(guest.id), 'ancestor_id': str(root.id)
+    }).status_code == 400
+    
+    # The overlay stack is honoured by walking its graph
+    assert descends(guest, kid, 'base,alt')
+    assert descends(guest, root, 'base,alt')
+
+
+def test_search_within_honours_the_layer_stack(client, add_person, add_link, database):
+    root = add_person('Root')
+    kid = add_person('Root Kid')
+    add_link(root, kid, 'father')
+    guest = add_person('Root Guest', layer='alt')
+    add_link(kid, guest, 'father', layer='alt')
+    refresh_labels()
+    database.session.commit()
+    
+    def names(layers=None):
+        params = {'q': 'root', 'within': str(kid.id)}
+        if layers:
+            params['layers'] = layers
+        response = client.get('/api/search', query_string=params)
+        assert response.status_code == 200
+        return sorted(p['name'] for p in response.get_json()['results'])
+    
+    assert names() == ['Root Kid']
+    assert names('base,alt') == ['Root Guest', 'Root Kid']
@@ -0,0 +1,53 @@
+import pytest
+from kinship import compute_kinship, KinshipCoefficients
+from kinship_matrix import compute_kinship_matrix
+
+
+def coefficient(snapshot, a, b):
+    return compute_kinship(snapshot, a, b)['coefficient_of_relationship']
+
+
+def test_common_ancestor_above_the_lca_is_counted(make_snapshot):
+    # A and C are children of B; P1 is a child of A and C; P2 is a child of A.
+    # A is the only LCA, but P1 <- C <- B -> A -> P2 also connects them: 1/4 + 1/16.
+    snapshot = make_snapshot([('B', 'A'), ('B', 'C'), ('A', 'P1'), ('C', 'P1'), ('A', 'P2')])
+    assert coefficient(snapshot, 'P1', 'P2') == pytest.approx(0.3125)
+    assert coefficient(snapshot, 'P2', 'P1') == pytest.approx(0.3125)
+
+
+def test_matrix_matches_pairwise(make_snapshot):
+    snapshot = make_snapshot([('B', 'A'), ('B', 'C'), ('A', 'P1'), ('C', 'P1'), ('A', 'P2')])
+    matrix = compute_kinship_matrix(snapshot, ['P1', 'P2'])
+    assert matrix['coefficient_of_relationship'] == [[1.0, 0.3125], [0.3125, 1.0]]
+
+
+@pytest.mark.parametrize('edges, a, b, expected', [
+    ([('F', 'S1'), ('M', 'S1'), ('F', 'S2'), ('M', 'S2')], 'S1', 'S2', 0.5),  # full siblings
+    ([('F', 'S1'), ('F', 'S2')], 'S1', 'S2', 0.25),  # siblings through one recorded parent
+    ([('F', 'C')], 'F', 'C', 0.5),  # parent and child
+    ([('G', 'P'), ('P', 'C')], 'G', 'C', 0.25),  # grandparent
+    ([('G', 'P1'), ('G', 'P2'), ('P1', 'C1'), ('P2', 'C2')], 'C1', 'C2', 0.0625),  # cousins, one grandparent
+    ([('X', 'A'), ('Y', 'B')], 'A', 'B', 0.0),  # unrelated
+])
+def test_simple_relations(make_snapshot, edges, a, b, expected):
+    assert coefficient(make_snapshot(edges), a, b) == pytest.approx(expected)
+
+
+def test_inbred_common_ancestor_counts_one_plus_f(make_snapshot):
+    # I is the child of half-siblings (F_I = 1/8); I's two children are siblings through I only
+    snapshot = make_snapshot([
+        ('G', 'H1'), ('G', 'H2'), ('H1', 'I'), ('H2', 'I'), ('I', 'S1'), ('I', 'S2')
+    ])
+    assert coefficient(snapshot, 'S1', 'S2') == pytest.approx(0.25 * (1 + 0.125))
+
+
+def test_cycles_do_not_hang(make_snapshot):
+    snapshot = make_snapshot([('A', 'B'), ('B', 'A'), ('A', 'C')])
+    value = KinshipCoefficients(snapshot, ['B', 'C']).relationship('B', 'C')
+    assert 0.0 <= value <= 1.0
+
+
+def test_deep_lineage_is_iterative(make_snapshot):
+    edges = [(f'g{k + 1}', f'g{k}') for k in range(3000)] + [('g3000', 'other')]
+    snapshot = make_snapshot(edges)
+    assert coefficient(snapshot, 'g0', 'other') == pytest.approx(2 * 0.5 ** 3001)
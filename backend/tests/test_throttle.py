@@ -0,0 +1,39 @@
+import pytest
+from flask import Flask
+from config import Config
+from throttle import MemoryBucketStore, client_key
+
+app = Flask(__name__)
+
+
+def key_for(forwarded, hops, monkeypatch):
+    monkeypatch.setattr(Config, 'TRUSTED_PROXY_HOPS', hops)
+    headers = {'X-Forwarded-For': forwarded} if forwarded else {}
+    with app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        return client_key()
+
+
+@pytest.mark.parametrize('forwarded, hops, expected', [
+    ('203.0.113.7', 1, '203.0.113.7'),
+    ('1.2.3.4, 203.0.113.7', 1, '203.0.113.7'),  # client-supplied entry ignored
+    ('1.2.3.4, 203.0.113.7, 10.1.1.1', 2, '203.0.113.7'),
+    ('203.0.113.7', 2, '10.0.0.1'),  # fewer entries than proxies: header not trusted
+    ('1.2.3.4', 0, '10.0.0.1'),
+    (None, 1, '10.0.0.1'),
+])
+def test_client_key_uses_trusted_hop(monkeypatch, forwarded, hops, expected):
+    assert key_for(forwarded, hops, monkeypatch) == expected
+
+
+def test_rotating_spoofed_entries_share_a_bucket(monkeypatch):
+    keys = {key_for(f'198.51.100.{i}, 203.0.113.7', 1, monkeypatch) for i in range(20)}
+    assert keys == {'203.0.113.7'}
+
+
+def test_bucket_store_is_bounded():
+    store = MemoryBucketStore(max_keys=100)
+    for i in range(1000):
+        store.take(f'client-{i}', rate=0.001, capacity=1, now=1000.0)
+    assert len(store._buckets) == 100
+    # the most recent clients keep their (empty) buckets
+    assert store.take('client-999', rate=0.001, capacity=1, now=1000.0)[0] is False
@@ -0,0 +1,183 @@
+"""
+Protection for expensive graph endpoints.
+
+- SingleFlight: concurrent identical requests share one computation.
+- Token-bucket rate limiting per client, backed by an in-process store or,
+  when REDIS_URL is set and the redis package is installed, by Redis so the
+  limit is shared between gunicorn workers.
+"""
+import threading
+import time
+import logging
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run fn once per key at a time; concurrent callers with the same key wait for that result"""
+    
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+    
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class MemoryBucketStore:
+    """Token buckets in an LRU dict guarded by a lock (per process), at most max_keys of them"""
+    
+    def __init__(self, max_keys=10000):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at), least recently used first
+        self._max_keys = max_keys
+    
+    def take(self, key, rate, capacity, now):
+        """Take one token; return (allowed, seconds until a token is available)"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (1 - tokens) / rate
+            self._buckets.move_to_end(key)
+            
+            # The least recently used buckets have refilled the most; dropping one
+            # only gives that client a full bucket again
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, updated atomically with a Lua script"""
+    
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+    
+    def __init__(self, client):
+        self._script = client.register_script(self.SCRIPT)
+    
+    def take(self, key, rate, capacity, now):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'], args=[rate, capacity, now])
+        if allowed:
+            return True, 0
+        return False, (1 - float(tokens)) / rate
+
+
+def create_bucket_store():
+    """Redis store if REDIS_URL is configured and reachable, else in-process"""
+    if Config.REDIS_URL:
+        try:
+            import redis
+            client = redis.Redis.from_url(Config.REDIS_URL, socket_timeout=0.5)
+            client.ping()
+            return RedisBucketStore(client)
+        except Exception as e:
+            logger.warning(f'Redis unavailable for rate limiting, using in-process store: {e}')
+    return MemoryBucketStore(Config.RATE_LIMIT_MAX_CLIENTS)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_bucket_store()
+    return _store
+
+
+def client_key():
+    """
+    Identify the client. Each trusted proxy appends the address it received the
+    request from to X-Forwarded-For, so the entry TRUSTED_PROXY_HOPS places from
+    the right is the client; anything left of it is sent by the client and can be
+    rotated at will.
+    """
+    hops = Config.TRUSTED_PROXY_HOPS
+    forwarded = [entry.strip() for entry in request.headers.get('X-Forwarded-For', '').split(',') if entry.strip()]
+    if hops > 0 and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.remote_addr or 'unknown'
+
+
+def rate_limited(per_minute=None, burst=None):
+    """Decorator: token-bucket limit per client for an endpoint"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not Config.RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+            
+            rate = (per_minute or Config.RATE_LIMIT_PER_MINUTE) / 60.0
+            capacity = burst or Config.RATE_LIMIT_BURST
+            key = f'{request.endpoint}:{client_key()}'
+            
+            try:
+                allowed, retry_after = get_bucket_store().take(key, rate, capacity, time.time())
+            except Exception as e:
+                # Never fail a request because the limiter's store is down
+                logger.error(f'Rate limiter error: {e}')
+                return view(*args, **kwargs)
+            
+            if not allowed:
+                response = jsonify({'error': {'code': 'RATE_LIMITED', 'message': 'Too many requests, please slow down'}})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+                return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
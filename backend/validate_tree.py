@@ -0,0 +1,28 @@
+"""
+Check the whole tree for cycles, children with several fathers or mothers,
+orphaned relationship rows and parent/child birth-year inversions.
+Exits with status 1 if any problem is found.
+"""
+import os
+import sys
+import json
+from dotenv import load_dotenv
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+from app import create_app, db
+from integrity import validate_tree
+
+app = create_app()
+
+with app.app_context():
+    report = validate_tree()
+    print(f"Checked {report['people']} people and {report['relationships']} relationships in {report['duration_ms']} ms")
+    for name, count in report['counts'].items():
+        print(f"  {name}: {count}")
+    if not report['ok']:
+        print(json.dumps(report['problems'], indent=2, ensure_ascii=False))
+        sys.exit(1)
@@ -0,0 +1,62 @@
+"""
+Lean serving entry point (Procfile: gunicorn wsgi:app).
+
+Skips Flask-Migrate, which is only needed for `flask db` commands, and warms the
+database pool and graph snapshot in a background thread so the first request
+after a cold start does not pay for them. Startup phase timings and the time to
+the first request are logged so cold starts can be measured.
+"""
+import time
+
+_process_start = time.perf_counter()
+
+import logging
+import threading
+from flask import request
+from app import create_app, db
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _elapsed_ms():
+    return round((time.perf_counter() - _process_start) * 1000, 1)
+
+
+def warm_up(app):
+    """Open a pooled DB connection and build the graph snapshot"""
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            db.session.execute(db.text('SELECT 1'))
+            db_ms = round((time.perf_counter() - started) * 1000, 1)
+            
+            from graph import get_graph
+            get_graph()
+            graph_ms = round((time.perf_counter() - started) * 1000 - db_ms, 1)
+            
+            logger.info(f'Warm-up complete: database={db_ms}ms graph={graph_ms}ms (process uptime {_elapsed_ms()}ms)')
+        except Exception as e:
+            logger.error(f'Warm-up failed: {e}')
+        finally:
+            db.session.remove()
+
+
+app = create_app(enable_migrations=False)
+app.config['STARTUP_TIMINGS']['total'] = _elapsed_ms()
+logger.info(f'Startup timings (ms): {app.config["STARTUP_TIMINGS"]}')
+
+_first_request_seen = False
+
+
+@app.before_request
+def log_first_request():
+    global _first_request_seen
+    if not _first_request_seen:
+        _first_request_seen = True
+        app.config['STARTUP_TIMINGS']['first_request'] = _elapsed_ms()
+        logger.info(f'First request {request.method} {request.path} at {_elapsed_ms()}ms after process start')
+
+
+if Config.WARM_ON_STARTUP:
+    threading.Thread(target=warm_up, args=(app,), name='warm-up', daemon=True).start()